@@ -1,13 +1,33 @@
 import os
+import json
+import time
+import asyncio
+import threading
+import queue
+import uuid
+import hashlib
 import tempfile
 import logging
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, Request, UploadFile, File, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.openapi.docs import get_swagger_ui_html
 from fastapi.openapi.utils import get_openapi
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from typing import List, Optional
 from audio_processor import AudioTranscriber
-from utils import format_transcription, generate_summary, get_supported_formats
+from metrics import HTTP_REQUEST_SECONDS, render_metrics
+from pipeline import stream_post_process
+from rate_limiter import ContextThreadPoolExecutor, RateLimitExceeded, INTERACTIVE, BATCH
+from search_index import get_search_index
+from stage_timer import StageTimer
+from subtitles import SegmentList, SUBTITLE_FORMATS
+from transcription_backends import BACKENDS
+from work_queue import QueueFullError, get_work_queue
+from worker import JOB_WORKERS, start_workers
+from youtube_processor import BATCH_DOWNLOAD_WORKERS, BATCH_TRANSCRIBE_WORKERS
+from utils import get_supported_formats, detect_audio_format
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -21,6 +41,62 @@ app = FastAPI(
     redoc_url=None
 )
 
+# Tamaño de bloque para la escritura en streaming y tamaño máximo de subida
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_MB', '500')) * 1024 * 1024
+# Directorio de los audios subidos; debe ser visible para todos los workers
+UPLOAD_DIR = os.getenv('UPLOAD_DIR', os.path.join('data', 'uploads'))
+# Espera máxima de /upload y /subtitles al resultado del worker (segundos)
+JOB_WAIT_SECONDS = float(os.getenv('JOB_WAIT_SECONDS', '600'))
+
+_workers_stop = threading.Event()
+_workers_started = False
+_workers_lock = threading.Lock()
+
+def enqueue_job(kind, payload, priority=BATCH, filename=None, trace_id=None):
+    """
+    Encola un trabajo para los workers dedicados (`python worker.py`). Con
+    JOB_WORKERS > 0 (sólo para desarrollo) la primera llamada arranca además
+    esos workers embebidos en este proceso. Es bloqueante: los endpoints la
+    llaman con run_in_threadpool.
+    """
+    global _workers_started
+    with _workers_lock:
+        if not _workers_started:
+            start_workers(JOB_WORKERS, _workers_stop)
+            _workers_started = True
+    try:
+        return get_work_queue().enqueue(kind, payload, priority=priority, filename=filename,
+                                        trace_id=trace_id)
+    except QueueFullError as e:
+        for path in payload.get('files', ()):
+            remove_temp_file(path)
+        raise HTTPException(status_code=503, detail=str(e))
+
+async def wait_for_job(job_id, timeout=JOB_WAIT_SECONDS):
+    """Espera a que el trabajo termine (o a `timeout`) y devuelve su estado."""
+    deadline = time.monotonic() + timeout
+    delay = 0.02
+    while True:
+        job = await run_in_threadpool(get_work_queue().get, job_id)
+        if job['status'] in ('completed', 'failed') or time.monotonic() >= deadline:
+            return job
+        await asyncio.sleep(delay)
+        delay = min(delay * 1.5, 0.5)
+
+def job_error(job, message):
+    """Convierte un trabajo fallido en un HTTPException (429 con Retry-After si fue por límites)."""
+    if job['error_status'] == 429:
+        return rate_limited(RateLimitExceeded(job['error'], retry_after=job['retry_after']))
+    return HTTPException(status_code=500, detail=f"{message}: {job['error']}")
+
+def job_pending(job):
+    """Respuesta 202 cuando el trabajo sigue en curso al agotarse la espera."""
+    return JSONResponse(
+        content={"job_id": job['id'], "status": job['status'], "trace_id": job['trace_id']},
+        status_code=202
+    )
+
 # Configurar CORS con opciones más específicas
 app.add_middleware(
     CORSMiddleware,
@@ -30,6 +106,74 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class UploadSizeLimit:
+    """
+    Rechaza con 413 los cuerpos mayores que `max_bytes` antes de que Starlette
+    los vuelque a disco: por Content-Length sin leer nada, o a mitad de la
+    lectura si el cliente no lo envía (transferencia por bloques).
+    """
+
+    def __init__(self, app, max_bytes):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    def _too_large(self):
+        return HTTPException(
+            status_code=413,
+            detail=f"El archivo supera el tamaño máximo de {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            error = self._too_large()
+            response = JSONResponse({"detail": error.detail}, status_code=error.status_code)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise self._too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+# Margen para las cabeceras y separadores del cuerpo multipart
+app.add_middleware(UploadSizeLimit, max_bytes=MAX_UPLOAD_BYTES + 64 * 1024)
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Asigna un trace ID a cada petición (o reutiliza X-Request-ID) y mide su duración."""
+    trace_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    request.state.trace_id = trace_id
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Trace-ID"] = trace_id
+        return response
+    finally:
+        # Etiquetar con la plantilla de la ruta para no crear una serie por ID
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start,
+                                     method=request.method, route=route, status=str(status))
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Métricas en formato de texto de Prometheus."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/docs", include_in_schema=False)
 async def custom_swagger_ui_html():
     return get_swagger_ui_html(
@@ -48,73 +192,396 @@ async def get_openapi_endpoint():
         routes=app.routes,
     )
 
+def validate_format(filename):
+    """Verifica la extensión del archivo y la devuelve."""
+    file_extension = os.path.splitext(filename)[1].lower().replace('.', '')
+    if file_extension not in get_supported_formats():
+        raise HTTPException(
+            status_code=400,
+            detail=f"Formato no soportado. Formatos permitidos: {', '.join(get_supported_formats())}"
+        )
+    return file_extension
+
+async def save_upload(file, file_extension, timer=None):
+    """
+    Guarda el archivo subido en disco por bloques, calculando su hash y
+    comprobando el formato real (magic bytes) y el tamaño máximo sobre la marcha.
+    Los cuerpos demasiado grandes ya los rechaza UploadSizeLimit antes de leerlos.
+    Devuelve la ruta del archivo temporal y el hash SHA-256 del contenido.
+    Con `timer` se registran por separado la lectura y la escritura.
+    """
+    digest = hashlib.sha256()
+    total = 0
+    read_seconds = write_seconds = 0.0
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=f'.{file_extension}', dir=UPLOAD_DIR)
+    logger.info(f"Creando archivo temporal: {tmp.name}")
+
+    def write_chunk(chunk):
+        # Hash y escritura en el pool de hilos para no bloquear el bucle de eventos
+        digest.update(chunk)
+        tmp.write(chunk)
+
+    try:
+        with tmp:
+            while True:
+                start = time.perf_counter()
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                read_seconds += time.perf_counter() - start
+                if not chunk:
+                    break
+
+                if total == 0:
+                    detected_format = detect_audio_format(chunk[:16])
+                    if detected_format not in get_supported_formats():
+                        raise HTTPException(
+                            status_code=400,
+                            detail="El contenido del archivo no corresponde a un formato de audio soportado"
+                        )
+
+                total += len(chunk)
+                if total > MAX_UPLOAD_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"El archivo supera el tamaño máximo de {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+                    )
+
+                start = time.perf_counter()
+                await run_in_threadpool(write_chunk, chunk)
+                write_seconds += time.perf_counter() - start
+
+        if timer is not None:
+            timer.record("upload_read", read_seconds, bytes=total)
+            timer.record("temp_write", write_seconds, bytes=total)
+
+        if total == 0:
+            raise HTTPException(status_code=400, detail="El archivo está vacío")
+
+        # Usar la extensión del formato real para que Whisper lo decodifique bien
+        path = tmp.name
+        if detected_format != file_extension:
+            path = f"{os.path.splitext(tmp.name)[0]}.{detected_format}"
+            os.replace(tmp.name, path)
+
+        return path, digest.hexdigest()
+
+    except Exception:
+        remove_temp_file(tmp.name)
+        raise
+
+def remove_temp_file(path):
+    """Elimina el archivo temporal si todavía existe."""
+    logger.info("Limpiando archivo temporal...")
+    if os.path.exists(path):
+        os.unlink(path)
+
+def validate_backend(backend):
+    """Verifica que el motor de transcripción solicitado exista y tenga sus dependencias instaladas."""
+    if backend is not None and backend not in BACKENDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Motor no soportado. Motores disponibles: {', '.join(BACKENDS)}"
+        )
+    missing = BACKENDS[backend].missing_dependency() if backend is not None else None
+    if missing:
+        raise HTTPException(status_code=400, detail=missing)
+    return backend
+
+def rate_limited(error):
+    """Convierte un RateLimitExceeded en una respuesta 429 con Retry-After."""
+    retry_after = max(1, round(error.retry_after or 1))
+    return HTTPException(status_code=429, detail=str(error), headers={"Retry-After": str(retry_after)})
+
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(request: Request, file: UploadFile = File(...), backend: Optional[str] = None):
     """
     Endpoint para procesar archivos de audio y generar transcripciones.
 
     Parameters:
     - file: Archivo de audio a transcribir (mp3, mp4, mpeg, mpga, m4a, wav, webm)
+    - backend: Motor de transcripción ("openai" o "local"); por defecto TRANSCRIPTION_BACKEND
 
     Returns:
     - success: bool - Indica si la operación fue exitosa
     - filename: str - Nombre del archivo procesado
     - transcription: str - Texto transcrito y formateado
-    - summary: dict - Resumen del contenido con puntos clave
+    - summary: dict - Resumen del contenido con puntos clave (None si falló)
+    - errors: dict - Errores de las etapas que no pudieron completarse
+    - trace_id: str - Identificador de la petición en logs y cabecera X-Trace-ID
+    - stages: dict - Duración en segundos de cada etapa
+
+    El procesamiento lo hace un worker de la cola con prioridad interactiva.
+    Responde 429 (con Retry-After) si se agota el límite de peticiones de la API
+    y 202 con `job_id` si el trabajo no termina en JOB_WAIT_SECONDS.
     """
     logger.info(f"Recibiendo archivo: {file.filename}")
 
     # Verificar formato del archivo
-    file_extension = os.path.splitext(file.filename)[1].lower().replace('.', '')
-    if file_extension not in get_supported_formats():
-        raise HTTPException(
-            status_code=400,
-            detail=f"Formato no soportado. Formatos permitidos: {', '.join(get_supported_formats())}"
-        )
+    file_extension = validate_format(file.filename)
+    validate_backend(backend)
 
+    timer = StageTimer(request.state.trace_id)
+    tmp_path, content_hash = await save_upload(file, file_extension, timer)
+
+    job_id = await run_in_threadpool(
+        enqueue_job,
+        "audio", {"path": tmp_path, "content_hash": content_hash, "backend": backend,
+                  "filename": file.filename, "files": [tmp_path]},
+        priority=INTERACTIVE, filename=file.filename, trace_id=timer.trace_id
+    )
+    job = await wait_for_job(job_id)
+
+    if job['status'] == 'failed':
+        logger.error(f"Error procesando archivo: {job['error']}")
+        raise job_error(job, "Error procesando el archivo")
+    if job['status'] != 'completed':
+        return job_pending(job)
+
+    return JSONResponse(
+        content={
+            "success": True,
+            "filename": file.filename,
+            **job['result'],
+            "trace_id": timer.trace_id,
+            "stages": {**timer.timings, **job['stages']}
+        },
+        status_code=200
+    )
+
+def sse_event(event, data):
+    """Formatea un evento server-sent events con datos JSON."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def stream_audio_events(audio_path, timer, content_hash=None, backend=None):
+    """
+    Procesa el audio generando eventos SSE: `chunk` por cada segmento
+    transcrito, `transcription` con el texto completo, `format` con cada
+    fragmento del texto formateado, `summary` y, al final, `done` (o `error`).
+    Borra el archivo temporal al terminar.
+    """
+    chunks = queue.Queue()
     try:
-        # Crear un archivo temporal para guardar el audio
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{file_extension}') as tmp:
-            logger.info(f"Creando archivo temporal: {tmp.name}")
-            content = await file.read()
-            tmp.write(content)
-            tmp.flush()
-
-            # Procesar el archivo
-            transcriber = AudioTranscriber()
-            logger.info("Iniciando transcripción...")
-            transcription = transcriber.transcribe(tmp.name)
-
-            # Formatear la transcripción
-            logger.info("Formateando transcripción...")
-            formatted_text = format_transcription(transcription)
-
-            # Generar resumen
-            logger.info("Generando resumen...")
-            summary = generate_summary(transcription)
-
-            # Limpiar el archivo temporal
-            logger.info("Limpiando archivo temporal...")
-            os.unlink(tmp.name)
-
-            return JSONResponse(
-                content={
-                    "success": True,
-                    "filename": file.filename,
-                    "transcription": formatted_text,
-                    "summary": summary
-                },
-                status_code=200
-            )
+        transcriber = AudioTranscriber(backend)
+
+        def transcribe():
+            with timer.stage("transcription"):
+                return transcriber.transcribe(
+                    audio_path, cache_key=content_hash, timer=timer,
+                    on_chunk=lambda index, total, text: chunks.put((index, total, text))
+                )
+
+        # La transcripción corre en otro hilo para emitir los segmentos según terminan
+        with ContextThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(transcribe)
+            future.add_done_callback(lambda _: chunks.put(None))
+            while (chunk := chunks.get()) is not None:
+                index, total, text = chunk
+                yield sse_event("chunk", {"index": index, "total": total, "text": text})
+            transcription = future.result()
+
+        yield sse_event("transcription", {"text": transcription})
+
+        for kind, value in stream_post_process(transcription, timer=timer):
+            if kind == "delta":
+                yield sse_event("format", {"delta": value})
+            elif kind == "reset":
+                yield sse_event("format", {"replace": value})
+            elif kind == "summary":
+                yield sse_event("summary", value)
+            else:
+                for stage, error in value['errors'].items():
+                    logger.warning(f"Etapa '{stage}' sin resultado: {error}")
+                yield sse_event("done", {**value, "trace_id": timer.trace_id, "stages": timer.timings})
 
+    except RateLimitExceeded as e:
+        logger.warning(f"Límite de la API alcanzado: {str(e)}")
+        yield sse_event("error", {"status": 429, "detail": str(e), "retry_after": e.retry_after,
+                                  "trace_id": timer.trace_id})
     except Exception as e:
         logger.error(f"Error procesando archivo: {str(e)}")
-        if 'tmp' in locals() and os.path.exists(tmp.name):
-            os.unlink(tmp.name)
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error procesando el archivo: {str(e)}"
-        )
+        yield sse_event("error", {"status": 500, "detail": f"Error procesando el archivo: {str(e)}",
+                                  "trace_id": timer.trace_id})
+    finally:
+        remove_temp_file(audio_path)
+
+@app.post("/upload/stream")
+async def upload_file_stream(request: Request, file: UploadFile = File(...), backend: Optional[str] = None):
+    """
+    Igual que /upload, pero responde con server-sent events a medida que
+    avanza el procesamiento, en lugar de esperar al resultado completo.
+
+    No pasa por la cola de trabajos: se procesa en este proceso, con prioridad
+    interactiva en el limitador de peticiones a OpenAI, porque los eventos se
+    envían a medida que se generan (la cola sólo devuelve el resultado final).
+
+    Events:
+    - chunk: {index, total, text} - Segmento transcrito (en orden de finalización)
+    - transcription: {text} - Transcripción completa sin formato
+    - format: {delta} - Fragmento del texto formateado, según lo genera el modelo,
+      o {replace} - Texto que sustituye todo lo recibido antes en eventos format
+      (el formateo falló a mitad)
+    - summary: dict - Resumen con puntos clave
+    - done: {transcription, summary, errors, trace_id, stages} - Resultado final
+      (su `transcription` es el texto formateado definitivo)
+    - error: {status, detail, trace_id} - El procesamiento falló
+    """
+    logger.info(f"Recibiendo archivo (streaming): {file.filename}")
+    file_extension = validate_format(file.filename)
+    validate_backend(backend)
+
+    timer = StageTimer(request.state.trace_id)
+    tmp_path, content_hash = await save_upload(file, file_extension, timer)
+
+    return StreamingResponse(
+        stream_audio_events(tmp_path, timer, content_hash, backend),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: Request, file: UploadFile = File(...), backend: Optional[str] = None):
+    """
+    Encola un archivo de audio para procesarlo en segundo plano.
+
+    Parameters:
+    - file: Archivo de audio a transcribir
+    - backend: Motor de transcripción ("openai" o "local")
+
+    Returns:
+    - job_id: str - Identificador del trabajo para consultar su estado
+    - status: str - Estado inicial del trabajo ("queued")
+    - trace_id: str - Identificador de la petición en los logs de cada etapa
+    """
+    logger.info(f"Recibiendo archivo para trabajo: {file.filename}")
+    file_extension = validate_format(file.filename)
+    validate_backend(backend)
+    trace_id = request.state.trace_id
+    tmp_path, content_hash = await save_upload(file, file_extension, StageTimer(trace_id))
+
+    job_id = await run_in_threadpool(
+        enqueue_job,
+        "audio", {"path": tmp_path, "content_hash": content_hash, "backend": backend,
+                  "filename": file.filename, "files": [tmp_path]},
+        filename=file.filename, trace_id=trace_id
+    )
+
+    return {"job_id": job_id, "status": "queued", "trace_id": trace_id}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Consulta el estado de un trabajo.
+
+    Returns:
+    - status: str - queued, running, completed o failed
+    - attempts: int - Intentos realizados (un trabajo vuelve a la cola si su worker cae)
+    - stages: dict - Duración en segundos de cada etapa completada
+    - result: dict - Transcripción y resumen cuando el trabajo ha terminado
+    - error: str - Mensaje de error si el trabajo falló
+    - progress: list - Estado de cada video en los lotes de YouTube
+    """
+    job = await run_in_threadpool(get_work_queue().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job
+
+class YouTubeBatchRequest(BaseModel):
+    urls: List[str]
+    download_workers: int = BATCH_DOWNLOAD_WORKERS
+    transcribe_workers: int = BATCH_TRANSCRIBE_WORKERS
+
+@app.post("/youtube/batch", status_code=202)
+async def create_youtube_batch(request: YouTubeBatchRequest):
+    """
+    Encola la transcripción de varios videos o listas de reproducción de YouTube.
+
+    Parameters:
+    - urls: list - URLs de videos o de listas de reproducción
+    - download_workers: int - Descargas simultáneas
+    - transcribe_workers: int - Transcripciones simultáneas
+
+    Returns:
+    - job_id: str - Identificador del trabajo; GET /jobs/{job_id} devuelve el
+      progreso de cada video en `progress`
+    """
+    if not request.urls:
+        raise HTTPException(status_code=400, detail="La lista de URLs está vacía")
+    if not (1 <= request.download_workers <= 16 and 1 <= request.transcribe_workers <= 16):
+        raise HTTPException(status_code=400, detail="La concurrencia debe estar entre 1 y 16")
+
+    job_id = await run_in_threadpool(enqueue_job, "youtube_batch", {
+        "urls": request.urls,
+        "download_workers": request.download_workers,
+        "transcribe_workers": request.transcribe_workers,
+    })
+    return {"job_id": job_id, "status": "queued"}
+
+@app.post("/subtitles")
+async def create_subtitles(request: Request, file: UploadFile = File(...),
+                           format: str = Query("srt", pattern="^(srt|vtt)$")):
+    """
+    Genera subtítulos con marcas de tiempo a partir de un archivo de audio.
+
+    Parameters:
+    - file: Archivo de audio a transcribir
+    - format: Formato de subtítulos (srt o vtt)
+
+    Returns:
+    - Archivo de subtítulos, enviado de forma incremental (202 con `job_id`
+      si el worker no termina en JOB_WAIT_SECONDS)
+    """
+    logger.info(f"Generando subtítulos ({format}) para: {file.filename}")
+    file_extension = validate_format(file.filename)
+    tmp_path, content_hash = await save_upload(file, file_extension)
+
+    job_id = await run_in_threadpool(
+        enqueue_job,
+        "subtitles", {"path": tmp_path, "content_hash": content_hash, "filename": file.filename,
+                      "files": [tmp_path]},
+        priority=INTERACTIVE, filename=file.filename, trace_id=request.state.trace_id
+    )
+    job = await wait_for_job(job_id)
+
+    if job['status'] == 'failed':
+        logger.error(f"Error generando subtítulos: {job['error']}")
+        raise job_error(job, "Error generando subtítulos")
+    if job['status'] != 'completed':
+        return job_pending(job)
+
+    segments = SegmentList.from_dict(job['result']['segments'])
+    writer, media_type = SUBTITLE_FORMATS[format]
+    subtitle_name = f"{os.path.splitext(file.filename)[0]}.{format}"
+    return StreamingResponse(
+        writer(segments),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{subtitle_name}"'}
+    )
+
+@app.get("/search")
+async def search_transcripts(q: str = Query(..., min_length=1, max_length=200),
+                             limit: int = Query(20, ge=1, le=100), offset: int = Query(0, ge=0, le=1000)):
+    """
+    Busca en todas las transcripciones guardadas.
+
+    Parameters:
+    - q: Palabras a buscar (deben aparecer todas; `palabra*` busca por prefijo)
+    - limit: Número máximo de resultados
+    - offset: Resultados a omitir (paginación)
+
+    Returns:
+    - results: list - Pasajes ordenados por relevancia, cada uno con `id` de
+      la transcripción, `title`, `source`, `snippet` (coincidencias entre
+      <mark> y </mark>), `score` y, si hay marcas de tiempo, `start` y `end`
+      en segundos
+    - took_ms: float - Tiempo de la consulta
+    """
+    start = time.perf_counter()
+    results = await run_in_threadpool(get_search_index().search, q, limit, offset)
+    return {
+        "query": q,
+        "results": results,
+        "took_ms": round((time.perf_counter() - start) * 1000, 2)
+    }
 
 if __name__ == "__main__":
     import uvicorn
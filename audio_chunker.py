@@ -0,0 +1,147 @@
+import os
+import re
+import tempfile
+from typing import List, Optional, Tuple
+from pydub import AudioSegment
+from pydub.silence import detect_silence
+from pydub.utils import mediainfo
+
+# Duración objetivo de cada segmento y solapamiento entre segmentos consecutivos
+SEGMENT_SECONDS = int(os.getenv('SEGMENT_SECONDS', '600'))
+OVERLAP_SECONDS = float(os.getenv('SEGMENT_OVERLAP_SECONDS', '2'))
+# Ventana (antes del corte objetivo) donde se busca un silencio para cortar
+SILENCE_SEARCH_SECONDS = 30
+MIN_SILENCE_MS = 400
+# Bitrate de los segmentos exportados y margen respecto al límite de subida
+SEGMENT_BITRATE = "64k"
+UPLOAD_SIZE_MARGIN = 0.9
+
+# Número máximo de palabras que se comparan al unir segmentos solapados
+MAX_OVERLAP_WORDS = 40
+# Palabras mínimas de una coincidencia y palabras finales del segmento anterior
+# que pueden quedar tras ella (el solapamiento es de sólo OVERLAP_SECONDS)
+MIN_OVERLAP_WORDS = 3
+OVERLAP_SLACK_WORDS = 3
+
+
+def get_duration(audio_path: str) -> float:
+    """Obtener la duración del audio en segundos sin decodificarlo completo."""
+    return float(mediainfo(audio_path).get('duration', 0) or 0)
+
+
+def load_window(audio_path: str, start: float, duration: float) -> AudioSegment:
+    """Decodificar sólo el fragmento [start, start + duration) del archivo."""
+    return AudioSegment.from_file(audio_path, start_second=max(start, 0), duration=duration)
+
+
+def find_cut_point(audio_path: str, target: float) -> float:
+    """
+    Buscar el silencio más largo en la ventana previa a `target` y devolver
+    su punto medio. Si no hay silencios, se corta en `target`.
+    """
+    window_start = max(target - SILENCE_SEARCH_SECONDS, 0)
+    window = load_window(audio_path, window_start, target - window_start)
+    if len(window) == 0:
+        return target
+
+    silences = detect_silence(window, min_silence_len=MIN_SILENCE_MS, silence_thresh=window.dBFS - 16)
+    if not silences:
+        return target
+
+    start_ms, end_ms = max(silences, key=lambda s: s[1] - s[0])
+    return window_start + (start_ms + end_ms) / 2000
+
+
+def max_segment_seconds(audio_path: str, duration: float, max_bytes: int,
+                        overlap: float = OVERLAP_SECONDS) -> float:
+    """
+    Duración máxima de un segmento para que no supere `max_bytes`, según los
+    bytes por segundo del archivo original (si se envía entero) o del mp3
+    exportado, lo que sea mayor, y contando el solapamiento.
+    """
+    bytes_per_second = max(os.path.getsize(audio_path) / duration,
+                           int(SEGMENT_BITRATE.rstrip('k')) * 1000 / 8)
+    return max(max_bytes * UPLOAD_SIZE_MARGIN / bytes_per_second - overlap, overlap + 1)
+
+
+def plan_segments(audio_path: str, segment_seconds: float = SEGMENT_SECONDS,
+                  overlap: float = OVERLAP_SECONDS, max_bytes: Optional[int] = None) -> List[Tuple[float, float]]:
+    """
+    Dividir el audio en segmentos (inicio, fin) en segundos, cortando en
+    silencios y solapando `overlap` segundos con el segmento anterior.
+    Con `max_bytes` los segmentos se acortan lo necesario para no superar
+    ese tamaño (p. ej. el límite de subida del motor).
+    """
+    duration = get_duration(audio_path)
+    if max_bytes and duration > 0:
+        segment_seconds = min(segment_seconds, max_segment_seconds(audio_path, duration, max_bytes, overlap))
+    if duration <= segment_seconds:
+        return [(0.0, duration)]
+
+    cuts = []
+    position = 0.0
+    while duration - position > segment_seconds:
+        cut = find_cut_point(audio_path, position + segment_seconds)
+        # Evitar segmentos degenerados si el silencio está al inicio de la ventana
+        if cut <= position + overlap:
+            cut = position + segment_seconds
+        cuts.append(cut)
+        position = cut
+
+    segments = []
+    start = 0.0
+    for cut in cuts + [duration]:
+        segments.append((max(start - overlap, 0.0), cut))
+        start = cut
+    return segments
+
+
+def export_segment(audio_path: str, start: float, end: float, bitrate: str = SEGMENT_BITRATE) -> str:
+    """Exportar un segmento a un archivo mp3 temporal y devolver su ruta."""
+    segment = load_window(audio_path, start, end - start).set_channels(1)
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
+    tmp.close()
+    segment.export(tmp.name, format="mp3", bitrate=bitrate)
+    return tmp.name
+
+
+def _normalize(word: str) -> str:
+    return re.sub(r'\W', '', word.lower())
+
+
+def merge_overlapping_text(previous: str, current: str, max_words: int = MAX_OVERLAP_WORDS) -> str:
+    """
+    Unir dos transcripciones consecutivas eliminando las palabras repetidas
+    por el solapamiento. Se busca el prefijo más largo de `current` (al menos
+    MIN_OVERLAP_WORDS palabras) que aparece al final de `previous`, como mucho
+    OVERLAP_SLACK_WORDS palabras antes de su última palabra, y se descarta de
+    `current`. Si no hay coincidencia se concatenan ambos textos completos.
+    """
+    prev_words = previous.split()
+    cur_words = current.split()
+    if not prev_words:
+        return current.strip()
+    if not cur_words:
+        return previous.strip()
+
+    tail_start = max(len(prev_words) - max_words, 0)
+    tail = [_normalize(w) for w in prev_words[tail_start:]]
+    head = [_normalize(w) for w in cur_words[:max_words]]
+
+    for n in range(min(len(tail), len(head)), MIN_OVERLAP_WORDS - 1, -1):
+        prefix = head[:n]
+        # La coincidencia debe terminar junto al final del segmento anterior
+        for i in range(len(tail) - n, max(len(tail) - n - OVERLAP_SLACK_WORDS, 0) - 1, -1):
+            if tail[i:i + n] == prefix:
+                kept = prev_words[:tail_start + i + n]
+                return ' '.join(kept + cur_words[n:])
+
+    return f"{previous.strip()} {current.strip()}"
+
+
+def stitch_transcripts(texts: List[str]) -> str:
+    """Unir en orden las transcripciones de todos los segmentos."""
+    result = ''
+    for text in texts:
+        result = merge_overlapping_text(result, text) if result else text.strip()
+    return result
@@ -0,0 +1,187 @@
+import os
+import tempfile
+import subprocess
+from typing import List, Tuple
+import numpy as np
+from pydub import AudioSegment
+
+# Formato de salida: mono, 16 kHz (suficiente para Whisper) y bitrate bajo
+TARGET_SAMPLE_RATE = 16000
+OUTPUT_BITRATE = os.getenv('PREPROCESS_BITRATE', '32k')
+
+# Detección de voz por energía
+FRAME_MS = 30
+# Margen sobre el ruido de fondo (percentil bajo de energía) para considerar voz
+SPEECH_MARGIN_DB = 10.0
+# Umbral mínimo relativo al pico para no confundir voz suave con silencio
+MIN_THRESHOLD_BELOW_PEAK_DB = 50.0
+# Tramas de margen que se conservan alrededor de la voz
+HANGOVER_FRAMES = 8
+# Los silencios internos más largos que esto se acortan a KEEP_SILENCE_MS
+MAX_SILENCE_MS = 1000
+KEEP_SILENCE_MS = 300
+# Tramas procesadas por bloque al leer el PCM intermedio (~60 s)
+WINDOW_FRAMES = 2000
+
+
+def frame_energy_db(samples: np.ndarray, frame_length: int) -> np.ndarray:
+    """Energía RMS (dBFS) de cada trama, calculada de forma vectorizada."""
+    n_frames = len(samples) // frame_length
+    if n_frames == 0:
+        return np.empty(0, dtype=np.float32)
+    frames = samples[:n_frames * frame_length].reshape(n_frames, frame_length).astype(np.float32)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20 * np.log10(rms / 32768.0 + 1e-10)
+
+
+def detect_speech(samples: np.ndarray, sample_rate: int, frame_ms: int = FRAME_MS) -> np.ndarray:
+    """
+    VAD por energía: devuelve una máscara booleana por trama. El umbral se
+    adapta al ruido de fondo del propio archivo y se añade un margen de
+    tramas alrededor de la voz para no cortar inicios y finales de palabra.
+    """
+    return detect_speech_energy(frame_energy_db(samples, int(sample_rate * frame_ms / 1000)))
+
+
+def detect_speech_energy(energy: np.ndarray) -> np.ndarray:
+    """Máscara de voz a partir de la energía por trama (ver detect_speech)."""
+    if energy.size == 0:
+        return np.zeros(0, dtype=bool)
+
+    noise_floor = np.percentile(energy, 10)
+    threshold = max(noise_floor + SPEECH_MARGIN_DB, energy.max() - MIN_THRESHOLD_BELOW_PEAK_DB)
+    speech = energy > threshold
+
+    # Extender la voz HANGOVER_FRAMES tramas hacia ambos lados
+    kernel = np.ones(2 * HANGOVER_FRAMES + 1, dtype=np.int32)
+    return np.convolve(speech.astype(np.int32), kernel, mode='same') > 0
+
+
+def speech_regions(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """Convertir la máscara en intervalos [inicio, fin) de tramas con voz."""
+    padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+    edges = np.flatnonzero(np.diff(padded))
+    return list(zip(edges[0::2].tolist(), edges[1::2].tolist()))
+
+
+def keep_regions(mask: np.ndarray, trim_internal: bool = True) -> List[Tuple[int, int]]:
+    """
+    Intervalos [inicio, fin) de tramas que se conservan: desde la primera
+    hasta la última trama con voz y, si `trim_internal`, con los silencios
+    internos largos acortados a KEEP_SILENCE_MS. Lista vacía si no hay voz.
+    """
+    regions = speech_regions(mask)
+    if not regions:
+        return []
+    if not trim_internal:
+        return [(regions[0][0], regions[-1][1])]
+
+    max_gap = MAX_SILENCE_MS // FRAME_MS
+    keep_gap = KEEP_SILENCE_MS // FRAME_MS
+    kept = []
+    previous_end = None
+    for start, end in regions:
+        if previous_end is not None:
+            if start - previous_end > max_gap:
+                # Conservar un silencio corto entre intervenciones
+                kept.append((previous_end, previous_end + keep_gap))
+            else:
+                kept.append((previous_end, start))
+        kept.append((start, end))
+        previous_end = end
+    return kept
+
+
+def remove_silences(samples: np.ndarray, sample_rate: int, trim_internal: bool = True) -> np.ndarray:
+    """
+    Recortar el silencio inicial y final y, si `trim_internal`, acortar los
+    silencios internos largos.
+    """
+    kept = keep_regions(detect_speech(samples, sample_rate), trim_internal)
+    if not kept:
+        return samples
+    frame_length = int(sample_rate * FRAME_MS / 1000)
+    return np.concatenate([samples[start * frame_length:end * frame_length] for start, end in kept])
+
+
+def _ffmpeg(*args: str):
+    """Ejecutar ffmpeg (el mismo binario que usa pydub) y fallar con su mensaje de error."""
+    result = subprocess.run([AudioSegment.converter, '-hide_banner', '-loglevel', 'error', '-y', *args],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg falló: {result.stderr.decode(errors='replace').strip()}")
+
+
+def file_energy_db(raw_path: str, frame_length: int, window_frames: int = WINDOW_FRAMES) -> np.ndarray:
+    """
+    Energía por trama de un archivo PCM int16 mono, leído por ventanas de
+    `window_frames` tramas (la memoria no depende de la duración).
+    """
+    if os.path.getsize(raw_path) == 0:
+        return np.empty(0, dtype=np.float32)
+    samples = np.memmap(raw_path, dtype=np.int16, mode='r')
+    window = window_frames * frame_length
+    return np.concatenate([frame_energy_db(samples[offset:offset + window], frame_length)
+                           for offset in range(0, len(samples), window)] or [np.empty(0, dtype=np.float32)])
+
+
+def _encode_regions(raw_path: str, regions: List[Tuple[int, int]], output_path: str):
+    """Codificar a mp3 sólo los intervalos (en muestras) del PCM, enviándolos por bloques a ffmpeg."""
+    samples = np.memmap(raw_path, dtype=np.int16, mode='r')
+    process = subprocess.Popen(
+        [AudioSegment.converter, '-hide_banner', '-loglevel', 'error', '-y',
+         '-f', 's16le', '-ar', str(TARGET_SAMPLE_RATE), '-ac', '1', '-i', 'pipe:0',
+         '-b:a', OUTPUT_BITRATE, output_path],
+        stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    block = WINDOW_FRAMES * int(TARGET_SAMPLE_RATE * FRAME_MS / 1000)
+    try:
+        for start, end in regions:
+            for offset in range(start, end, block):
+                process.stdin.write(samples[offset:min(offset + block, end)].tobytes())
+        process.stdin.close()
+    except BrokenPipeError:
+        pass
+    stderr = process.stderr.read()
+    if process.wait() != 0:
+        raise RuntimeError(f"ffmpeg falló: {stderr.decode(errors='replace').strip()}")
+
+
+def preprocess_audio(audio_path: str, trim_silence: bool = True, trim_internal: bool = True) -> str:
+    """
+    Preparar el audio para subirlo: mezcla a mono, remuestreo a 16 kHz,
+    recorte de silencios y compresión a mp3 de bitrate bajo.
+
+    Con `trim_internal=False` sólo se recortan los extremos; con
+    `trim_silence=False` no se recorta nada (conserva las marcas de tiempo).
+
+    ffmpeg decodifica y codifica en streaming y la detección de voz recorre
+    el PCM intermedio (en disco) por ventanas, así que la memoria usada no
+    crece con la duración del audio.
+
+    Returns:
+        str: Ruta de un archivo temporal mp3 (el llamador debe borrarlo)
+    """
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
+    tmp.close()
+    try:
+        if not trim_silence:
+            _ffmpeg('-i', audio_path, '-ac', '1', '-ar', str(TARGET_SAMPLE_RATE), '-b:a', OUTPUT_BITRATE, tmp.name)
+            return tmp.name
+
+        raw = tempfile.NamedTemporaryFile(delete=False, suffix='.pcm')
+        raw.close()
+        try:
+            _ffmpeg('-i', audio_path, '-ac', '1', '-ar', str(TARGET_SAMPLE_RATE), '-f', 's16le', raw.name)
+            frame_length = int(TARGET_SAMPLE_RATE * FRAME_MS / 1000)
+            kept = keep_regions(detect_speech_energy(file_energy_db(raw.name, frame_length)), trim_internal)
+            total = os.path.getsize(raw.name) // 2
+            regions = ([(start * frame_length, min(end * frame_length, total)) for start, end in kept]
+                       or [(0, total)])
+            _encode_regions(raw.name, regions, tmp.name)
+        finally:
+            os.unlink(raw.name)
+        return tmp.name
+    except Exception:
+        os.unlink(tmp.name)
+        raise
@@ -1,71 +1,322 @@
 import os
-import json
-from openai import OpenAI
+import logging
+from contextlib import nullcontext
 from dotenv import load_dotenv
 from pathlib import Path
+from concurrent.futures import as_completed
+from rate_limiter import ContextThreadPoolExecutor, RateLimitExceeded
+from cache import get_cache, hash_file, on_evict
+from audio_chunker import plan_segments, export_segment, stitch_transcripts
+from subtitles import SegmentList
+from audio_preprocessing import preprocess_audio
+from transcription_backends import get_backend
+from single_flight import SingleFlight
+from search_index import index_transcript, remove_transcripts, set_title
 
 # Cargar variables de entorno
 load_dotenv()
 
+# Número máximo de segmentos transcritos en paralelo en modo audio largo
+TRANSCRIPTION_WORKERS = int(os.getenv('TRANSCRIPTION_WORKERS', '4'))
+# Preprocesar el audio (mono, 16 kHz, sin silencios, bitrate bajo) antes de subirlo
+PREPROCESS_AUDIO = os.getenv('PREPROCESS_AUDIO', '1') == '1'
+# Tiempo que se conservan los segmentos ya transcritos de un audio largo sin terminar
+CHECKPOINT_TTL = int(os.getenv('CHECKPOINT_TTL_HOURS', '24')) * 3600
+
+logger = logging.getLogger(__name__)
+
+# Transcripciones en curso por clave de caché, compartidas entre peticiones simultáneas
+_inflight = SingleFlight()
+
+def transcription_error(e):
+    """Traduce un error de la API a un mensaje para el usuario."""
+    if isinstance(e, RateLimitExceeded):
+        # Se conserva el tipo para que la API responda 429
+        return e
+    if "API key" in str(e):
+        return Exception("Error de API: Verifica tu API key de OpenAI")
+    elif "file format" in str(e).lower():
+        return Exception("Formato de archivo no soportado")
+    else:
+        return Exception(f"Error durante la transcripción: {str(e)}")
+
 class AudioTranscriber:
-    def __init__(self):
-        self.client = OpenAI()
+    def __init__(self, backend=None):
+        # Motor de transcripción: "openai" (API de Whisper) o "local" (CPU)
+        self.backend = get_backend(backend)
         self.cache_dir = Path("cache")
-        self.cache_dir.mkdir(exist_ok=True)
+        self.cache = get_cache(self.cache_dir)
+        # Los documentos del índice usan la misma clave que la transcripción en caché:
+        # al expulsarla de la caché deja de aparecer en las búsquedas
+        on_evict(self.cache.namespace, remove_transcripts)
 
-    def get_cache_path(self, audio_path):
-        """Genera una ruta única para el caché basada en el nombre y tamaño del archivo"""
-        file_stats = os.stat(audio_path)
-        cache_key = f"{Path(audio_path).stem}_{file_stats.st_size}"
-        return self.cache_dir / f"{cache_key}.json"
+    def get_cache_key(self, audio_path):
+        """Genera la clave de caché a partir del contenido del archivo (SHA-256)"""
+        return hash_file(audio_path)
 
-    def get_from_cache(self, audio_path):
+    def get_from_cache(self, audio_path, cache_key=None):
         """Intenta obtener la transcripción del caché"""
-        cache_path = self.get_cache_path(audio_path)
-        if cache_path.exists():
-            with open(cache_path, 'r', encoding='utf-8') as f:
-                return json.load(f)['transcription']
+        cache_key = cache_key or self.get_cache_key(audio_path)
+        entry = self.cache.get(cache_key)
+        if entry is not None:
+            return entry['transcription']
+        return None
+
+    def save_to_cache(self, audio_path, transcription, cache_key=None, index=True):
+        """Guarda la transcripción en el caché y (con `index`) la añade al índice de búsqueda"""
+        cache_key = cache_key or self.get_cache_key(audio_path)
+        self.cache.put(cache_key, {'transcription': transcription})
+        if index:
+            index_transcript(cache_key, text=transcription)
+
+    def get_segments_from_cache(self, cache_key):
+        """Intenta obtener los segmentos con marcas de tiempo del caché"""
+        entry = self.cache.get(f"{cache_key}-segments")
+        if entry is not None:
+            return SegmentList.from_dict(entry['segments'])
         return None
 
-    def save_to_cache(self, audio_path, transcription):
-        """Guarda la transcripción en el caché"""
-        cache_path = self.get_cache_path(audio_path)
-        with open(cache_path, 'w', encoding='utf-8') as f:
-            json.dump({'transcription': transcription}, f, ensure_ascii=False)
+    def save_segments_to_cache(self, cache_key, segments):
+        """Guarda los segmentos con marcas de tiempo en el caché (y en el índice de búsqueda)"""
+        self.cache.put(f"{cache_key}-segments", {'segments': segments.to_dict()})
+        index_transcript(cache_key, segments=segments)
+
+    def set_title(self, content_hash, title):
+        """Asigna un título (p. ej. el nombre del archivo) a la transcripción en el índice de búsqueda."""
+        set_title(self._entry_key(content_hash), title)
+
+    def _transcribe_file(self, audio_path, timestamps=False):
+        """
+        Transcribe un único archivo con el motor configurado. Devuelve el
+        texto o, si `timestamps` es True, una SegmentList.
+        """
+        return self.backend.transcribe(audio_path, timestamps)
+
+    def _entry_key(self, cache_key):
+        """Clave de caché por motor: el texto de cada motor se guarda por separado."""
+        if self.backend.name == "openai":
+            return cache_key
+        return f"{cache_key}-{self.backend.name}"
+
+    def _transcribe_segment(self, audio_path, start, end, timestamps=False):
+        """Exporta y transcribe un segmento del audio."""
+        segment_path = export_segment(audio_path, start, end)
+        try:
+            return self._transcribe_file(segment_path, timestamps)
+        finally:
+            os.unlink(segment_path)
+
+    def _checkpoint_key(self, checkpoint_key, start, end):
+        """Clave del segmento (inicio, fin) ya transcrito de un audio largo."""
+        return f"{checkpoint_key}-chunk-{start:.3f}-{end:.3f}"
+
+    def _load_checkpoints(self, checkpoint_key, segments, timestamps):
+        """Segmentos transcritos en intentos anteriores, por índice."""
+        keys = [self._checkpoint_key(checkpoint_key, start, end) for start, end in segments]
+        found = self.cache.get_many(keys)
+        restored = {}
+        for index, key in enumerate(keys):
+            if key in found:
+                result = found[key]['result']
+                restored[index] = SegmentList.from_dict(result) if timestamps else result
+        return restored
+
+    def _save_checkpoint(self, checkpoint_key, start, end, result, timestamps):
+        value = result.to_dict() if timestamps else result
+        self.cache.put(self._checkpoint_key(checkpoint_key, start, end), {'result': value},
+                       ttl=CHECKPOINT_TTL)
+
+    def _delete_checkpoints(self, checkpoint_key, segments):
+        """Borra los segmentos guardados una vez que el audio completo está transcrito."""
+        try:
+            self.cache.delete_many([self._checkpoint_key(checkpoint_key, start, end) for start, end in segments])
+        except Exception as e:
+            logger.warning(f"No se pudieron borrar los checkpoints de {checkpoint_key}: {str(e)}")
+
+    def transcribe_long(self, audio_path, max_workers=TRANSCRIPTION_WORKERS, timestamps=False, on_chunk=None,
+                        checkpoint_key=None):
+        """
+        Transcribe audio largo dividiéndolo en segmentos cortados en silencios,
+        que se envían en paralelo y se unen eliminando el texto solapado.
+
+        `on_chunk(index, total, result)` se llama desde el hilo que invoca el
+        método cada vez que termina un segmento (en orden de finalización).
+
+        Con `checkpoint_key`, cada segmento se guarda en la caché en cuanto
+        se transcribe; si un intento anterior falló a mitad, sólo se envían
+        los segmentos que faltan. Tras el primer fallo no se lanzan más segmentos.
+        Cuando todos terminan, sus checkpoints se borran (el resultado completo
+        lo guarda en caché quien llama).
+        """
+        segments = plan_segments(audio_path, max_bytes=self.backend.max_upload_bytes)
+        if len(segments) == 1:
+            result = self._transcribe_file(audio_path, timestamps)
+            if on_chunk:
+                on_chunk(0, 1, result)
+            return result
+
+        results = [None] * len(segments)
+        if checkpoint_key:
+            for index, result in self._load_checkpoints(checkpoint_key, segments, timestamps).items():
+                results[index] = result
+                if on_chunk:
+                    on_chunk(index, len(segments), result)
+            restored = sum(result is not None for result in results)
+            if restored:
+                logger.info(f"Reanudando transcripción: {restored} de {len(segments)} segmentos ya transcritos")
+
+        def transcribe_segment(start, end):
+            result = self._transcribe_segment(audio_path, start, end, timestamps)
+            if checkpoint_key:
+                self._save_checkpoint(checkpoint_key, start, end, result, timestamps)
+            return result
+
+        with ContextThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(transcribe_segment, start, end): index
+                       for index, (start, end) in enumerate(segments) if results[index] is None}
+            try:
+                for future in as_completed(futures):
+                    index = futures[future]
+                    results[index] = future.result()
+                    if on_chunk:
+                        on_chunk(index, len(segments), results[index])
+            except BaseException:
+                # Los segmentos en curso terminan (y guardan su checkpoint); los pendientes no se envían
+                for future in futures:
+                    future.cancel()
+                raise
 
-    def transcribe(self, audio_path):
+        if checkpoint_key:
+            self._delete_checkpoints(checkpoint_key, segments)
+
+        if not timestamps:
+            return stitch_transcripts(results)
+
+        # Desplazar cada trozo a su posición y descartar lo repetido en el solapamiento
+        merged = SegmentList()
+        for (start, _), part in zip(segments, results):
+            merged.extend(part, offset=start, after=merged.ends[-1] if len(merged) else None)
+        return merged
+
+    def _run_transcription(self, audio_path, long_audio=None, timestamps=False, on_chunk=None,
+                           checkpoint_key=None):
+        """
+        Preprocesa el audio (si está activado) y lo transcribe en una sola
+        petición o por segmentos según su tamaño (con checkpoints por segmento
+        bajo `checkpoint_key`).
+        """
+        upload_path = audio_path
+        if PREPROCESS_AUDIO:
+            try:
+                # Con marcas de tiempo no se recortan silencios para no desplazarlas
+                upload_path = preprocess_audio(audio_path, trim_silence=not timestamps)
+            except Exception as e:
+                logger.warning(f"No se pudo preprocesar el audio, se envía el original: {str(e)}")
+
+        try:
+            if long_audio is None:
+                limit = self.backend.max_upload_bytes
+                long_audio = limit is not None and os.path.getsize(upload_path) > limit
+
+            if long_audio:
+                return self.transcribe_long(upload_path, timestamps=timestamps, on_chunk=on_chunk,
+                                            checkpoint_key=checkpoint_key)
+            result = self._transcribe_file(upload_path, timestamps)
+            if on_chunk:
+                on_chunk(0, 1, result)
+            return result
+        finally:
+            if upload_path != audio_path:
+                os.unlink(upload_path)
+
+    def transcribe(self, audio_path, long_audio=None, cache_key=None, timer=None, on_chunk=None, index=True):
         """
         Transcribe audio file to text using OpenAI Whisper API.
         Auto-detects the language of the audio.
+
+        The audio is first downmixed, resampled and stripped of silences
+        (PREPROCESS_AUDIO). Files above the API upload limit (or when
+        `long_audio` is True) are split into segments and transcribed in parallel. `cache_key` may be
+        passed when the content hash is already known (e.g. computed while
+        the upload was streamed to disk). If a StageTimer is given, the cache
+        lookup, the transcription itself and the cache write are timed.
+        `on_chunk(index, total, text)` is called as each segment finishes
+        (not on cache hits), so callers can show partial text early.
+        Segments of long audio are checkpointed in the cache as they finish,
+        so a retry after a failure only transcribes the missing ones.
+
+        Concurrent calls for the same content are coalesced: only the first
+        one transcribes and the others wait for its result (without chunk
+        callbacks). With `index=False` the caller indexes the text itself
+        (YouTube videos are indexed under their video ID, with title and URL).
         """
+        stage = timer.stage if timer is not None else lambda name: nullcontext()
         try:
-            # Primero intentamos obtener del caché
-            cached_result = self.get_from_cache(audio_path)
-            if cached_result:
+            # Primero intentamos obtener del caché (el hash se calcula una sola vez)
+            with stage("cache_lookup"):
+                cache_key = self._entry_key(cache_key or self.get_cache_key(audio_path))
+                cached_result = self.get_from_cache(audio_path, cache_key)
+            if cached_result is not None:
                 return cached_result
 
-            # Si no está en caché, transcribimos
-            with open(audio_path, "rb") as audio_file:
-                # Seleccionar modelo según el tamaño del archivo
-                file_size = os.path.getsize(audio_path)
-                model = "whisper-1"
-                if file_size < 1024 * 1024:  # Si es menor a 1MB
-                    model = "whisper-1"  # Usar modelo más ligero para archivos pequeños
-
-                response = self.client.audio.transcriptions.create(
-                    model=model,
-                    file=audio_file,
-                    response_format="text"
-                )
-                
+            def run():
+                # Otra petición pudo terminar entre la consulta y el inicio de esta
+                cached = self.get_from_cache(audio_path, cache_key)
+                if cached is not None:
+                    return cached
+
+                # Si no está en caché, transcribimos
+                with stage(f"transcribe_{self.backend.name}"):
+                    response = self._run_transcription(audio_path, long_audio, on_chunk=on_chunk,
+                                                       checkpoint_key=f"{cache_key}-text")
+
                 # Guardar en caché
-                self.save_to_cache(audio_path, response)
+                with stage("cache_save"):
+                    self.save_to_cache(audio_path, response, cache_key, index=index)
                 return response
 
+            return _inflight.do(('transcribe', cache_key), run)
+
         except Exception as e:
-            if "API key" in str(e):
-                raise Exception("Error de API: Verifica tu API key de OpenAI")
-            elif "file format" in str(e).lower():
-                raise Exception("Formato de archivo no soportado")
-            else:
-                raise Exception(f"Error durante la transcripción: {str(e)}")
\ No newline at end of file
+            raise transcription_error(e)
+
+    def transcribe_segments(self, audio_path, long_audio=None, cache_key=None):
+        """
+        Transcribe the audio keeping segment timestamps (for subtitles).
+        Returns a SegmentList; it is cached alongside the plain text.
+        """
+        try:
+            if not self.backend.supports_timestamps:
+                raise ValueError(f"El motor '{self.backend.name}' no genera marcas de tiempo")
+
+            cache_key = self._entry_key(cache_key or self.get_cache_key(audio_path))
+            segments = self.get_segments_from_cache(cache_key)
+            if segments is not None:
+                return segments
+
+            def run():
+                cached = self.get_segments_from_cache(cache_key)
+                if cached is not None:
+                    return cached
+
+                segments = self._run_transcription(audio_path, long_audio, timestamps=True,
+                                                   checkpoint_key=f"{cache_key}-segments")
+
+                self.save_segments_to_cache(cache_key, segments)
+                if self.get_from_cache(audio_path, cache_key) is None:
+                    self.save_to_cache(audio_path, segments.text, cache_key)
+                return segments
+
+            return _inflight.do(('segments', cache_key), run)
+
+        except Exception as e:
+            raise transcription_error(e)
+
+    def transcribe_many(self, audio_paths, max_workers=TRANSCRIPTION_WORKERS):
+        """
+        Transcribe varios archivos en paralelo (mismo orden que `audio_paths`).
+        Cada archivo pasa por transcribe(): caché, preprocesado, división de
+        audios largos, puntos de control y agrupación de peticiones iguales.
+        """
+        with ContextThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(self.transcribe, audio_paths))
@@ -0,0 +1,205 @@
+"""
+Benchmark del pipeline de transcripción contra un servidor local que imita
+la API de OpenAI (fake_openai_server.py).
+
+Ejemplo:
+    python benchmark.py --scenario all --requests 50 --concurrency 8 --latency 0.3
+"""
+import os
+import sys
+import json
+import math
+import time
+import wave
+import random
+import argparse
+import resource
+import tempfile
+import statistics
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from fake_openai_server import FakeOpenAIServer
+
+SCENARIOS = ('transcribe', 'format', 'summary', 'translate', 'upload')
+
+
+def make_wav(path, seconds, sample_rate=16000, seed=0):
+    """Generar un WAV sintético: ráfagas de tono (voz) separadas por silencios con ruido."""
+    rng = random.Random(seed)
+    samples = array('h')
+    position = 0
+    while position < seconds * sample_rate:
+        burst = int(rng.uniform(0.5, 2.0) * sample_rate)
+        frequency = rng.uniform(150, 400)
+        samples.extend(int(8000 * math.sin(2 * math.pi * frequency * i / sample_rate)) for i in range(burst))
+        pause = int(rng.uniform(0.2, 1.5) * sample_rate)
+        samples.extend(int(rng.gauss(0, 30)) for _ in range(pause))
+        position += burst + pause
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(samples.tobytes())
+    return path
+
+
+def make_text(words, seed=0):
+    """Generar una transcripción sintética de `words` palabras."""
+    rng = random.Random(seed)
+    vocabulary = ("hola bienvenidos al programa hoy hablamos de tecnología audio transcripción "
+                  "inteligencia artificial modelo datos rendimiento latencia usuario servidor").split()
+    sentences = []
+    while sum(len(s.split()) for s in sentences) < words:
+        sentences.append(' '.join(rng.choice(vocabulary) for _ in range(rng.randint(6, 18))).capitalize() + '.')
+    return ' '.join(sentences)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb():
+    """Memoria residente máxima del proceso (MB)."""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa en KB y macOS en bytes
+    return usage / 1024 / 1024 if sys.platform == 'darwin' else usage / 1024
+
+
+def run_load(func, inputs, concurrency):
+    """Ejecutar `func` sobre cada entrada con la concurrencia dada y medir latencias."""
+    latencies, errors = [], []
+
+    def timed(item):
+        start = time.perf_counter()
+        try:
+            func(item)
+            latencies.append(time.perf_counter() - start)
+        except Exception as e:
+            errors.append(str(e))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, inputs))
+    wall = time.perf_counter() - start
+
+    return {
+        'requests': len(inputs),
+        'errors': len(errors),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 1) if latencies else 0.0,
+        'rps': round(len(latencies) / wall, 2) if wall else 0.0,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def build_scenarios(args, workdir):
+    """Preparar las funciones y entradas de cada escenario (entradas repetidas para medir la caché)."""
+    from audio_processor import AudioTranscriber
+    from translator import Translator
+    from utils import format_transcription, generate_summary
+
+    unique = max(1, args.unique)
+    audio_files = [make_wav(os.path.join(workdir, f"audio_{i}.wav"), args.audio_seconds, seed=i)
+                   for i in range(unique)]
+    texts = [make_text(args.text_words, seed=i) for i in range(unique)]
+    inputs = lambda items: [items[i % unique] for i in range(args.requests)]
+
+    transcriber = AudioTranscriber()
+    translator = Translator()
+    scenarios = {
+        'transcribe': (transcriber.transcribe, inputs(audio_files)),
+        'format': (format_transcription, inputs(texts)),
+        'summary': (generate_summary, inputs(texts)),
+        'translate': (lambda text: translator.translate_text(text, 'en'), inputs(texts)),
+    }
+
+    try:
+        from fastapi.testclient import TestClient
+        from api import app
+        client = TestClient(app)
+
+        def upload(path):
+            with open(path, 'rb') as f:
+                response = client.post('/upload', files={'file': (os.path.basename(path), f, 'audio/wav')})
+            response.raise_for_status()
+
+        scenarios['upload'] = (upload, inputs(audio_files))
+    except ImportError as e:
+        print(f"Escenario 'upload' no disponible: {e}", file=sys.stderr)
+
+    return scenarios
+
+
+def cache_stats():
+    from cache import _caches
+    return {os.path.basename(path) or path: cache.stats() for path, cache in _caches.items()}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline de transcripción")
+    parser.add_argument("--scenario", choices=SCENARIOS + ('all',), default='all')
+    parser.add_argument("--requests", type=int, default=20, help="Peticiones por escenario")
+    parser.add_argument("--unique", type=int, default=10,
+                        help="Entradas distintas (el resto son repeticiones que deberían salir de caché)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.2, help="Latencia simulada de la API (s)")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=None, help="Límite simulado de peticiones por minuto")
+    parser.add_argument("--audio-seconds", type=float, default=10)
+    parser.add_argument("--text-words", type=int, default=800)
+    parser.add_argument("--preprocess", action="store_true", help="Activar el preprocesado de audio (requiere ffmpeg)")
+    parser.add_argument("--json", help="Guardar los resultados en este archivo JSON")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    server = FakeOpenAIServer(latency=args.latency, jitter=args.jitter,
+                              error_rate=args.error_rate, rpm_limit=args.rpm).start()
+
+    # La configuración se lee al crear el cliente compartido: fijarla antes de importar
+    os.environ['OPENAI_BASE_URL'] = server.base_url
+    os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+    os.environ['PREPROCESS_AUDIO'] = '1' if args.preprocess else '0'
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    workdir = tempfile.mkdtemp(prefix="benchmark-")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    # Las cachés usan rutas relativas: aislarlas en el directorio temporal
+    os.chdir(workdir)
+
+    try:
+        scenarios = build_scenarios(args, workdir)
+        selected = [name for name in SCENARIOS if name in scenarios and args.scenario in (name, 'all')]
+
+        results = {}
+        for name in selected:
+            func, inputs = scenarios[name]
+            requests_before = server.stats['requests']
+            results[name] = run_load(func, inputs, args.concurrency)
+            results[name]['api_calls'] = server.stats['requests'] - requests_before
+            print(f"{name:<11} p50={results[name]['p50_ms']:>8} ms  p95={results[name]['p95_ms']:>8} ms  "
+                  f"rps={results[name]['rps']:>7}  errores={results[name]['errors']}  "
+                  f"llamadas_api={results[name]['api_calls']}  rss={results[name]['peak_rss_mb']} MB")
+
+        report = {'config': vars(args), 'scenarios': results, 'caches': cache_stats(), 'server': server.stats}
+        for cache_name, stats in report['caches'].items():
+            lookups = stats['hits'] + stats['misses']
+            hit_rate = stats['hits'] / lookups if lookups else 0.0
+            print(f"caché {cache_name:<14} aciertos={stats['hits']} fallos={stats['misses']} tasa={hit_rate:.0%}")
+
+        if json_path:
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,544 @@
+import os
+import json
+import time
+import zlib
+import shutil
+import sqlite3
+import hashlib
+import tempfile
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+from metrics import CACHE_REQUESTS
+
+# Tamaño de bloque para calcular hashes sin cargar el archivo completo en memoria
+HASH_CHUNK_SIZE = 1024 * 1024
+
+DEFAULT_MAX_BYTES = int(os.getenv('CACHE_MAX_MB', '500')) * 1024 * 1024
+DEFAULT_MAX_AGE = int(os.getenv('CACHE_MAX_AGE_DAYS', '30')) * 24 * 3600
+
+INDEX_FILE = "index.json"
+
+# Backend de las cachés de resultados: "sqlite" (por defecto) o "json" (un archivo por entrada)
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'sqlite')
+# Base de datos compartida por todos los procesos (API, workers, Streamlit)
+CACHE_DB_PATH = os.getenv('CACHE_DB_PATH', os.path.join('cache', 'cache.db'))
+# Nivel de compresión zlib de los valores guardados en SQLite
+CACHE_COMPRESSION_LEVEL = 6
+# Las entradas caducadas (por antigüedad o TTL) se purgan cada tantas escrituras;
+# el tamaño máximo se comprueba en cada escritura
+EVICT_EVERY_WRITES = 100
+# El último acceso sólo se actualiza si ha pasado este tiempo (evita una escritura por lectura)
+TOUCH_INTERVAL = 60
+
+
+def hash_file(path, chunk_size=HASH_CHUNK_SIZE):
+    """Calcula el SHA-256 de un archivo leyéndolo por bloques."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_text(text):
+    """Calcula el SHA-256 de un texto."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def atomic_write(path, data):
+    """Escribe bytes en `path` de forma atómica (archivo temporal + rename)."""
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+logger = logging.getLogger(__name__)
+
+# Funciones avisadas cuando la caché expulsa o caduca entradas, por espacio de nombres
+_evict_listeners: Dict[str, List[Callable[[List[str]], None]]] = {}
+_evict_listeners_lock = threading.Lock()
+
+
+def on_evict(namespace: str, listener: Callable[[List[str]], None]):
+    """
+    Registra `listener(keys)` para las entradas de `namespace` que la caché
+    expulsa por tamaño o elimina por caducidad (no las borradas con delete_many).
+    """
+    with _evict_listeners_lock:
+        listeners = _evict_listeners.setdefault(namespace, [])
+        if listener not in listeners:
+            listeners.append(listener)
+
+
+def _notify_evicted(namespace: str, keys: List[str]):
+    if not keys:
+        return
+    with _evict_listeners_lock:
+        listeners = list(_evict_listeners.get(namespace, ()))
+    for listener in listeners:
+        try:
+            listener(keys)
+        except Exception as e:
+            logger.warning(f"Error al procesar las entradas expulsadas de {namespace}: {str(e)}")
+
+
+class CacheBackend:
+    """
+    Interfaz de las cachés de resultados (valores serializables a JSON).
+
+    Una entrada caduca si no se usa en `max_age` segundos o, si se indicó
+    `ttl` al guardarla, pasado ese tiempo. Cada backend aplica además un
+    tamaño máximo expulsando las entradas usadas hace más tiempo. Un backend
+    en red (Redis, memcached...) sólo necesita implementar estos métodos.
+    """
+
+    name = None
+    # Nombre con el que se registran los avisos de expulsión (on_evict)
+    namespace = None
+
+    def get(self, key):
+        """Devuelve el valor asociado a `key` o None si no está en caché."""
+        raise NotImplementedError
+
+    def put(self, key, value, ttl: Optional[float] = None):
+        """Guarda `value` bajo `key`."""
+        raise NotImplementedError
+
+    def get_many(self, keys: Iterable[str]) -> Dict:
+        """Devuelve {clave: valor} de las claves que están en caché."""
+        found = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def put_many(self, items: Dict, ttl: Optional[float] = None):
+        """Guarda varias entradas {clave: valor}."""
+        for key, value in items.items():
+            self.put(key, value, ttl)
+
+    def delete_many(self, keys: Iterable[str]):
+        """Elimina las entradas de `keys` (las que no existen se ignoran)."""
+        raise NotImplementedError
+
+    def stats(self):
+        """Retorna contadores de uso de la caché (hits, misses, entries, bytes)."""
+        raise NotImplementedError
+
+
+class ContentCache(CacheBackend):
+    """
+    Caché en disco direccionada por contenido.
+
+    Cada entrada se guarda en `<clave>.json` y un índice compacto
+    (`index.json`: clave -> [bytes, último acceso, caducidad]) permite aplicar
+    expulsión LRU por tamaño total y por antigüedad sin recorrer el directorio.
+    Sólo es segura dentro de un proceso.
+    """
+
+    name = "json"
+
+    def __init__(self, cache_dir="cache", max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.namespace = str(self.cache_dir.resolve())
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index = self._load_index()
+        self._total_bytes = sum(entry[0] for entry in self._index.values())
+
+    def _entry_path(self, key):
+        return self.cache_dir / f"{key}.json"
+
+    def _load_index(self):
+        index_path = self.cache_dir / INDEX_FILE
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                return {key: list(entry) for key, entry in json.load(f).items()}
+        except (FileNotFoundError, ValueError):
+            # Reconstruir el índice a partir de las entradas existentes
+            index = {}
+            for entry in self.cache_dir.glob("*.json"):
+                if entry.name == INDEX_FILE:
+                    continue
+                stats = entry.stat()
+                index[entry.stem] = [stats.st_size, stats.st_mtime]
+            return index
+
+    def _save_index(self):
+        data = json.dumps(self._index, separators=(',', ':')).encode('utf-8')
+        atomic_write(self.cache_dir / INDEX_FILE, data)
+
+    def _expired(self, entry, now):
+        # Las entradas antiguas del índice no tienen caducidad propia
+        expires = entry[2] if len(entry) > 2 else None
+        return now - entry[1] > self.max_age or (expires is not None and now >= expires)
+
+    def _remove(self, key):
+        size = self._index.pop(key)[0]
+        self._total_bytes -= size
+        try:
+            os.unlink(self._entry_path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self, now):
+        """
+        Elimina entradas caducadas y, si hace falta, las menos usadas
+        recientemente. Devuelve las claves eliminadas.
+        """
+        evicted = [key for key, entry in self._index.items() if self._expired(entry, now)]
+        for key in evicted:
+            self._remove(key)
+
+        if self._total_bytes > self.max_bytes:
+            for key in sorted(self._index, key=lambda k: self._index[k][1]):
+                if self._total_bytes <= self.max_bytes:
+                    break
+                self._remove(key)
+                evicted.append(key)
+        return evicted
+
+    def get(self, key):
+        """Devuelve el valor asociado a `key` o None si no está en caché."""
+        with self._lock:
+            entry = self._index.get(key)
+            now = time.time()
+            if entry is None or self._expired(entry, now):
+                if entry is not None:
+                    self._remove(key)
+                    self._save_index()
+                    _notify_evicted(self.namespace, [key])
+                self.misses += 1
+                CACHE_REQUESTS.inc(cache=self.cache_dir.name, result='miss')
+                return None
+
+            try:
+                with open(self._entry_path(key), 'r', encoding='utf-8') as f:
+                    value = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self._remove(key)
+                self._save_index()
+                self.misses += 1
+                CACHE_REQUESTS.inc(cache=self.cache_dir.name, result='miss')
+                return None
+
+            # El último acceso se persiste en la siguiente escritura del índice
+            entry[1] = now
+            self.hits += 1
+            CACHE_REQUESTS.inc(cache=self.cache_dir.name, result='hit')
+            return value
+
+    def put(self, key, value, ttl=None):
+        """Guarda `value` (serializable a JSON) bajo `key`."""
+        data = json.dumps(value, ensure_ascii=False).encode('utf-8')
+        with self._lock:
+            atomic_write(self._entry_path(key), data)
+            if key in self._index:
+                self._total_bytes -= self._index[key][0]
+            now = time.time()
+            self._index[key] = [len(data), now, now + ttl if ttl else None]
+            self._total_bytes += len(data)
+            evicted = self._evict(now)
+            self._save_index()
+        _notify_evicted(self.namespace, evicted)
+
+    def delete_many(self, keys):
+        with self._lock:
+            removed = [key for key in keys if key in self._index]
+            for key in removed:
+                self._remove(key)
+            if removed:
+                self._save_index()
+
+    def stats(self):
+        """Retorna contadores de uso de la caché."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._index),
+                'bytes': self._total_bytes,
+            }
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Caché en una base de datos SQLite en modo WAL, segura entre procesos
+    (varios workers de uvicorn, el worker de trabajos y Streamlit comparten
+    el mismo archivo). Cada caché es un espacio de nombres dentro de la misma
+    tabla; los valores se guardan en JSON comprimido con zlib.
+
+    El tamaño máximo y la antigüedad máxima se aplican a la base de datos
+    completa, expulsando primero las entradas usadas hace más tiempo. El
+    tamaño total se mantiene con triggers en la tabla `totals`, así que cada
+    escritura comprueba el límite sin recorrer las entradas.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, namespace="cache", db_path=CACHE_DB_PATH, max_bytes=DEFAULT_MAX_BYTES,
+                 max_age=DEFAULT_MAX_AGE, label=None):
+        self.namespace = namespace
+        # Nombre corto de la caché en las métricas
+        self.label = label or Path(namespace).name
+        self.db_path = str(db_path)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._counts_lock = threading.Lock()
+        self._local = threading.local()
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL,"
+                " size INTEGER NOT NULL, accessed REAL NOT NULL, expires REAL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            # Tamaño total de la base de datos, mantenido por triggers
+            conn.execute("CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO totals (id, bytes) SELECT 0, COALESCE(SUM(size), 0) FROM entries")
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN"
+                " UPDATE totals SET bytes = bytes + new.size WHERE id = 0; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries BEGIN"
+                " UPDATE totals SET bytes = bytes + new.size - old.size WHERE id = 0; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN"
+                " UPDATE totals SET bytes = bytes - old.size WHERE id = 0; END"
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión propia de cada hilo (sqlite3 no comparte conexiones entre hilos)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _encode(value) -> bytes:
+        return zlib.compress(json.dumps(value, ensure_ascii=False).encode('utf-8'), CACHE_COMPRESSION_LEVEL)
+
+    @staticmethod
+    def _decode(data: bytes):
+        return json.loads(zlib.decompress(data).decode('utf-8'))
+
+    def _count(self, hits, misses):
+        with self._counts_lock:
+            self.hits += hits
+            self.misses += misses
+        if hits:
+            CACHE_REQUESTS.inc(hits, cache=self.label, result='hit')
+        if misses:
+            CACHE_REQUESTS.inc(misses, cache=self.label, result='miss')
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        keys = list(dict.fromkeys(keys))
+        now = time.time()
+        found, stale, touched = {}, [], []
+        conn = self._connection()
+        # Consultar por bloques para no superar el límite de parámetros de SQLite
+        for start in range(0, len(keys), 500):
+            block = keys[start:start + 500]
+            rows = conn.execute(
+                f"SELECT key, value, accessed, expires FROM entries "
+                f"WHERE namespace = ? AND key IN ({','.join('?' * len(block))})",
+                [self.namespace, *block]
+            ).fetchall()
+            for key, data, accessed, expires in rows:
+                if now - accessed > self.max_age or (expires is not None and now >= expires):
+                    stale.append(key)
+                    continue
+                try:
+                    found[key] = self._decode(data)
+                except (zlib.error, ValueError):
+                    stale.append(key)
+                    continue
+                if now - accessed > TOUCH_INTERVAL:
+                    touched.append(key)
+
+        if stale or touched:
+            with conn:
+                conn.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?",
+                                 [(self.namespace, key) for key in stale])
+                conn.executemany("UPDATE entries SET accessed = ? WHERE namespace = ? AND key = ?",
+                                 [(now, self.namespace, key) for key in touched])
+            _notify_evicted(self.namespace, stale)
+
+        self._count(len(found), len(keys) - len(found))
+        return found
+
+    def put(self, key, value, ttl=None):
+        self.put_many({key: value}, ttl)
+
+    def put_many(self, items, ttl=None):
+        if not items:
+            return
+        now = time.time()
+        expires = now + ttl if ttl else None
+        rows = []
+        for key, value in items.items():
+            data = self._encode(value)
+            rows.append((self.namespace, key, data, len(data), now, expires))
+        conn = self._connection()
+        with conn:
+            # UPSERT en lugar de INSERT OR REPLACE para que los triggers de tamaño se disparen
+            conn.executemany(
+                "INSERT INTO entries (namespace, key, value, size, accessed, expires) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (namespace, key) DO UPDATE SET "
+                "value = excluded.value, size = excluded.size, accessed = excluded.accessed, "
+                "expires = excluded.expires",
+                rows
+            )
+            total = conn.execute("SELECT bytes FROM totals WHERE id = 0").fetchone()[0]
+        with self._counts_lock:
+            self._writes += len(rows)
+            due = self._writes >= EVICT_EVERY_WRITES or total > self.max_bytes
+            if due:
+                self._writes = 0
+        if due:
+            self.evict()
+
+    def delete_many(self, keys):
+        conn = self._connection()
+        with conn:
+            conn.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?",
+                             [(self.namespace, key) for key in keys])
+
+    def evict(self):
+        """Elimina las entradas caducadas y, si se supera el tamaño máximo, las menos usadas."""
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            # Las claves eliminadas de cualquier espacio de nombres se notifican a sus oyentes
+            evicted = conn.execute(
+                "DELETE FROM entries WHERE accessed < ? OR expires <= ? RETURNING namespace, key",
+                (now - self.max_age, now)
+            ).fetchall()
+            total = conn.execute("SELECT bytes FROM totals WHERE id = 0").fetchone()[0]
+            while total > self.max_bytes:
+                rows = conn.execute(
+                    "SELECT rowid, size, namespace, key FROM entries ORDER BY accessed LIMIT 100").fetchall()
+                if not rows:
+                    break
+                # Borrar sólo las necesarias para volver por debajo del límite
+                doomed = []
+                for rowid, size, namespace, key in rows:
+                    if total <= self.max_bytes:
+                        break
+                    doomed.append((rowid,))
+                    evicted.append((namespace, key))
+                    total -= size
+                conn.executemany("DELETE FROM entries WHERE rowid = ?", doomed)
+
+        by_namespace = {}
+        for namespace, key in evicted:
+            by_namespace.setdefault(namespace, []).append(key)
+        for namespace, keys in by_namespace.items():
+            _notify_evicted(namespace, keys)
+
+    def stats(self):
+        entries, size = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries WHERE namespace = ?",
+            (self.namespace,)
+        ).fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': size}
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(cache_dir="cache", backend=None):
+    """
+    Retorna la instancia compartida de la caché `cache_dir`. Con el backend
+    SQLite (CACHE_BACKEND) la ruta absoluta del directorio es el espacio de
+    nombres dentro de CACHE_DB_PATH, así que `a/cache` y `b/cache` no se mezclan.
+    """
+    backend = backend or CACHE_BACKEND
+    namespace = str(Path(cache_dir).resolve())
+    key = f"{backend}:{namespace}"
+    with _caches_lock:
+        if key not in _caches:
+            if backend == "sqlite":
+                _caches[key] = SQLiteCache(namespace)
+            elif backend == "json":
+                _caches[key] = ContentCache(cache_dir)
+            else:
+                raise ValueError(f"Backend de caché no soportado: {backend}")
+        return _caches[key]
+
+
+class FileStore:
+    """
+    Almacén de archivos en disco con expulsión LRU por tamaño total.
+    El último acceso se registra en la fecha de modificación de cada archivo.
+    """
+
+    def __init__(self, store_dir, max_bytes):
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Devuelve la ruta del archivo guardado bajo `key` o None."""
+        with self._lock:
+            for path in self.store_dir.glob(f"{key}.*"):
+                os.utime(path)
+                CACHE_REQUESTS.inc(cache=self.store_dir.name, result='hit')
+                return str(path)
+        CACHE_REQUESTS.inc(cache=self.store_dir.name, result='miss')
+        return None
+
+    def put(self, key, src_path):
+        """Mueve `src_path` al almacén bajo `key` y devuelve su nueva ruta."""
+        extension = Path(src_path).suffix
+        target = self.store_dir / f"{key}{extension}"
+        with self._lock:
+            shutil.move(src_path, target)
+            self._evict(keep=target)
+        return str(target)
+
+    def _evict(self, keep):
+        files = [(p.stat(), p) for p in self.store_dir.iterdir() if p.is_file()]
+        total = sum(stats.st_size for stats, _ in files)
+        for stats, path in sorted(files, key=lambda f: f[0].st_mtime):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            path.unlink()
+            total -= stats.st_size
@@ -0,0 +1,222 @@
+"""
+Servidor local que imita los endpoints de OpenAI usados por la aplicación
+(transcripciones de Whisper y chat completions) para pruebas de carga.
+
+Uso:
+    python fake_openai_server.py --port 8100 --latency 0.5 --error-rate 0.01 --rpm 600
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=test python api.py
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+SAMPLE_TEXT = ("Esta es una transcripción simulada generada por el servidor de pruebas. "
+               "Sirve para medir la latencia y el rendimiento de la aplicación sin llamar a la API real. ")
+
+
+class FakeOpenAIServer:
+    """
+    Servidor HTTP en un hilo con latencia, errores 5xx y límite de
+    peticiones por minuto (429) configurables.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.2, jitter=0.1, error_rate=0.0,
+                 rpm_limit=None, transcript_words=200, token_latency=0.0):
+        self.latency = latency
+        # Pausa entre fragmentos de las respuestas en streaming (s)
+        self.token_latency = token_latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rpm_limit = rpm_limit
+        self.transcript_words = transcript_words
+        self.stats = {'requests': 0, 'errors': 0, 'rate_limited': 0, 'bytes_received': 0}
+        self._lock = threading.Lock()
+        self._recent = deque()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _admit(self, size):
+        """Registra la petición y decide si responde con 429, 500 o éxito."""
+        now = time.monotonic()
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['bytes_received'] += size
+            if self.rpm_limit:
+                while self._recent and now - self._recent[0] > 60:
+                    self._recent.popleft()
+                if len(self._recent) >= self.rpm_limit:
+                    self.stats['rate_limited'] += 1
+                    return 429
+                self._recent.append(now)
+            if random.random() < self.error_rate:
+                self.stats['errors'] += 1
+                return 500
+        return 200
+
+    def _transcript(self):
+        words = (SAMPLE_TEXT * (self.transcript_words // 20 + 1)).split()[:self.transcript_words]
+        return ' '.join(words)
+
+    def _chat_reply(self, request):
+        messages = request.get('messages', [])
+        prompt = messages[-1]['content'] if messages else ''
+        response_format = (request.get('response_format') or {}).get('type')
+
+        if response_format == 'json_schema':
+            return json.dumps({"resumen": prompt[:200], "puntos_clave": ["Punto 1", "Punto 2", "Punto 3"]})
+        if response_format == 'json_object':
+            # Traducción por lotes: la lista JSON de textos va tras la última línea en blanco
+            try:
+                texts = json.loads(prompt.rsplit('\n\n', 1)[-1])
+            except ValueError:
+                texts = []
+            return json.dumps({"traducciones": [f"[traducido] {t}" for t in texts]})
+        return prompt
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type="application/json", headers=None):
+                data = body.encode('utf-8') if isinstance(body, str) else body
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                status = server._admit(len(body))
+                time.sleep(max(0.0, server.latency + random.uniform(-server.jitter, server.jitter)))
+
+                if status == 429:
+                    error = {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}}
+                    return self._send(429, json.dumps(error), headers={"retry-after": "1"})
+                if status == 500:
+                    error = {"error": {"message": "Simulated server error", "type": "server_error"}}
+                    return self._send(500, json.dumps(error))
+
+                try:
+                    if self.path.endswith('/audio/transcriptions'):
+                        return self._transcription(body)
+                    if self.path.endswith('/chat/completions'):
+                        return self._chat(json.loads(body or b'{}'))
+                except Exception as e:
+                    return self._send(500, json.dumps({"error": {"message": str(e), "type": "server_error"}}))
+                self._send(404, json.dumps({"error": {"message": "Not found"}}))
+
+            def _transcription(self, body):
+                text = server._transcript()
+                if b'verbose_json' in body:
+                    words = text.split()
+                    segments = [
+                        {"id": i, "start": i * 5.0, "end": i * 5.0 + 5.0, "text": ' '.join(words[i * 12:(i + 1) * 12])}
+                        for i in range((len(words) + 11) // 12)
+                    ]
+                    payload = {"task": "transcribe", "language": "spanish", "duration": len(segments) * 5.0,
+                               "text": text, "segments": segments}
+                    return self._send(200, json.dumps(payload))
+                self._send(200, text, content_type="text/plain")
+
+            def _stream_chat(self, request, content, usage):
+                """Respuesta en streaming (SSE), un evento por palabra."""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                base = {"id": "chatcmpl-fake", "object": "chat.completion.chunk",
+                        "created": int(time.time()), "model": request.get('model', 'fake')}
+                words = re.findall(r'\S+\s*', content)
+                for index, word in enumerate(words):
+                    choice = {"index": 0, "delta": {"content": word},
+                              "finish_reason": "stop" if index == len(words) - 1 else None}
+                    self.wfile.write(f"data: {json.dumps({**base, 'choices': [choice]})}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+                    if server.token_latency:
+                        time.sleep(server.token_latency)
+                if (request.get('stream_options') or {}).get('include_usage'):
+                    self.wfile.write(f"data: {json.dumps({**base, 'choices': [], 'usage': usage})}\n\n".encode('utf-8'))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+            def _chat(self, request):
+                content = server._chat_reply(request)
+                prompt_tokens = sum(len(m.get('content', '')) for m in request.get('messages', [])) // 4
+                usage = {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(content) // 4,
+                    "total_tokens": prompt_tokens + len(content) // 4
+                }
+                if request.get('stream'):
+                    return self._stream_chat(request, content, usage)
+                payload = {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get('model', 'fake'),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop"
+                    }],
+                    "usage": usage
+                }
+                self._send(200, json.dumps(payload))
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita la API de OpenAI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.2, help="Latencia media por petición (s)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Variación de la latencia (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Proporción de respuestas 500")
+    parser.add_argument("--rpm", type=int, default=None, help="Límite de peticiones por minuto (429)")
+    parser.add_argument("--token-latency", type=float, default=0.0,
+                        help="Pausa entre fragmentos de las respuestas en streaming (s)")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(args.host, args.port, args.latency, args.jitter, args.error_rate, args.rpm,
+                              token_latency=args.token_latency)
+    print(f"Servidor de pruebas en {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,11 @@
 import streamlit as st
 import os
+import hashlib
 import tempfile
-import json
 from audio_processor import AudioTranscriber
-from youtube_processor import YouTubeProcessor
-from utils import get_supported_formats, format_transcription, generate_summary
+from youtube_processor import YouTubeProcessor, get_video_id
+from pipeline import post_process, stream_post_process
+from utils import get_supported_formats
 
 # Configuración de la página
 st.set_page_config(
@@ -83,15 +84,50 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-def process_transcription(audio_path, progress_bar, status_text):
-    """Procesar la transcripción de un archivo de audio."""
+@st.cache_resource
+def get_transcriber():
+    """Transcriptor compartido entre reruns y sesiones."""
+    return AudioTranscriber()
+
+@st.cache_resource
+def get_youtube_processor():
+    """Procesador de YouTube compartido entre reruns y sesiones."""
+    return YouTubeProcessor()
+
+def get_session_results(key):
+    """
+    Resultados guardados en la sesión para un contenido (hash del archivo o
+    ID del video): transcripción, texto formateado y resumen. Así los reruns
+    de Streamlit no repiten llamadas a la API.
+    """
+    return st.session_state.setdefault('results', {}).setdefault(key, {})
+
+def get_upload_hash(uploaded_file):
+    """Hash del archivo subido, calculado una sola vez por archivo."""
+    hashes = st.session_state.setdefault('upload_hashes', {})
+    file_id = getattr(uploaded_file, 'file_id', None) or f"{uploaded_file.name}:{uploaded_file.size}"
+    if file_id not in hashes:
+        hashes[file_id] = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+    return hashes[file_id]
+
+def process_transcription(audio_path, progress_bar, status_text, cache_key=None, index=True):
+    """
+    Procesar la transcripción de un archivo de audio. La barra de progreso
+    avanza con cada segmento transcrito. Con `index=False` no se añade al
+    índice de búsqueda (los videos de YouTube se indexan con su título).
+    """
     try:
-        transcriber = AudioTranscriber()
+        transcriber = get_transcriber()
         status_text.text("Processing audio file...")
-        progress_bar.progress(25)
+        progress_bar.progress(5)
+        completed = []
+
+        def on_chunk(index, total, text):
+            completed.append(index)
+            progress_bar.progress(5 + int(90 * len(completed) / total))
+            status_text.text(f"Transcribed segment {len(completed)} of {total}...")
 
-        transcription = transcriber.transcribe(audio_path)
-        progress_bar.progress(75)
+        transcription = transcriber.transcribe(audio_path, cache_key=cache_key, on_chunk=on_chunk, index=index)
 
         progress_bar.progress(100)
         status_text.text("Processing completed!")
@@ -100,7 +136,7 @@ def process_transcription(audio_path, progress_bar, status_text):
     except Exception as e:
         raise Exception(f"Error processing transcription: {str(e)}")
 
-def show_transcription_ui(transcription, file_name):
+def show_transcription_ui(transcription, formatted_text, file_name):
     """Mostrar la interfaz de transcripción."""
     with st.expander("📝 View Transcription", expanded=True):
         st.markdown("<div class='transcription-container'>", unsafe_allow_html=True)
@@ -119,51 +155,98 @@ def show_transcription_ui(transcription, file_name):
 
         # Contenido de la transcripción
         st.markdown("<div class='transcription-text'>", unsafe_allow_html=True)
-        formatted_text = format_transcription(transcription)
         st.markdown(formatted_text)
         st.markdown("</div>", unsafe_allow_html=True)
         st.markdown("</div>", unsafe_allow_html=True)
 
-def show_summary_ui(transcription, status_text):
-    """Mostrar la interfaz del resumen."""
+def show_results_ui(results, file_name, status_text):
+    """
+    Mostrar la transcripción formateada y, si se solicita, el resumen.
+    El formateo y el resumen se generan en paralelo y se guardan en la
+    sesión, de modo que los reruns no vuelven a llamar a la API. El texto
+    formateado se muestra según lo genera el modelo.
+    """
+    transcription = results['transcription']
+    transcription_area = st.container()
     if st.button("🤖 Generate AI Summary"):
-        status_text.text("Generating summary...")
-        summary_json = generate_summary(transcription)
+        results['summary_requested'] = True
+    want_summary = results.get('summary_requested', False)
 
-        try:
-            summary_data = json.loads(summary_json)
-            with st.expander("📋 AI Summary", expanded=True):
-                st.markdown("<div class='summary-container'>", unsafe_allow_html=True)
+    missing_format = 'formatted' not in results
+    missing_summary = want_summary and 'summary' not in results
+    summary_error = None
+    if missing_format or missing_summary:
+        status_text.text("Formatting transcription..." if missing_format else "Generating summary...")
+        if missing_format:
+            result = {}
+
+            # Vista previa en streaming, sustituida por el resultado final
+            preview = transcription_area.empty()
+            shown = ''
+            for kind, value in stream_post_process(transcription, include_summary=missing_summary):
+                if kind == 'result':
+                    result.update(value)
+                    continue
+                if kind == 'delta':
+                    shown += value
+                elif kind == 'reset':
+                    shown = value
+                else:
+                    continue
+                preview.markdown(shown)
+            preview.empty()
+        else:
+            result = post_process(transcription, include_summary=True, include_format=False)
+        if missing_format:
+            results['formatted'] = result['transcription']
+        if result['summary'] is not None:
+            results['summary'] = result['summary']
+        summary_error = result['errors'].get('summary')
+        status_text.text("Processing completed!")
+
+    with transcription_area:
+        show_transcription_ui(transcription, results['formatted'], file_name)
+
+    if want_summary:
+        if 'summary' in results:
+            show_summary_ui(results['summary'])
+        else:
+            # Permitir reintentar con el botón en el siguiente rerun
+            results['summary_requested'] = False
+            st.error(f"Error generating summary: {summary_error or ''}")
 
-                st.subheader("🔍 Summary")
-                summary_text = f"""RESUMEN DE LA TRANSCRIPCIÓN
+def show_summary_ui(summary_data):
+    """Mostrar la interfaz del resumen (dict validado por generate_summary)."""
+    with st.expander("📋 AI Summary", expanded=True):
+        st.markdown("<div class='summary-container'>", unsafe_allow_html=True)
+
+        st.subheader("🔍 Summary")
+        summary_text = f"""RESUMEN DE LA TRANSCRIPCIÓN
 
 🔍 RESUMEN:
 {summary_data['resumen']}
 
 📌 PUNTOS CLAVE:
 """
-                for i, punto in enumerate(summary_data['puntos_clave'], 1):
-                    summary_text += f"{i}. {punto}\n"
+        for i, punto in enumerate(summary_data['puntos_clave'], 1):
+            summary_text += f"{i}. {punto}\n"
 
-                st.write(summary_text)
+        st.write(summary_text)
 
-                st.subheader("📌 Key Points")
-                st.markdown("<ul class='key-points'>", unsafe_allow_html=True)
-                for punto in summary_data['puntos_clave']:
-                    st.markdown(f"<li>{punto}</li>", unsafe_allow_html=True)
-                st.markdown("</ul>", unsafe_allow_html=True)
+        st.subheader("📌 Key Points")
+        st.markdown("<ul class='key-points'>", unsafe_allow_html=True)
+        for punto in summary_data['puntos_clave']:
+            st.markdown(f"<li>{punto}</li>", unsafe_allow_html=True)
+        st.markdown("</ul>", unsafe_allow_html=True)
 
-                st.download_button(
-                    label="📥 Download Summary",
-                    data=summary_text,
-                    file_name="summary.txt",
-                    mime="text/plain"
-                )
+        st.download_button(
+            label="📥 Download Summary",
+            data=summary_text,
+            file_name="summary.txt",
+            mime="text/plain"
+        )
 
-                st.markdown("</div>", unsafe_allow_html=True)
-        except json.JSONDecodeError:
-            st.error("Error processing the summary response. Please try again.")
+        st.markdown("</div>", unsafe_allow_html=True)
 
 def process_file_upload():
     """Procesar la carga de archivos de audio."""
@@ -174,35 +257,45 @@ def process_file_upload():
     )
 
     if uploaded_file is not None:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(uploaded_file.name)[1]) as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            audio_path = tmp_file.name
+        content_hash = get_upload_hash(uploaded_file)
+        results = get_session_results(content_hash)
 
         try:
             progress_bar = st.progress(0)
             status_text = st.empty()
-            
-            transcription = process_transcription(audio_path, progress_bar, status_text)
-            show_transcription_ui(transcription, uploaded_file.name)
-            show_summary_ui(transcription, status_text)
+
+            if 'transcription' in results:
+                progress_bar.progress(100)
+            else:
+                with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(uploaded_file.name)[1]) as tmp_file:
+                    tmp_file.write(uploaded_file.getvalue())
+                    audio_path = tmp_file.name
+                try:
+                    results['transcription'] = process_transcription(
+                        audio_path, progress_bar, status_text, cache_key=content_hash
+                    )
+                finally:
+                    os.unlink(audio_path)
+
+            show_results_ui(results, uploaded_file.name, status_text)
 
         except Exception as e:
             st.error(f"An error occurred: {str(e)}")
 
-        finally:
-            os.unlink(audio_path)
-
 def process_youtube_url():
     """Procesar URL de YouTube."""
     youtube_url = st.text_input("🎥 Enter YouTube URL", placeholder="https://www.youtube.com/watch?v=...")
     
     if youtube_url:
         try:
-            yt_processor = YouTubeProcessor()
+            yt_processor = get_youtube_processor()
+            results = get_session_results(f"youtube:{get_video_id(youtube_url) or youtube_url}")
             
             # Obtener información del video
-            with st.spinner("Loading video information..."):
-                video_info = yt_processor.get_video_info(youtube_url)
+            if 'video_info' not in results:
+                with st.spinner("Loading video information..."):
+                    results['video_info'] = yt_processor.get_video_info(youtube_url)
+            video_info = results['video_info']
             
             # Mostrar información del video
             st.markdown("<div class='video-info'>", unsafe_allow_html=True)
@@ -221,24 +314,33 @@ def process_youtube_url():
             
             st.markdown("</div>", unsafe_allow_html=True)
             
-            # Botón para transcribir
-            if st.button("🎙️ Transcribe Video"):
+            # Botón para transcribir (una vez transcrito, los reruns muestran el resultado)
+            if st.button("🎙️ Transcribe Video") or 'transcription' in results:
                 progress_bar = st.progress(0)
                 status_text = st.empty()
-                
-                with st.spinner("Downloading audio..."):
-                    audio_path = yt_processor.download_audio(youtube_url)
-                    if audio_path:
-                        try:
-                            transcription = process_transcription(audio_path, progress_bar, status_text)
-                            show_transcription_ui(transcription, video_info['title'])
-                            show_summary_ui(transcription, status_text)
-                        finally:
-                            if os.path.exists(audio_path):
-                                os.unlink(audio_path)
-                    else:
-                        st.error("Error downloading audio from YouTube")
-                        
+
+                # Un video ya procesado no vuelve a descargarse ni transcribirse
+                if 'transcription' not in results:
+                    transcription = yt_processor.get_cached_transcript(youtube_url)
+                    if transcription is None:
+                        with st.spinner("Downloading audio..."):
+                            audio_path = yt_processor.download_audio(youtube_url)
+                        if audio_path:
+                            try:
+                                transcription = process_transcription(audio_path, progress_bar, status_text, index=False)
+                                yt_processor.save_transcript(youtube_url, transcription)
+                            finally:
+                                if os.path.exists(audio_path):
+                                    os.unlink(audio_path)
+                        else:
+                            st.error("Error downloading audio from YouTube")
+                    if transcription is not None:
+                        results['transcription'] = transcription
+
+                if 'transcription' in results:
+                    progress_bar.progress(100)
+                    show_results_ui(results, video_info['title'], status_text)
+
         except Exception as e:
             st.error(f"Error processing YouTube video: {str(e)}")
 
@@ -0,0 +1,127 @@
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, Tuple
+
+# Límites (segundos) de los histogramas de duración
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """Base de las métricas: valores por combinación de etiquetas, protegidos por un lock."""
+
+    type = None
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple, object] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict) -> Tuple:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"La métrica {self.name} espera las etiquetas {self.label_names}")
+        return tuple(labels[name] for name in self.label_names)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """Contador monótono."""
+
+    type = 'counter'
+
+    def inc(self, value: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def _samples(self):
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """Histograma acumulativo (buckets, suma y número de observaciones)."""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def _samples(self):
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}"
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}_sum{labels} {_format_value(round(total, 6))}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+REGISTRY = []
+
+
+def render_metrics() -> str:
+    """Exporta todas las métricas en el formato de texto de Prometheus."""
+    return '\n'.join(metric.render() for metric in REGISTRY) + '\n'
+
+
+# Métricas de la aplicación
+HTTP_REQUEST_SECONDS = Histogram(
+    "transcriber_http_request_seconds", "Duración de las peticiones HTTP", ("method", "route", "status"))
+STAGE_SECONDS = Histogram(
+    "transcriber_stage_seconds", "Duración de cada etapa del procesamiento", ("stage",))
+OPENAI_REQUESTS = Counter(
+    "transcriber_openai_requests_total", "Peticiones HTTP enviadas a OpenAI (incluye reintentos)",
+    ("endpoint", "status"))
+OPENAI_QUEUE_SECONDS = Histogram(
+    "transcriber_openai_queue_seconds", "Espera en el planificador de límites de la API",
+    ("model", "priority"))
+OPENAI_RETRIES = Counter(
+    "transcriber_openai_retries_total", "Reintentos de llamadas a OpenAI por errores transitorios", ("reason",))
+OPENAI_BYTES = Counter(
+    "transcriber_openai_bytes_total", "Bytes enviados y recibidos en las llamadas a OpenAI",
+    ("endpoint", "direction"))
+OPENAI_TOKENS = Counter(
+    "transcriber_openai_tokens_total", "Tokens consumidos en chat completions", ("model", "type"))
+COALESCED_CALLS = Counter(
+    "transcriber_coalesced_calls_total", "Llamadas que esperaron el resultado de otra idéntica en curso",
+    ("operation",))
+CACHE_REQUESTS = Counter(
+    "transcriber_cache_requests_total", "Consultas a las cachés en disco", ("cache", "result"))
@@ -0,0 +1,212 @@
+import os
+import time
+import random
+import threading
+import httpx
+import openai
+from openai import OpenAI
+from dotenv import load_dotenv
+from metrics import OPENAI_REQUESTS, OPENAI_RETRIES, OPENAI_BYTES, OPENAI_TOKENS
+from rate_limiter import scheduler, RateLimitExceeded
+from text_chunking import count_tokens as count_text_tokens
+
+# Cargar variables de entorno
+load_dotenv()
+
+# Conexiones HTTP mantenidas en el pool y peticiones simultáneas permitidas
+MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', '20'))
+MAX_CONCURRENT_REQUESTS = int(os.getenv('OPENAI_MAX_CONCURRENCY', '10'))
+REQUEST_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT_SECONDS', '600'))
+
+# Reintentos con backoff exponencial y jitter ante 429/5xx y errores de conexión
+MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', '5'))
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+# Tokens de respuesta que se reservan cuando la petición no fija max_tokens
+DEFAULT_COMPLETION_TOKENS = int(os.getenv('OPENAI_DEFAULT_COMPLETION_TOKENS', '1000'))
+
+_client = None
+_client_lock = threading.Lock()
+_request_slots = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+
+
+def _endpoint(request: httpx.Request) -> str:
+    """Ruta de la API sin el prefijo de versión (por ejemplo, /chat/completions)."""
+    return request.url.path.split('/v1', 1)[-1] or request.url.path
+
+
+def _count_request(request: httpx.Request):
+    OPENAI_BYTES.inc(int(request.headers.get('content-length', 0)),
+                     endpoint=_endpoint(request), direction='sent')
+
+
+def _count_response(response: httpx.Response):
+    # Sólo se usa la cabecera: leer el cuerpo aquí rompería las respuestas en streaming
+    endpoint = _endpoint(response.request)
+    OPENAI_REQUESTS.inc(endpoint=endpoint, status=str(response.status_code))
+    OPENAI_BYTES.inc(int(response.headers.get('content-length', 0)),
+                     endpoint=endpoint, direction='received')
+
+
+def get_client() -> OpenAI:
+    """
+    Retorna el cliente OpenAI compartido por todo el proceso.
+
+    Usa un pool de conexiones HTTP con keep-alive. La URL base puede
+    sustituirse con OPENAI_BASE_URL (por ejemplo, un servidor local de pruebas).
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_CONNECTIONS
+                ),
+                timeout=REQUEST_TIMEOUT,
+                event_hooks={'request': [_count_request], 'response': [_count_response]}
+            )
+            _client = OpenAI(
+                base_url=os.getenv('OPENAI_BASE_URL') or None,
+                http_client=http_client,
+                # Los reintentos se gestionan en call_with_retry
+                max_retries=0
+            )
+        return _client
+
+
+def is_retryable(error: Exception) -> bool:
+    """Indica si el error es transitorio (límite de peticiones, 5xx o red)."""
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500
+    return False
+
+
+def retry_delay(attempt: int, error: Exception) -> float:
+    """Calcula la espera antes del siguiente intento (Retry-After o backoff con jitter)."""
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), RETRY_MAX_DELAY)
+        except ValueError:
+            pass
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def count_tokens(response):
+    """
+    Suma al contador de tokens el consumo informado en la respuesta y lo
+    devuelve (None si la respuesta no lo incluye).
+    """
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        return None
+    model = getattr(response, 'model', None) or 'unknown'
+    prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+    completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+    OPENAI_TOKENS.inc(prompt_tokens, model=model, type='prompt')
+    OPENAI_TOKENS.inc(completion_tokens, model=model, type='completion')
+    return prompt_tokens + completion_tokens
+
+
+def estimate_tokens(kwargs) -> int:
+    """Tokens que consumirá una petición de chat: mensajes más la respuesta máxima."""
+    messages = kwargs.get('messages')
+    if not messages:
+        return 0
+    prompt = sum(count_text_tokens(m.get('content') or '') for m in messages)
+    return prompt + (kwargs.get('max_tokens') or DEFAULT_COMPLETION_TOKENS)
+
+
+class MeteredStream:
+    """
+    Respuesta en streaming de la API. Conserva la plaza de concurrencia hasta
+    que el stream se agota o se cierra, y corrige el presupuesto de tokens con
+    el consumo del último evento (stream_options={"include_usage": True}).
+    """
+
+    def __init__(self, stream, model, estimated):
+        self._stream = stream
+        self._model = model
+        self._estimated = estimated
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        try:
+            for event in self._stream:
+                if getattr(event, 'usage', None) is not None:
+                    used = count_tokens(event)
+                    if used is not None:
+                        scheduler.settle(self._model, self._estimated, used)
+                yield event
+        finally:
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        try:
+            close = getattr(self._stream, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            _request_slots.release()
+
+    def __del__(self):
+        self.close()
+
+
+def call_with_retry(func, *args, **kwargs):
+    """
+    Ejecuta una llamada a la API limitando la concurrencia y reintentando
+    los errores transitorios. `func` debe poder repetirse (por ejemplo,
+    abrir de nuevo los archivos que envía).
+
+    Antes de cada intento se reserva presupuesto del modelo (argumento
+    `model`) en el planificador de límites; un 429 pausa el modelo para todas
+    las llamadas. Si el límite persiste se lanza RateLimitExceeded.
+
+    Con `stream=True` devuelve un MeteredStream: la plaza de concurrencia se
+    libera cuando el stream termina y el presupuesto se corrige con su uso final.
+    """
+    model = kwargs.get('model')
+    estimated = estimate_tokens(kwargs)
+    attempt = 0
+    while True:
+        scheduler.acquire(model, estimated)
+        _request_slots.acquire()
+        try:
+            response = func(*args, **kwargs)
+        except Exception as e:
+            _request_slots.release()
+            if attempt >= MAX_RETRIES or not is_retryable(e):
+                if isinstance(e, openai.RateLimitError):
+                    raise RateLimitExceeded("Límite de peticiones de la API alcanzado, inténtalo más tarde",
+                                            retry_after=retry_delay(attempt, e)) from e
+                raise
+            OPENAI_RETRIES.inc(reason=type(e).__name__)
+            delay = retry_delay(attempt, e)
+            if isinstance(e, openai.RateLimitError):
+                scheduler.pause(model, delay)
+        else:
+            if kwargs.get('stream'):
+                return MeteredStream(response, model, estimated)
+            _request_slots.release()
+            used = count_tokens(response)
+            if used is not None:
+                scheduler.settle(model, estimated, used)
+            return response
+        attempt += 1
+        time.sleep(delay)
@@ -0,0 +1,230 @@
+import os
+import time
+import queue
+import threading
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, wait, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+from rate_limiter import ContextThreadPoolExecutor
+from utils import FormatReset, format_transcription, generate_summary, stream_format_transcription
+
+# Tiempo máximo por etapa de post-procesamiento (segundos)
+STAGE_TIMEOUT = float(os.getenv('STAGE_TIMEOUT_SECONDS', '300'))
+# Cada cuánto se comprueba si el resumen está listo mientras se formatea en streaming
+SUMMARY_POLL_SECONDS = 0.1
+
+
+class StageTimeoutError(Exception):
+    """Se lanza cuando una etapa supera su tiempo máximo."""
+
+
+class Pipeline:
+    """
+    Ejecutor de etapas con dependencias (DAG). Las etapas independientes se
+    ejecutan en paralelo en un pool de hilos; cada etapa recibe como argumentos
+    los resultados de las etapas de las que depende.
+
+    Si una etapa falla o supera su timeout, se registra el error, las etapas que
+    dependen de ella se omiten y el resto continúa (resultados parciales).
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self.stages: Dict[str, Dict] = {}
+
+    def add_stage(self, name: str, func: Callable, depends_on: Iterable[str] = (),
+                  timeout: Optional[float] = None):
+        self.stages[name] = {'func': func, 'depends_on': tuple(depends_on), 'timeout': timeout}
+        return self
+
+    def _call(self, name, kwargs, timer):
+        func = self.stages[name]['func']
+        if timer is None:
+            return func(**kwargs)
+        with timer.stage(name):
+            return func(**kwargs)
+
+    def run(self, inputs: Optional[Dict] = None, timer=None) -> Dict:
+        """
+        Ejecuta el pipeline. `inputs` son valores iniciales disponibles como
+        dependencias. Devuelve {'results': {...}, 'errors': {...}}.
+        """
+        results = dict(inputs or {})
+        errors: Dict[str, str] = {}
+        pending = {name for name in self.stages if name not in results}
+        running = {}
+
+        executor = ContextThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stage")
+        try:
+            while pending or running:
+                # Omitir etapas cuyas dependencias han fallado o no existen
+                for name in list(pending):
+                    failed = [dep for dep in self.stages[name]['depends_on']
+                              if dep in errors or (dep not in self.stages and dep not in results)]
+                    if failed:
+                        errors[name] = f"Omitida por fallo en: {', '.join(failed)}"
+                        pending.discard(name)
+
+                # Lanzar las etapas listas
+                for name in list(pending):
+                    deps = self.stages[name]['depends_on']
+                    if all(dep in results for dep in deps):
+                        kwargs = {dep: results[dep] for dep in deps}
+                        future = executor.submit(self._call, name, kwargs, timer)
+                        timeout = self.stages[name]['timeout']
+                        deadline = time.monotonic() + timeout if timeout else None
+                        running[future] = (name, deadline)
+                        pending.discard(name)
+
+                if not running:
+                    break
+
+                deadlines = [d for _, d in running.values() if d is not None]
+                wait_time = max(min(deadlines) - time.monotonic(), 0) if deadlines else None
+                done, _ = wait(running, timeout=wait_time, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    name, _ = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        errors[name] = str(e)
+
+                now = time.monotonic()
+                for future, (name, deadline) in list(running.items()):
+                    if deadline is not None and now >= deadline:
+                        # El hilo no puede interrumpirse; se abandona su resultado
+                        running.pop(future)
+                        future.cancel()
+                        errors[name] = str(StageTimeoutError(f"La etapa '{name}' superó el tiempo máximo"))
+        finally:
+            executor.shutdown(wait=False)
+
+        return {
+            'results': {name: value for name, value in results.items() if name in self.stages},
+            'errors': errors,
+        }
+
+
+def post_process(transcription: str, include_summary: bool = True, timer=None,
+                 timeout: float = STAGE_TIMEOUT, include_format: bool = True) -> Dict:
+    """
+    Formatea y resume una transcripción en paralelo.
+
+    Returns:
+        dict: 'transcription' (texto formateado, o el original si el formateo
+        falla o no se pidió), 'summary' (None si no se generó) y 'errors' por etapa.
+    """
+    pipeline = Pipeline()
+    if include_format:
+        pipeline.add_stage('format', lambda: format_transcription(transcription), timeout=timeout)
+    if include_summary:
+        pipeline.add_stage('summary', lambda: generate_summary(transcription), timeout=timeout)
+
+    outcome = pipeline.run(timer=timer)
+    results = outcome['results']
+    return {
+        'transcription': results.get('format', transcription),
+        'summary': results.get('summary'),
+        'errors': outcome['errors'],
+    }
+
+
+def stream_post_process(transcription: str, include_summary: bool = True, timer=None,
+                        timeout: float = STAGE_TIMEOUT) -> Iterator[Tuple[str, object]]:
+    """
+    Variante de post_process que formatea en streaming mientras el resumen
+    se genera en paralelo.
+
+    Genera eventos ('delta', texto) con el texto formateado según llega,
+    ('reset', texto) cuando ese texto debe sustituir todo lo enviado antes
+    (el formateo falló a mitad o superó su timeout), ('summary', dict) en
+    cuanto el resumen está listo y, al final, ('result', dict) con el mismo
+    contenido que devuelve post_process.
+
+    El formateo corre en otro hilo, así que su etapa sólo mide el trabajo del
+    generador y no el tiempo que el consumidor tarda en leer los eventos.
+    """
+    stage = timer.stage if timer is not None else lambda name: nullcontext()
+    errors: Dict[str, str] = {}
+    summary = None
+    summary_sent = False
+    formatted = None
+    finished = False
+    sent = False
+    deltas = queue.Queue()
+    cancelled = threading.Event()
+
+    def summarize():
+        with stage('summary'):
+            return generate_summary(transcription)
+
+    def format_stream():
+        stream = stream_format_transcription(transcription)
+        try:
+            with stage('format'):
+                while not cancelled.is_set():
+                    try:
+                        deltas.put(('delta', next(stream)))
+                    except StopIteration as stop:
+                        deltas.put(('done', stop.value))
+                        return
+        except Exception as e:
+            deltas.put(('error', e))
+        finally:
+            # Cierra la petición en curso si el consumidor abandonó el formateo
+            stream.close()
+
+    executor = ContextThreadPoolExecutor(max_workers=2, thread_name_prefix="stage")
+    try:
+        summary_future = executor.submit(summarize) if include_summary else None
+        deadline = time.monotonic() + timeout
+        executor.submit(format_stream)
+
+        while not finished:
+            # Enviar el resumen en cuanto esté listo, sin esperar al formateo
+            if summary_future is not None and not summary_sent and summary_future.done():
+                if summary_future.exception() is None:
+                    summary = summary_future.result()
+                    summary_sent = True
+                    yield 'summary', summary
+
+            remaining = deadline - time.monotonic()
+            try:
+                kind, value = deltas.get(timeout=min(max(remaining, 0), SUMMARY_POLL_SECONDS))
+            except queue.Empty:
+                if remaining > 0:
+                    continue
+                cancelled.set()
+                kind, value = 'error', StageTimeoutError("La etapa 'format' superó el tiempo máximo")
+
+            if kind == 'delta':
+                sent = True
+                if isinstance(value, FormatReset):
+                    yield 'reset', str(value)
+                else:
+                    yield 'delta', value
+            elif kind == 'done':
+                formatted = value
+                finished = True
+            else:
+                # Como en post_process, sin formato se devuelve el texto original
+                errors['format'] = str(value)
+                formatted = transcription
+                finished = True
+                if sent:
+                    yield 'reset', transcription
+
+        if summary_future is not None and not summary_sent:
+            try:
+                summary = summary_future.result(timeout=max(deadline - time.monotonic(), 0))
+                yield 'summary', summary
+            except FutureTimeoutError:
+                errors['summary'] = str(StageTimeoutError("La etapa 'summary' superó el tiempo máximo"))
+            except Exception as e:
+                errors['summary'] = str(e)
+    finally:
+        cancelled.set()
+        executor.shutdown(wait=False)
+
+    yield 'result', {'transcription': formatted, 'summary': summary, 'errors': errors}
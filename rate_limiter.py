@@ -0,0 +1,326 @@
+import os
+import time
+import heapq
+import sqlite3
+import itertools
+import threading
+import contextvars
+from pathlib import Path
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from metrics import OPENAI_QUEUE_SECONDS
+
+# Prioridades: las peticiones interactivas (Streamlit, /upload) pasan antes que los lotes
+INTERACTIVE = 0
+BATCH = 1
+
+# Límites por minuto (peticiones, tokens) de cada modelo; 0 desactiva el límite
+MODEL_LIMITS = {
+    'whisper-1': (int(os.getenv('WHISPER_RPM', '50')), 0),
+    'gpt-3.5-turbo': (int(os.getenv('GPT35_RPM', '3500')), int(os.getenv('GPT35_TPM', '200000'))),
+    'gpt-4o-mini': (int(os.getenv('GPT4O_MINI_RPM', '500')), int(os.getenv('GPT4O_MINI_TPM', '200000'))),
+}
+# Segundos de presupuesto que pueden gastarse de golpe (la API también limita ráfagas)
+BURST_SECONDS = float(os.getenv('RATE_LIMIT_BURST_SECONDS', '10'))
+# Contrapresión: máximo de peticiones en espera por modelo y espera máxima en cola
+MAX_WAITING = int(os.getenv('RATE_LIMIT_MAX_QUEUE', '200'))
+MAX_WAIT_SECONDS = float(os.getenv('RATE_LIMIT_MAX_WAIT_SECONDS', '120'))
+# Presupuesto compartido por todos los procesos de la máquina; vacío lo limita a cada proceso
+RATE_LIMIT_DB_PATH = os.getenv('RATE_LIMIT_DB_PATH', os.path.join('data', 'ratelimit.db'))
+
+_priority = contextvars.ContextVar('openai_priority', default=INTERACTIVE)
+
+
+class RateLimitExceeded(Exception):
+    """Se lanza cuando no hay presupuesto de la API disponible en un tiempo razonable."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@contextmanager
+def request_priority(level: int):
+    """Fija la prioridad de las llamadas a la API hechas dentro del bloque."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor que ejecuta cada tarea con el contexto (prioridad) de quien la envía."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class _Bucket:
+    """Cubo de fichas que se rellena de forma continua hasta `capacity`."""
+
+    def __init__(self, per_minute: int):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * BURST_SECONDS)
+
+    def refill(self, level: Optional[float], elapsed: float) -> float:
+        if level is None:
+            return self.capacity
+        return min(self.capacity, level + elapsed * self.rate)
+
+    def wait_time(self, level: float, amount: float) -> float:
+        return max(0.0, (min(amount, self.capacity) - level) / self.rate)
+
+
+class MemoryBudgetStore:
+    """Estado de los cubos en memoria: el presupuesto es sólo de este proceso."""
+
+    def __init__(self):
+        self._states: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def update(self, family: str, fn: Callable[[Dict], Any]) -> Any:
+        """Aplica `fn` al estado del modelo (lo modifica en sitio) de forma atómica."""
+        with self._lock:
+            state = self._states.setdefault(family, {'requests': None, 'tokens': None,
+                                                     'updated': time.time(), 'paused_until': 0.0})
+            return fn(state)
+
+
+class SQLiteBudgetStore:
+    """
+    Estado de los cubos en una base de datos SQLite compartida por todos los
+    procesos de la máquina (API y worker.py): cada llamada consume del mismo
+    presupuesto por minuto, así que N procesos no multiplican el límite.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = str(db_path or RATE_LIMIT_DB_PATH)
+        self._local = threading.local()
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS budgets ("
+            " model TEXT PRIMARY KEY, requests REAL, tokens REAL,"
+            " updated REAL NOT NULL, paused_until REAL NOT NULL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión propia de cada hilo, en modo autocommit (las transacciones son explícitas)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def update(self, family: str, fn: Callable[[Dict], Any]) -> Any:
+        """Aplica `fn` al estado del modelo dentro de una transacción BEGIN IMMEDIATE."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT requests, tokens, updated, paused_until FROM budgets WHERE model = ?", (family,)
+            ).fetchone()
+            if row is None:
+                state = {'requests': None, 'tokens': None, 'updated': time.time(), 'paused_until': 0.0}
+            else:
+                state = dict(zip(('requests', 'tokens', 'updated', 'paused_until'), row))
+            result = fn(state)
+            conn.execute(
+                "INSERT OR REPLACE INTO budgets (model, requests, tokens, updated, paused_until)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (family, state['requests'], state['tokens'], state['updated'], state['paused_until'])
+            )
+            conn.execute("COMMIT")
+            return result
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class _ModelLimiter:
+    """Presupuesto de peticiones y tokens de un modelo con su cola de espera (de este proceso)."""
+
+    def __init__(self, family: str, rpm: int, tpm: int, store):
+        self.family = family
+        self.buckets = {
+            name: _Bucket(limit) for name, limit in (('requests', rpm), ('tokens', tpm)) if limit
+        }
+        self.store = store
+        self.waiters = []
+
+    def _refill(self, state: Dict):
+        now = time.time()
+        elapsed = max(0.0, now - state['updated'])
+        for name, bucket in self.buckets.items():
+            state[name] = bucket.refill(state[name], elapsed)
+        state['updated'] = now
+        return now
+
+    def _wait(self, state: Dict, tokens: int) -> float:
+        now = self._refill(state)
+        wait = state['paused_until'] - now
+        for name, amount in (('requests', 1), ('tokens', tokens)):
+            if name in self.buckets:
+                wait = max(wait, self.buckets[name].wait_time(state[name], amount))
+        return max(wait, 0.0)
+
+    def wait_time(self, tokens: int) -> float:
+        """Espera estimada hasta que haya presupuesto para la llamada (no consume)."""
+        return self.store.update(self.family, lambda state: self._wait(state, tokens))
+
+    def try_consume(self, tokens: int) -> float:
+        """Consume el presupuesto si hay suficiente (devuelve 0) o devuelve la espera necesaria."""
+        def take(state):
+            wait = self._wait(state, tokens)
+            if wait <= 0:
+                for name, amount in (('requests', 1), ('tokens', tokens)):
+                    if name in self.buckets:
+                        state[name] -= min(amount, self.buckets[name].capacity)
+            return wait
+        return self.store.update(self.family, take)
+
+    def settle(self, delta: int):
+        """Devuelve (o descuenta) `delta` tokens al presupuesto."""
+        bucket = self.buckets.get('tokens')
+        if bucket is None:
+            return
+
+        def adjust(state):
+            self._refill(state)
+            state['tokens'] = min(bucket.capacity, state['tokens'] + delta)
+        self.store.update(self.family, adjust)
+
+    def pause(self, seconds: float):
+        def extend(state):
+            state['paused_until'] = max(state['paused_until'], time.time() + seconds)
+        self.store.update(self.family, extend)
+
+
+class RateLimitScheduler:
+    """
+    Reparte el presupuesto por minuto de cada modelo entre las llamadas a la
+    API. Las llamadas esperan en una cola por prioridad (y orden de llegada)
+    hasta que hay peticiones y tokens disponibles, de modo que el rendimiento
+    se mantiene en el límite en lugar de convertirse en errores 429 y reintentos.
+
+    El presupuesto vive en `store`: por defecto una base de datos SQLite que
+    comparten todos los procesos de la máquina. La prioridad sólo ordena las
+    llamadas dentro de cada proceso.
+    """
+
+    def __init__(self, limits=MODEL_LIMITS, max_waiting=MAX_WAITING, max_wait=MAX_WAIT_SECONDS, store=None):
+        self.limits = limits
+        self.store = store
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self._limiters: Dict[str, _ModelLimiter] = {}
+        self._condition = threading.Condition()
+        self._store_lock = threading.Lock()
+        self._sequence = itertools.count()
+
+    def _budget_store(self):
+        """Almacén del presupuesto, creado al primer uso (fuera del cerrojo de la cola)."""
+        with self._store_lock:
+            if self.store is None:
+                self.store = SQLiteBudgetStore() if RATE_LIMIT_DB_PATH else MemoryBudgetStore()
+            return self.store
+
+    def _limiter(self, model: Optional[str]) -> Optional[_ModelLimiter]:
+        """Limitador del modelo; las versiones con fecha comparten el de su familia."""
+        if not model:
+            return None
+        family = max((name for name in self.limits if model.startswith(name)), key=len, default=None)
+        if family is None:
+            return None
+        rpm, tpm = self.limits[family]
+        if not rpm and not tpm:
+            return None
+        store = self._budget_store()
+        with self._condition:
+            if family not in self._limiters:
+                self._limiters[family] = _ModelLimiter(family, rpm, tpm, store)
+            return self._limiters[family]
+
+    def acquire(self, model: Optional[str], tokens: int = 0, priority: Optional[int] = None):
+        """
+        Bloquea hasta que la llamada puede enviarse sin superar los límites.
+        Lanza RateLimitExceeded si la cola está llena o la espera supera `max_wait`.
+
+        El cerrojo del proceso sólo protege la cola de espera local: las
+        consultas al almacén del presupuesto (SQLite, que puede bloquearse
+        esperando a otro proceso) se hacen sin él.
+        """
+        priority = current_priority() if priority is None else priority
+        start = time.monotonic()
+        deadline = start + self.max_wait
+
+        limiter = self._limiter(model)
+        if limiter is None:
+            return
+
+        entry = (priority, next(self._sequence))
+        with self._condition:
+            queue_full = len(limiter.waiters) >= self.max_waiting
+            if not queue_full:
+                heapq.heappush(limiter.waiters, entry)
+        if queue_full:
+            raise RateLimitExceeded("Demasiadas peticiones en espera para la API, inténtalo más tarde",
+                                    retry_after=limiter.wait_time(tokens) or 1)
+
+        try:
+            while True:
+                # Sólo la primera llamada de la cola puede consumir presupuesto
+                with self._condition:
+                    while limiter.waiters[0] != entry and time.monotonic() < deadline:
+                        self._condition.wait(deadline - time.monotonic())
+                    first = limiter.waiters[0] == entry
+                if not first:
+                    raise RateLimitExceeded("Límite de peticiones de la API alcanzado, inténtalo más tarde",
+                                            retry_after=limiter.wait_time(tokens) or 1)
+
+                wait = limiter.try_consume(tokens)
+                if wait <= 0:
+                    break
+                if wait > deadline - time.monotonic():
+                    raise RateLimitExceeded("Límite de peticiones de la API alcanzado, inténtalo más tarde",
+                                            retry_after=wait)
+                # settle() y pause() despiertan a la cola antes de tiempo
+                with self._condition:
+                    self._condition.wait(wait)
+        finally:
+            with self._condition:
+                if entry in limiter.waiters:
+                    limiter.waiters.remove(entry)
+                    heapq.heapify(limiter.waiters)
+                self._condition.notify_all()
+
+        OPENAI_QUEUE_SECONDS.observe(time.monotonic() - start, model=model,
+                                     priority='interactive' if priority == INTERACTIVE else 'batch')
+
+    def settle(self, model: Optional[str], estimated: int, actual: int):
+        """Corrige el presupuesto de tokens con el consumo real informado por la API."""
+        limiter = self._limiter(model)
+        if limiter is None:
+            return
+        limiter.settle(estimated - actual)
+        with self._condition:
+            self._condition.notify_all()
+
+    def pause(self, model: Optional[str], seconds: float):
+        """Detiene las llamadas al modelo tras un 429 para que esperen todas juntas."""
+        limiter = self._limiter(model)
+        if limiter is None:
+            return
+        limiter.pause(seconds)
+        with self._condition:
+            self._condition.notify_all()
+
+
+scheduler = RateLimitScheduler()
@@ -0,0 +1,244 @@
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Índice de búsqueda de texto completo sobre las transcripciones guardadas
+SEARCH_INDEX = os.getenv('SEARCH_INDEX', '1') == '1'
+SEARCH_DB_PATH = os.getenv('SEARCH_DB_PATH', os.path.join('cache', 'search.db'))
+# Tamaño aproximado de cada pasaje indexado (caracteres y, con marcas de tiempo, segundos)
+PASSAGE_CHARS = 600
+PASSAGE_SECONDS = 60.0
+
+_SENTENCE_END = re.compile(r'(?<=[.!?…])\s+')
+_QUERY_TERM = re.compile(r'(\w+)(\*?)', re.UNICODE)
+
+logger = logging.getLogger(__name__)
+
+
+def text_passages(text: str) -> Iterator[str]:
+    """Divide el texto en pasajes de unas PASSAGE_CHARS letras cortando en final de frase."""
+    passage = []
+    size = 0
+    for sentence in _SENTENCE_END.split(text):
+        passage.append(sentence)
+        size += len(sentence) + 1
+        if size >= PASSAGE_CHARS:
+            yield ' '.join(passage)
+            passage, size = [], 0
+    if passage and ' '.join(passage).strip():
+        yield ' '.join(passage)
+
+
+def segment_passages(segments) -> Iterator[Tuple[float, float, str]]:
+    """Agrupa segmentos consecutivos en pasajes (inicio, fin, texto)."""
+    start = end = None
+    texts = []
+    size = 0
+    for seg_start, seg_end, text in segments:
+        # Cerrar el pasaje si es largo o si el segmento lo alargaría demasiado en el tiempo
+        if texts and (size >= PASSAGE_CHARS or seg_end - start > PASSAGE_SECONDS):
+            yield start, end, ' '.join(texts)
+            start, texts, size = None, [], 0
+        if start is None:
+            start = seg_start
+        end = seg_end
+        texts.append(text)
+        size += len(text) + 1
+    if texts:
+        yield start, end, ' '.join(texts)
+
+
+def build_query(query: str) -> str:
+    """
+    Convierte la consulta del usuario en una expresión FTS5 segura: cada
+    palabra entre comillas (todas deben aparecer) y `palabra*` como prefijo.
+    """
+    return ' '.join(f'"{term}"{star}' for term, star in _QUERY_TERM.findall(query))
+
+
+class SearchIndex:
+    """
+    Índice invertido (SQLite FTS5) de las transcripciones. Cada transcripción
+    se divide en pasajes; con marcas de tiempo, cada pasaje conserva su
+    inicio y su fin para poder saltar a ese punto del audio.
+
+    Los pasajes viven en una tabla normal indexada por documento y la tabla
+    FTS5 usa su contenido externo, de modo que reindexar un documento sólo
+    toca sus filas. Las búsquedas se ordenan por BM25 sin recorrer la caché.
+    """
+
+    def __init__(self, db_path=SEARCH_DB_PATH):
+        self.db_path = str(db_path)
+        self._local = threading.local()
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                " id TEXT PRIMARY KEY, title TEXT, source TEXT,"
+                " timestamps INTEGER NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS passages ("
+                " id INTEGER PRIMARY KEY, document_id TEXT NOT NULL,"
+                " start_time REAL, end_time REAL, text TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS passages_document ON passages (document_id)")
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS passages_fts USING fts5("
+                " text, content='passages', content_rowid='id',"
+                " tokenize='unicode61 remove_diacritics 2')"
+            )
+            # Mantener la tabla FTS5 sincronizada con los pasajes
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS passages_insert AFTER INSERT ON passages BEGIN"
+                " INSERT INTO passages_fts (rowid, text) VALUES (new.id, new.text); END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS passages_delete AFTER DELETE ON passages BEGIN"
+                " INSERT INTO passages_fts (passages_fts, rowid, text) VALUES ('delete', old.id, old.text); END"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión propia de cada hilo (sqlite3 no comparte conexiones entre hilos)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, document_id: str, text: Optional[str] = None, segments=None,
+            title: Optional[str] = None, source: Optional[str] = None):
+        """
+        Indexa (o reindexa) una transcripción a partir de su texto o de sus
+        segmentos con marcas de tiempo. Un documento ya indexado con marcas de
+        tiempo no se sustituye por su versión en texto plano.
+        """
+        if segments is not None:
+            rows = list(segment_passages(segments))
+        else:
+            rows = [(None, None, passage) for passage in text_passages(text or '')]
+        timestamps = segments is not None
+
+        conn = self._connection()
+        with conn:
+            existing = conn.execute(
+                "SELECT timestamps, title, source FROM documents WHERE id = ?", (document_id,)
+            ).fetchone()
+            if existing is not None:
+                if existing[0] and not timestamps:
+                    return
+                title = title or existing[1]
+                source = source or existing[2]
+                conn.execute("DELETE FROM passages WHERE document_id = ?", (document_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (id, title, source, timestamps, updated) VALUES (?, ?, ?, ?, ?)",
+                (document_id, title, source, int(timestamps), time.time())
+            )
+            conn.executemany(
+                "INSERT INTO passages (document_id, start_time, end_time, text) VALUES (?, ?, ?, ?)",
+                [(document_id, start, end, passage) for start, end, passage in rows]
+            )
+
+    def set_title(self, document_id: str, title: str):
+        """Asigna un título al documento si todavía no tiene."""
+        conn = self._connection()
+        with conn:
+            conn.execute("UPDATE documents SET title = ? WHERE id = ? AND title IS NULL", (title, document_id))
+
+    def remove(self, document_ids: List[str]):
+        """Elimina del índice los documentos (y sus pasajes) que existan."""
+        conn = self._connection()
+        with conn:
+            conn.executemany("DELETE FROM passages WHERE document_id = ?", [(id_,) for id_ in document_ids])
+            conn.executemany("DELETE FROM documents WHERE id = ?", [(id_,) for id_ in document_ids])
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> List[Dict]:
+        """
+        Pasajes que contienen todas las palabras de `query`, del más al menos
+        relevante (BM25), con un fragmento resaltado entre <mark> y </mark>.
+        """
+        expression = build_query(query)
+        if not expression:
+            return []
+        rows = self._connection().execute(
+            "SELECT p.document_id, d.title, d.source, p.start_time, p.end_time,"
+            " snippet(passages_fts, 0, '<mark>', '</mark>', '…', 16), rank"
+            " FROM passages_fts"
+            " JOIN passages p ON p.id = passages_fts.rowid"
+            " JOIN documents d ON d.id = p.document_id"
+            " WHERE passages_fts MATCH ? ORDER BY rank LIMIT ? OFFSET ?",
+            (expression, limit, offset)
+        ).fetchall()
+        return [
+            {
+                'id': document_id,
+                'title': title,
+                'source': source,
+                'start': start,
+                'end': end,
+                'snippet': snippet,
+                'score': round(-rank, 6),
+            }
+            for document_id, title, source, start, end, snippet, rank in rows
+        ]
+
+    def stats(self):
+        conn = self._connection()
+        documents, = conn.execute("SELECT COUNT(*) FROM documents").fetchone()
+        passages, = conn.execute("SELECT COUNT(*) FROM passages").fetchone()
+        return {'documents': documents, 'passages': passages}
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_search_index() -> SearchIndex:
+    """Retorna la instancia compartida del índice de búsqueda."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SearchIndex()
+        return _index
+
+
+def index_transcript(document_id: str, text: Optional[str] = None, segments=None,
+                     title: Optional[str] = None, source: Optional[str] = None):
+    """
+    Añade una transcripción al índice (si SEARCH_INDEX está activado). Un
+    fallo del índice se registra pero no interrumpe la transcripción.
+    """
+    if not SEARCH_INDEX:
+        return
+    try:
+        get_search_index().add(document_id, text=text, segments=segments, title=title, source=source)
+    except Exception as e:
+        logger.warning(f"No se pudo indexar la transcripción {document_id}: {str(e)}")
+
+
+def set_title(document_id: str, title: str):
+    """Asigna un título a una transcripción indexada; como index_transcript, no interrumpe si falla."""
+    if not SEARCH_INDEX:
+        return
+    try:
+        get_search_index().set_title(document_id, title)
+    except Exception as e:
+        logger.warning(f"No se pudo asignar el título de {document_id}: {str(e)}")
+
+
+def remove_transcripts(document_ids: List[str]):
+    """Quita transcripciones del índice (p. ej. al expulsarlas de la caché); un fallo sólo se registra."""
+    if not SEARCH_INDEX or not document_ids:
+        return
+    try:
+        get_search_index().remove(document_ids)
+    except Exception as e:
+        logger.warning(f"No se pudieron quitar {len(document_ids)} transcripciones del índice: {str(e)}")
@@ -0,0 +1,42 @@
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, Tuple
+from metrics import COALESCED_CALLS
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes idénticas: la primera llamada con una clave
+    ejecuta la función y las que llegan mientras tanto esperan su resultado
+    (o su excepción) en lugar de repetir el trabajo.
+
+    Las claves son tuplas cuyo primer elemento nombra la operación (se usa
+    como etiqueta de la métrica). Todas las llamadas agrupadas reciben el
+    mismo objeto resultado: no debe modificarse.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Tuple, func: Callable, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            COALESCED_CALLS.inc(operation=str(key[0]))
+            return future.result()
+
+        try:
+            result = func(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
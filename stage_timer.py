@@ -0,0 +1,44 @@
+import json
+import time
+import uuid
+import logging
+from contextlib import contextmanager
+from typing import Dict, Optional
+from metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimer:
+    """
+    Registra la duración de cada etapa de un procesamiento. Cada etapa se
+    publica en la métrica STAGE_SECONDS y como una línea de log JSON con el
+    `trace_id` de la petición.
+    """
+
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.timings: Dict[str, float] = {}
+
+    def record(self, name: str, seconds: float, **fields):
+        self.timings[name] = round(seconds, 3)
+        STAGE_SECONDS.observe(seconds, stage=name)
+        logger.info(json.dumps({
+            'trace_id': self.trace_id,
+            'span': name,
+            'duration_ms': round(seconds * 1000, 1),
+            **fields
+        }))
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            fields = {'error': error} if error else {}
+            self.record(name, time.perf_counter() - start, **fields)
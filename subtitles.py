@@ -0,0 +1,107 @@
+from array import array
+from typing import Dict, Iterable, Iterator, TextIO, Tuple
+
+
+class SegmentList:
+    """
+    Lista compacta de segmentos con marcas de tiempo.
+
+    Los tiempos (segundos) se guardan en arrays de doubles en lugar de un
+    objeto por segmento, lo que mantiene bajo el consumo de memoria en
+    transcripciones de varias horas.
+    """
+
+    __slots__ = ('starts', 'ends', 'texts')
+
+    def __init__(self):
+        self.starts = array('d')
+        self.ends = array('d')
+        self.texts = []
+
+    def append(self, start: float, end: float, text: str):
+        self.starts.append(start)
+        self.ends.append(end)
+        self.texts.append(text.strip())
+
+    def extend(self, other: 'SegmentList', offset: float = 0.0, after: float = None):
+        """
+        Añade los segmentos de `other` desplazados `offset` segundos. Si se
+        indica `after`, se omiten los segmentos cuyo punto medio es anterior
+        (texto repetido por el solapamiento entre trozos de audio).
+        """
+        for start, end, text in other:
+            start, end = start + offset, end + offset
+            if after is not None and (start + end) / 2 < after:
+                continue
+            self.append(start, end, text)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __iter__(self) -> Iterator[Tuple[float, float, str]]:
+        return zip(self.starts, self.ends, self.texts)
+
+    @property
+    def text(self) -> str:
+        return ' '.join(t for t in self.texts if t)
+
+    def to_dict(self) -> Dict:
+        """Representación serializable a JSON (columnas en lugar de filas)."""
+        return {'start': list(self.starts), 'end': list(self.ends), 'text': self.texts}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SegmentList':
+        segments = cls()
+        segments.starts = array('d', data['start'])
+        segments.ends = array('d', data['end'])
+        segments.texts = list(data['text'])
+        return segments
+
+    @classmethod
+    def from_response(cls, response, offset: float = 0.0) -> 'SegmentList':
+        """Construir desde una respuesta `verbose_json` de Whisper."""
+        segments = cls()
+        for segment in response.segments or []:
+            segments.append(segment.start + offset, segment.end + offset, segment.text)
+        return segments
+
+
+def format_timestamp(seconds: float, decimal_marker: str = ',') -> str:
+    """Formatear segundos como HH:MM:SS,mmm (SRT) o HH:MM:SS.mmm (VTT)."""
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{decimal_marker}{milliseconds:03d}"
+
+
+def iter_srt(segments: Iterable[Tuple[float, float, str]]) -> Iterator[str]:
+    """Generar los bloques SRT uno a uno."""
+    index = 0
+    for start, end, text in segments:
+        if not text:
+            continue
+        index += 1
+        yield f"{index}\n{format_timestamp(start)} --> {format_timestamp(end)}\n{text}\n\n"
+
+
+def iter_vtt(segments: Iterable[Tuple[float, float, str]]) -> Iterator[str]:
+    """Generar la cabecera y los bloques WebVTT uno a uno."""
+    yield "WEBVTT\n\n"
+    for start, end, text in segments:
+        if not text:
+            continue
+        yield f"{format_timestamp(start, '.')} --> {format_timestamp(end, '.')}\n{text}\n\n"
+
+
+SUBTITLE_FORMATS = {
+    'srt': (iter_srt, 'application/x-subrip'),
+    'vtt': (iter_vtt, 'text/vtt'),
+}
+
+
+def write_subtitles(segments: Iterable[Tuple[float, float, str]], fp: TextIO, subtitle_format: str = 'srt'):
+    """Escribir los subtítulos en `fp` de forma incremental."""
+    writer, _ = SUBTITLE_FORMATS[subtitle_format]
+    for block in writer(segments):
+        fp.write(block)
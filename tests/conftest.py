@@ -0,0 +1,42 @@
+import pytest
+
+import cache
+import openai_client
+import rate_limiter
+import search_index
+import transcription_backends
+import work_queue
+from fake_openai_server import FakeOpenAIServer
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Ejecuta la prueba en un directorio vacío: cachés, cola e índices empiezan de cero."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cache, "_caches", {})
+    monkeypatch.setattr(cache, "_evict_listeners", {})
+    monkeypatch.setattr(search_index, "_index", None)
+    monkeypatch.setattr(work_queue, "_queue", None)
+    monkeypatch.setattr(rate_limiter.scheduler, "store", rate_limiter.MemoryBudgetStore())
+    monkeypatch.setattr(rate_limiter.scheduler, "_limiters", {})
+    return tmp_path
+
+
+@pytest.fixture
+def fake_openai(workdir, monkeypatch):
+    """Servidor local que imita la API de OpenAI, con el cliente compartido apuntando a él."""
+    with FakeOpenAIServer(latency=0.05, jitter=0.0, transcript_words=40) as server:
+        monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        monkeypatch.setattr(openai_client, "_client", None)
+        monkeypatch.setattr(transcription_backends, "_instances", {})
+        yield server
+
+
+@pytest.fixture
+def api_client(fake_openai):
+    """Cliente de prueba de la API (sin workers: los trabajos quedan en la cola)."""
+    from fastapi.testclient import TestClient
+    import api
+    with TestClient(api.app) as client:
+        yield client
@@ -0,0 +1,68 @@
+import audio_chunker
+from audio_chunker import merge_overlapping_text, plan_segments, stitch_transcripts
+
+
+def test_merge_removes_overlap_at_end():
+    previous = "hoy hablamos del presupuesto del año que viene y de las"
+    current = "y de las contrataciones previstas para marzo"
+    assert merge_overlapping_text(previous, current) == (
+        "hoy hablamos del presupuesto del año que viene y de las contrataciones previstas para marzo"
+    )
+
+
+def test_merge_ignores_punctuation_and_case():
+    previous = "Gracias a todos por venir. Empezamos"
+    current = "por venir, empezamos con el primer punto"
+    assert merge_overlapping_text(previous, current) == (
+        "Gracias a todos por venir. Empezamos con el primer punto"
+    )
+
+
+def test_merge_does_not_drop_text_after_early_match():
+    previous = ("and that is the end of the first part where we discussed budgets, taxes, "
+                "hiring plans and the roadmap for next year in")
+    current = "the end, we agreed to ship"
+    merged = merge_overlapping_text(previous, current)
+    assert merged == f"{previous} {current}"
+    assert len(merged.split()) == len(previous.split()) + len(current.split())
+
+
+def test_merge_requires_three_words():
+    assert merge_overlapping_text("vamos a la playa", "la playa estaba llena") == (
+        "vamos a la playa la playa estaba llena"
+    )
+
+
+def test_merge_empty_parts():
+    assert merge_overlapping_text("", " hola ") == "hola"
+    assert merge_overlapping_text(" hola ", "") == "hola"
+
+
+def test_stitch_transcripts_in_order():
+    parts = [
+        "primera parte de la reunión sobre el nuevo proyecto",
+        "sobre el nuevo proyecto y su calendario de entregas",
+        "calendario de entregas para el próximo trimestre",
+    ]
+    assert stitch_transcripts(parts) == (
+        "primera parte de la reunión sobre el nuevo proyecto y su calendario de entregas "
+        "para el próximo trimestre"
+    )
+
+
+def test_plan_segments_splits_short_audio_above_upload_limit(tmp_path, monkeypatch):
+    # 5 minutos de audio sin comprimir: 60 MB, por debajo de SEGMENT_SECONDS
+    path = tmp_path / "audio.wav"
+    with open(path, "wb") as f:
+        f.truncate(60 * 1024 * 1024)
+    monkeypatch.setattr(audio_chunker, "get_duration", lambda audio_path: 300.0)
+    monkeypatch.setattr(audio_chunker, "find_cut_point", lambda audio_path, target: target)
+
+    assert plan_segments(str(path), segment_seconds=600) == [(0.0, 300.0)]
+
+    limit = 24 * 1024 * 1024
+    segments = plan_segments(str(path), segment_seconds=600, max_bytes=limit)
+    bytes_per_second = path.stat().st_size / 300.0
+    assert len(segments) == 3
+    assert segments[-1][1] == 300.0
+    assert all((end - start) * bytes_per_second <= limit for start, end in segments)
@@ -0,0 +1,59 @@
+import os
+import shutil
+import wave
+
+import numpy as np
+import pytest
+
+from audio_preprocessing import (
+    FRAME_MS, file_energy_db, frame_energy_db, keep_regions, preprocess_audio, remove_silences
+)
+
+SAMPLE_RATE = 16000
+
+
+def speech_with_pauses():
+    """Ruido fuerte (voz) separado por silencios de distinta duración."""
+    rng = np.random.default_rng(0)
+    pieces = []
+    for seconds, amplitude in ((1.0, 20), (1.5, 3000), (2.5, 20), (1.0, 3000), (0.5, 20), (1.0, 3000), (1.0, 20)):
+        pieces.append((rng.standard_normal(int(seconds * SAMPLE_RATE)) * amplitude).astype(np.int16))
+    return np.concatenate(pieces)
+
+
+def test_file_energy_matches_in_memory(tmp_path):
+    samples = speech_with_pauses()
+    raw = tmp_path / "audio.pcm"
+    raw.write_bytes(samples.tobytes())
+    frame_length = SAMPLE_RATE * FRAME_MS // 1000
+    assert np.allclose(file_energy_db(str(raw), frame_length, window_frames=7),
+                       frame_energy_db(samples, frame_length))
+
+
+def test_remove_silences_trims_edges_and_long_pauses():
+    samples = speech_with_pauses()
+    trimmed = remove_silences(samples, SAMPLE_RATE)
+    edges_only = remove_silences(samples, SAMPLE_RATE, trim_internal=False)
+    # Se quitan los extremos y la pausa de 2.5 s; la de 0.5 s se conserva
+    assert len(trimmed) < len(edges_only) < len(samples)
+    assert len(samples) - len(edges_only) > 1.0 * SAMPLE_RATE
+    assert len(edges_only) - len(trimmed) > 1.5 * SAMPLE_RATE
+
+
+def test_keep_regions_without_speech():
+    assert keep_regions(np.zeros(10, dtype=bool)) == []
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="requiere ffmpeg")
+def test_preprocess_audio_streams_through_ffmpeg(tmp_path):
+    path = tmp_path / "audio.wav"
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(speech_with_pauses().tobytes())
+    output = preprocess_audio(str(path))
+    try:
+        assert os.path.getsize(output) > 0
+    finally:
+        os.unlink(output)
@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import time
+
+import pytest
+
+from cache import ContentCache, SQLiteCache, get_cache
+
+
+@pytest.fixture(params=["sqlite", "json"])
+def make_cache(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "sqlite":
+            return SQLiteCache("test", db_path=tmp_path / "cache.db", **kwargs)
+        return ContentCache(tmp_path / "test", **kwargs)
+    return make
+
+
+def _value():
+    # Datos aleatorios para que la compresión no reduzca el tamaño
+    return {"text": os.urandom(300).hex()}
+
+
+def test_put_and_get(make_cache):
+    cache = make_cache()
+    cache.put("a", {"text": "hola"})
+    assert cache.get("a") == {"text": "hola"}
+    assert cache.get("b") is None
+    assert cache.get_many(["a", "b"]) == {"a": {"text": "hola"}}
+
+
+def test_entry_expires_after_ttl(make_cache):
+    cache = make_cache()
+    cache.put("short", {"text": "a"}, ttl=0.05)
+    cache.put("long", {"text": "b"})
+    assert cache.get("short") == {"text": "a"}
+    time.sleep(0.1)
+    assert cache.get("short") is None
+    assert cache.get("long") == {"text": "b"}
+
+
+def test_entry_expires_after_max_age(make_cache):
+    cache = make_cache(max_age=0.05)
+    cache.put("a", {"text": "a"})
+    time.sleep(0.1)
+    assert cache.get("a") is None
+
+
+def test_size_cap_holds_on_every_write_and_evicts_oldest(make_cache):
+    cache = make_cache(max_bytes=4000)
+    for i in range(30):
+        cache.put(f"k{i}", _value())
+        assert cache.stats()["bytes"] <= 4000
+    assert cache.get("k0") is None
+    assert cache.get("k29") is not None
+
+
+def test_delete_many(make_cache):
+    cache = make_cache()
+    cache.put_many({"a": {"n": 1}, "b": {"n": 2}, "c": {"n": 3}})
+    cache.delete_many(["a", "b", "missing"])
+    assert cache.get_many(["a", "b", "c"]) == {"c": {"n": 3}}
+    assert cache.stats()["entries"] == 1
+
+
+def test_sqlite_running_total_tracks_overwrites_and_deletes(tmp_path):
+    cache = SQLiteCache("test", db_path=tmp_path / "cache.db")
+    other = SQLiteCache("other", db_path=tmp_path / "cache.db")
+    cache.put("a", _value())
+    cache.put("a", {"text": "corto"})
+    other.put("b", _value())
+    cache.delete_many(["a"])
+
+    conn = sqlite3.connect(tmp_path / "cache.db")
+    total, = conn.execute("SELECT bytes FROM totals").fetchone()
+    assert total == conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+    assert total == other.stats()["bytes"]
+
+
+def test_get_cache_keeps_same_named_directories_apart(workdir):
+    first = get_cache("a/cache", backend="sqlite")
+    second = get_cache("b/cache", backend="sqlite")
+    first.put("k", {"text": "a"})
+    assert second.get("k") is None
+    assert first.label == second.label == "cache"
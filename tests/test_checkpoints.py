@@ -0,0 +1,70 @@
+import functools
+import shutil
+import tempfile
+
+import pytest
+
+import audio_processor
+from audio_chunker import stitch_transcripts
+from audio_processor import AudioTranscriber
+
+SEGMENTS = [(0.0, 60.0), (58.0, 120.0), (118.0, 180.0)]
+
+
+@pytest.fixture
+def transcriber(fake_openai, monkeypatch):
+    """Transcriptor con un audio "largo" de tres segmentos que se envían de uno en uno."""
+    monkeypatch.setattr(audio_processor, "PREPROCESS_AUDIO", False)
+    monkeypatch.setattr(audio_processor, "plan_segments", lambda path, **kwargs: SEGMENTS)
+
+    def export_segment(path, start, end):
+        tmp = tempfile.NamedTemporaryFile(delete=False, prefix=f"seg-{start:g}-", suffix=".mp3", dir=".")
+        tmp.close()
+        shutil.copyfile(path, tmp.name)
+        return tmp.name
+
+    monkeypatch.setattr(audio_processor, "export_segment", export_segment)
+    with open("audio.mp3", "wb") as f:
+        f.write(b"ID3" + b"\0" * 4096)
+
+    transcriber = AudioTranscriber("openai")
+    monkeypatch.setattr(transcriber, "transcribe_long",
+                        functools.partial(transcriber.transcribe_long, max_workers=1))
+    return transcriber
+
+
+def _checkpoints(transcriber, cache_key):
+    keys = [transcriber._checkpoint_key(f"{cache_key}-text", start, end) for start, end in SEGMENTS]
+    return transcriber.cache.get_many(keys)
+
+
+def test_retry_resumes_from_checkpoints(transcriber, fake_openai, monkeypatch):
+    cache_key = transcriber.get_cache_key("audio.mp3")
+    transcribe_file = transcriber._transcribe_file
+    failures = ["seg-58-"]
+
+    def flaky(path, timestamps=False):
+        if failures and failures[0] in path:
+            failures.pop()
+            raise RuntimeError("Simulated server error")
+        return transcribe_file(path, timestamps)
+
+    monkeypatch.setattr(transcriber, "_transcribe_file", flaky)
+
+    with pytest.raises(Exception):
+        transcriber.transcribe("audio.mp3", long_audio=True)
+    # Los segmentos que sí se transcribieron quedaron guardados (el tercero
+    # puede haber empezado antes de cancelar los pendientes)
+    sent = fake_openai.stats["requests"]
+    assert sent in (1, 2)
+    assert len(_checkpoints(transcriber, cache_key)) == sent
+
+    # El reintento sólo envía los segmentos que faltan
+    text = transcriber.transcribe("audio.mp3", long_audio=True)
+    assert fake_openai.stats["requests"] == len(SEGMENTS)
+    assert text == stitch_transcripts([fake_openai._transcript()] * len(SEGMENTS))
+
+    # Con el resultado completo en caché, los checkpoints sobran
+    assert _checkpoints(transcriber, cache_key) == {}
+    assert transcriber.get_from_cache("audio.mp3", cache_key) == text
+
@@ -0,0 +1,108 @@
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+import openai_client
+from openai_client import call_with_retry, get_client
+from rate_limiter import RateLimitExceeded, scheduler
+
+
+def _error(error_class, status, headers=None):
+    request = httpx.Request("POST", "http://localhost/v1/chat/completions")
+    response = httpx.Response(status, headers=headers, request=request)
+    return error_class(f"Error {status}", response=response, body=None)
+
+
+def _responses(*outcomes):
+    """Función de la API que devuelve (o lanza) `outcomes` en orden y cuenta las llamadas."""
+    calls = []
+
+    def func(**kwargs):
+        outcome = outcomes[len(calls)]
+        calls.append(kwargs)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    return func, calls
+
+
+@pytest.fixture
+def sleeps(workdir, monkeypatch):
+    delays = []
+    monkeypatch.setattr(openai_client, "time", SimpleNamespace(sleep=delays.append))
+    return delays
+
+
+def _stream(prompt):
+    return call_with_retry(
+        get_client().chat.completions.create,
+        model="gpt-4o-mini-2024-07-18",
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=100,
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+
+
+def test_stream_holds_its_slot_until_exhausted_and_settles_usage(fake_openai, monkeypatch):
+    settled = []
+    monkeypatch.setattr(scheduler, "settle", lambda model, estimated, actual: settled.append(actual))
+    free = openai_client._request_slots._value
+
+    stream = _stream("hola que tal estamos todos")
+    assert openai_client._request_slots._value == free - 1
+    text = ''.join(event.choices[0].delta.content or '' for event in stream if event.choices)
+
+    assert text == "hola que tal estamos todos"
+    assert openai_client._request_slots._value == free
+    assert len(settled) == 1 and settled[0] > 0
+
+
+def test_abandoned_stream_releases_its_slot(fake_openai):
+    free = openai_client._request_slots._value
+    stream = _stream("una respuesta larga que nadie termina de leer")
+    for _ in stream:
+        break
+    stream.close()
+    assert openai_client._request_slots._value == free
+
+
+def test_server_errors_are_retried_with_backoff(sleeps):
+    func, calls = _responses(_error(openai.InternalServerError, 500), _error(openai.InternalServerError, 503), "ok")
+    free = openai_client._request_slots._value
+
+    assert call_with_retry(func, model="gpt-4o-mini") == "ok"
+    assert len(calls) == 3 and len(sleeps) == 2
+    assert sleeps[0] <= openai_client.RETRY_BASE_DELAY and sleeps[1] <= openai_client.RETRY_BASE_DELAY * 2
+    assert openai_client._request_slots._value == free
+
+
+def test_rate_limit_honours_retry_after_and_pauses_the_model(sleeps, monkeypatch):
+    paused = []
+    monkeypatch.setattr(scheduler, "pause", lambda model, seconds: paused.append((model, seconds)))
+    func, calls = _responses(_error(openai.RateLimitError, 429, {"retry-after": "2"}), "ok")
+
+    assert call_with_retry(func, model="gpt-4o-mini") == "ok"
+    assert sleeps == [2.0]
+    assert paused == [("gpt-4o-mini", 2.0)]
+
+
+def test_persistent_rate_limit_raises_rate_limit_exceeded(sleeps, monkeypatch):
+    monkeypatch.setattr(openai_client, "MAX_RETRIES", 2)
+    monkeypatch.setattr(scheduler, "pause", lambda model, seconds: None)
+    func, calls = _responses(*[_error(openai.RateLimitError, 429, {"retry-after": "3"})] * 3)
+
+    with pytest.raises(RateLimitExceeded) as info:
+        call_with_retry(func, model="gpt-4o-mini")
+    assert len(calls) == 3
+    assert info.value.retry_after == 3.0
+    assert isinstance(info.value.__cause__, openai.RateLimitError)
+
+
+def test_client_errors_are_not_retried(sleeps):
+    func, calls = _responses(_error(openai.BadRequestError, 400))
+    with pytest.raises(openai.BadRequestError):
+        call_with_retry(func, model="gpt-4o-mini")
+    assert len(calls) == 1 and sleeps == []
@@ -0,0 +1,119 @@
+import time
+from types import SimpleNamespace
+
+import pipeline
+import utils
+from pipeline import stream_post_process
+from stage_timer import StageTimer
+
+
+def _event(content, finish_reason=None):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content),
+                                                    finish_reason=finish_reason)])
+
+
+class BrokenStream:
+    """Stream que envía dos fragmentos y se corta."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def __iter__(self):
+        yield _event("Persona 1: ")
+        yield _event("hola")
+        raise ConnectionError("conexión cortada")
+
+
+def test_stream_failing_midway_replaces_the_sent_text(workdir, monkeypatch):
+    monkeypatch.setattr(utils, "get_client", lambda: SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=None))))
+    monkeypatch.setattr(utils, "call_with_retry", lambda *args, **kwargs: BrokenStream())
+    text = "hola que tal. estamos todos"
+
+    events = list(stream_post_process(text, include_summary=False))
+
+    assert events[:2] == [("delta", "Persona 1: "), ("delta", "hola")]
+    assert events[2] == ("reset", utils.basic_format(text))
+    kind, result = events[-1]
+    assert kind == "result" and result["transcription"] == utils.basic_format(text)
+
+
+def test_format_timeout_falls_back_to_the_transcription(monkeypatch):
+    closed = []
+
+    def slow_stream(text):
+        try:
+            yield "Persona 1: hola"
+            time.sleep(0.3)
+            yield " que tal"
+        finally:
+            closed.append(True)
+
+    monkeypatch.setattr(pipeline, "stream_format_transcription", slow_stream)
+    events = list(stream_post_process("hola que tal", include_summary=False, timeout=0.1))
+
+    assert events[:2] == [("delta", "Persona 1: hola"), ("reset", "hola que tal")]
+    result = events[-1][1]
+    assert result["transcription"] == "hola que tal"
+    assert "format" in result["errors"]
+    time.sleep(0.4)
+    assert closed == [True]
+
+
+def test_format_stage_excludes_time_blocked_on_the_consumer(monkeypatch):
+    def fast_stream(text):
+        yield from text
+        return text
+
+    monkeypatch.setattr(pipeline, "stream_format_transcription", fast_stream)
+    timer = StageTimer()
+    for kind, value in stream_post_process("abc", include_summary=False, timer=timer):
+        if kind == "delta":
+            time.sleep(0.1)
+        elif kind == "result":
+            assert value["transcription"] == "abc"
+    assert timer.timings["format"] < 0.1
+
+
+def test_pipeline_runs_independent_stages_in_parallel_and_skips_dependents_of_failures():
+    def fail():
+        raise RuntimeError("fallo")
+
+    dag = (pipeline.Pipeline()
+                 .add_stage('a', lambda: time.sleep(0.1) or 1)
+                 .add_stage('b', lambda: time.sleep(0.1) or 2)
+                 .add_stage('sum', lambda a, b: a + b, depends_on=('a', 'b'))
+                 .add_stage('broken', fail)
+                 .add_stage('after_broken', lambda broken: broken, depends_on=('broken',)))
+    start = time.monotonic()
+    outcome = dag.run()
+
+    assert time.monotonic() - start < 0.19
+    assert outcome['results'] == {'a': 1, 'b': 2, 'sum': 3}
+    assert outcome['errors']['broken'] == "fallo"
+    assert "broken" in outcome['errors']['after_broken']
+
+
+def test_pipeline_stage_timeout_keeps_the_other_results():
+    dag = (pipeline.Pipeline()
+                 .add_stage('slow', lambda: time.sleep(0.5), timeout=0.05)
+                 .add_stage('fast', lambda: "ok", timeout=0.05))
+    start = time.monotonic()
+    outcome = dag.run()
+
+    assert time.monotonic() - start < 0.3
+    assert outcome['results'] == {'fast': "ok"}
+    assert "tiempo máximo" in outcome['errors']['slow']
+
+
+def test_post_process_falls_back_to_the_transcription_when_format_times_out(monkeypatch):
+    monkeypatch.setattr(pipeline, "format_transcription", lambda text: time.sleep(0.5))
+    monkeypatch.setattr(pipeline, "generate_summary", lambda text: {"resumen": "r", "puntos_clave": []})
+
+    result = pipeline.post_process("hola", timeout=0.05)
+    assert result['transcription'] == "hola"
+    assert result['summary'] == {"resumen": "r", "puntos_clave": []}
+    assert "format" in result['errors']
@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+
+import rate_limiter
+from rate_limiter import BATCH, INTERACTIVE, MemoryBudgetStore, RateLimitExceeded, RateLimitScheduler
+
+
+@pytest.fixture
+def make_scheduler(monkeypatch):
+    # Ráfaga de una sola petición: con 600 peticiones/minuto, una cada 0.1 s
+    monkeypatch.setattr(rate_limiter, "BURST_SECONDS", 0.1)
+
+    def make(**kwargs):
+        return RateLimitScheduler(limits={"model": (600, 0)}, store=MemoryBudgetStore(), **kwargs)
+    return make
+
+
+def test_calls_wait_for_the_bucket_to_refill(make_scheduler):
+    scheduler = make_scheduler()
+    start = time.monotonic()
+    for _ in range(4):
+        scheduler.acquire("model-2024")
+    assert 0.25 <= time.monotonic() - start < 1.0
+
+
+def test_unlimited_models_do_not_wait(make_scheduler):
+    scheduler = make_scheduler()
+    start = time.monotonic()
+    for _ in range(20):
+        scheduler.acquire("other-model")
+    assert time.monotonic() - start < 0.1
+
+
+def test_wait_beyond_max_wait_is_rejected_with_retry_after(make_scheduler):
+    scheduler = make_scheduler(max_wait=0.05)
+    scheduler.acquire("model")
+    with pytest.raises(RateLimitExceeded) as info:
+        scheduler.acquire("model")
+    assert 0 < info.value.retry_after <= 0.1
+
+
+def test_pause_holds_every_call(make_scheduler):
+    scheduler = make_scheduler()
+    scheduler.pause("model", 0.3)
+    start = time.monotonic()
+    scheduler.acquire("model")
+    assert time.monotonic() - start >= 0.25
+
+
+def test_interactive_calls_go_before_waiting_batch_calls(make_scheduler):
+    scheduler = make_scheduler()
+    scheduler.acquire("model")
+    order = []
+
+    def call(name, priority):
+        scheduler.acquire("model", priority=priority)
+        order.append(name)
+
+    threads = []
+    for name, priority in (("b0", BATCH), ("b1", BATCH), ("i", INTERACTIVE)):
+        thread = threading.Thread(target=call, args=(name, priority))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join()
+
+    assert order == ["i", "b0", "b1"]
+
+
+def test_full_queue_rejects_new_calls(make_scheduler):
+    scheduler = make_scheduler(max_waiting=1)
+    scheduler.acquire("model")
+    waiting = threading.Thread(target=scheduler.acquire, args=("model",))
+    waiting.start()
+    time.sleep(0.02)
+    with pytest.raises(RateLimitExceeded, match="Demasiadas peticiones"):
+        scheduler.acquire("model")
+    waiting.join()
+
+
+def test_settle_returns_unused_tokens_to_the_budget(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "BURST_SECONDS", 0.1)
+    # 6000 tokens/minuto: 10 tokens de ráfaga, que tardan 0.1 s en reponerse
+    scheduler = RateLimitScheduler(limits={"model": (0, 6000)}, store=MemoryBudgetStore(), max_wait=0.05)
+    scheduler.acquire("model", tokens=10)
+    with pytest.raises(RateLimitExceeded):
+        scheduler.acquire("model", tokens=10)
+
+    scheduler.settle("model", estimated=10, actual=2)
+    scheduler.acquire("model", tokens=8)
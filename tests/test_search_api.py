@@ -0,0 +1,43 @@
+from search_index import index_transcript
+
+
+def test_indexed_transcripts_are_found_through_the_api(api_client):
+    index_transcript("a", text="Hoy revisamos el presupuesto de marketing. Luego hablamos de contrataciones.",
+                     title="Reunión de lunes", source="lunes.mp3")
+    index_transcript("b", segments=[(0.0, 4.0, "Bienvenidos al podcast."),
+                                    (4.0, 9.5, "Hoy: presupuestos familiares y ahorro.")])
+    index_transcript("c", text="Nada que ver con el tema.")
+
+    response = api_client.get("/search", params={"q": "presupuest*"})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert {hit["id"] for hit in results} == {"a", "b"}
+
+    by_id = {hit["id"]: hit for hit in results}
+    assert by_id["a"]["title"] == "Reunión de lunes" and by_id["a"]["source"] == "lunes.mp3"
+    assert "<mark>presupuesto</mark>" in by_id["a"]["snippet"]
+    assert (by_id["b"]["start"], by_id["b"]["end"]) == (0.0, 9.5)
+
+
+def test_search_requires_every_word_and_pages_results(api_client):
+    for i in range(3):
+        index_transcript(f"doc{i}", text=f"Informe trimestral número {i} de ventas.")
+    index_transcript("other", text="Informe anual.")
+
+    assert [hit["id"] for hit in api_client.get("/search", params={"q": "informe anual"}).json()["results"]] == ["other"]
+    first = api_client.get("/search", params={"q": "ventas", "limit": 2}).json()["results"]
+    rest = api_client.get("/search", params={"q": "ventas", "limit": 2, "offset": 2}).json()["results"]
+    assert len(first) == 2 and len(rest) == 1
+    assert {hit["id"] for hit in first + rest} == {"doc0", "doc1", "doc2"}
+
+
+def test_reindexing_replaces_the_previous_text(api_client):
+    index_transcript("a", text="Primera versión con errores.")
+    index_transcript("a", text="Segunda versión corregida.")
+    assert api_client.get("/search", params={"q": "errores"}).json()["results"] == []
+    assert [hit["id"] for hit in api_client.get("/search", params={"q": "corregida"}).json()["results"]] == ["a"]
+
+
+def test_empty_or_invalid_queries(api_client):
+    assert api_client.get("/search", params={"q": "¿?"}).json()["results"] == []
+    assert api_client.get("/search", params={"q": ""}).status_code == 422
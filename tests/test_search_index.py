@@ -0,0 +1,37 @@
+import os
+import time
+
+from cache import SQLiteCache, on_evict
+from search_index import get_search_index, index_transcript, remove_transcripts
+from youtube_processor import forget_evicted_transcripts
+
+
+def test_evicted_transcripts_leave_the_index(workdir):
+    cache = SQLiteCache("cache", db_path=workdir / "cache.db", max_bytes=3000)
+    on_evict(cache.namespace, remove_transcripts)
+
+    for i in range(6):
+        key = f"audio{i}"
+        cache.put(key, {"transcription": os.urandom(400).hex()})
+        index_transcript(key, text=f"Reunión número {i} sobre presupuestos.")
+
+    remaining = {hit["id"] for hit in get_search_index().search("presupuestos")}
+    assert remaining
+    assert remaining == {f"audio{i}" for i in range(6) if cache.get(f"audio{i}") is not None}
+
+
+def test_expired_transcript_leaves_the_index(workdir):
+    cache = SQLiteCache("cache", db_path=workdir / "cache.db")
+    on_evict(cache.namespace, remove_transcripts)
+    cache.put("audio", {"transcription": "hola"}, ttl=0.05)
+    index_transcript("audio", text="Hola a todos.")
+
+    time.sleep(0.1)
+    assert cache.get("audio") is None
+    assert get_search_index().search("hola") == []
+
+
+def test_youtube_eviction_maps_to_the_video_document(workdir):
+    index_transcript("youtube:dQw4w9WgXcQ", text="Nunca te voy a abandonar.", title="Video")
+    forget_evicted_transcripts(["dQw4w9WgXcQ-info", "dQw4w9WgXcQ-transcript"])
+    assert get_search_index().search("abandonar") == []
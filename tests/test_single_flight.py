@@ -0,0 +1,73 @@
+import threading
+import time
+
+from audio_processor import AudioTranscriber
+from single_flight import SingleFlight
+
+
+def _run_together(count, func):
+    """Lanza `count` hilos que llaman a `func` a la vez y devuelve sus resultados (o excepciones)."""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def call(index):
+        barrier.wait()
+        try:
+            results[index] = func()
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"text": "hola"}
+
+    results = _run_together(8, lambda: flight.do(("test", "key"), slow))
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_exception_reaches_every_waiter_and_is_not_cached():
+    flight = SingleFlight()
+
+    def failing():
+        time.sleep(0.2)
+        raise RuntimeError("boom")
+
+    results = _run_together(4, lambda: flight.do(("test", "key"), failing))
+    assert all(isinstance(result, RuntimeError) for result in results)
+    # La clave se libera: la siguiente llamada vuelve a ejecutar la función
+    assert flight.do(("test", "key"), lambda: "ok") == "ok"
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight()
+    assert flight.do(("test", 1), lambda: 1) == 1
+    assert flight.do(("test", 2), lambda: 2) == 2
+
+
+def test_concurrent_transcriptions_of_the_same_file_make_one_request(fake_openai, monkeypatch):
+    monkeypatch.setattr("audio_processor.PREPROCESS_AUDIO", False)
+    with open("audio.mp3", "wb") as f:
+        f.write(b"ID3" + b"\0" * 2048)
+
+    transcriber = AudioTranscriber("openai")
+    results = _run_together(6, lambda: transcriber.transcribe("audio.mp3"))
+
+    assert fake_openai.stats["requests"] == 1
+    assert len(set(results)) == 1 and isinstance(results[0], str)
+    # Las siguientes llamadas salen de la caché
+    assert transcriber.transcribe("audio.mp3") == results[0]
+    assert fake_openai.stats["requests"] == 1
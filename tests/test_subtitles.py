@@ -0,0 +1,56 @@
+import io
+from types import SimpleNamespace
+
+import pytest
+
+from subtitles import SegmentList, format_timestamp, write_subtitles
+
+
+@pytest.mark.parametrize("seconds, srt, vtt", [
+    (0.0, "00:00:00,000", "00:00:00.000"),
+    (1.5, "00:00:01,500", "00:00:01.500"),
+    (59.9996, "00:01:00,000", "00:01:00.000"),
+    (3661.042, "01:01:01,042", "01:01:01.042"),
+    (36000.0, "10:00:00,000", "10:00:00.000"),
+])
+def test_format_timestamp(seconds, srt, vtt):
+    assert format_timestamp(seconds) == srt
+    assert format_timestamp(seconds, '.') == vtt
+
+
+def _segments():
+    segments = SegmentList()
+    segments.append(0.0, 2.5, " Hola a todos. ")
+    segments.append(2.5, 3.0, "")
+    segments.append(3.0, 65.25, "Empezamos.")
+    return segments
+
+
+def test_srt_numbers_blocks_and_skips_empty_segments():
+    fp = io.StringIO()
+    write_subtitles(_segments(), fp, 'srt')
+    assert fp.getvalue() == (
+        "1\n00:00:00,000 --> 00:00:02,500\nHola a todos.\n\n"
+        "2\n00:00:03,000 --> 00:01:05,250\nEmpezamos.\n\n"
+    )
+
+
+def test_vtt_has_header_and_dot_milliseconds():
+    fp = io.StringIO()
+    write_subtitles(_segments(), fp, 'vtt')
+    assert fp.getvalue() == (
+        "WEBVTT\n\n"
+        "00:00:00.000 --> 00:00:02.500\nHola a todos.\n\n"
+        "00:00:03.000 --> 00:01:05.250\nEmpezamos.\n\n"
+    )
+
+
+def test_segments_from_overlapping_chunks_are_shifted_and_deduplicated():
+    response = SimpleNamespace(segments=[SimpleNamespace(start=0.0, end=1.0, text="repetido"),
+                                         SimpleNamespace(start=1.0, end=3.0, text="nuevo")])
+    merged = SegmentList()
+    merged.append(0.0, 60.5, "primero")
+    merged.extend(SegmentList.from_response(response), offset=59.5, after=merged.ends[-1])
+
+    assert list(merged) == [(0.0, 60.5, "primero"), (60.5, 62.5, "nuevo")]
+    assert SegmentList.from_dict(merged.to_dict()).text == "primero nuevo"
@@ -0,0 +1,35 @@
+import httpx
+import openai
+import pytest
+
+import utils
+from rate_limiter import RateLimitExceeded
+from utils import generate_summary
+
+
+def _failing(error):
+    def summarize(text, template):
+        raise error
+    return summarize
+
+
+def test_rate_limit_keeps_its_type_and_retry_after(monkeypatch):
+    monkeypatch.setattr(utils, "_cached_summary", _failing(RateLimitExceeded("límite", retry_after=7)))
+    with pytest.raises(RateLimitExceeded) as info:
+        generate_summary("hola")
+    assert info.value.retry_after == 7
+
+
+def test_transient_errors_are_raised_unchanged(monkeypatch):
+    error = openai.APIConnectionError(request=httpx.Request("POST", "http://localhost/v1/chat/completions"))
+    monkeypatch.setattr(utils, "_cached_summary", _failing(error))
+    with pytest.raises(openai.APIConnectionError):
+        generate_summary("hola")
+
+
+def test_other_errors_are_wrapped_with_their_cause(monkeypatch):
+    error = ValueError("Respuesta de resumen inválida")
+    monkeypatch.setattr(utils, "_cached_summary", _failing(error))
+    with pytest.raises(Exception, match="Error generating summary") as info:
+        generate_summary("hola")
+    assert info.value.__cause__ is error
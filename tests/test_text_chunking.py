@@ -0,0 +1,48 @@
+import random
+
+from text_chunking import chunk_text, chunk_text_with_separators, content_defined_chunks, count_tokens
+
+
+def _sentences(count=600, seed=1):
+    rng = random.Random(seed)
+    words = "hola mundo casa perro gato río mar sol luna agua fuego tierra".split()
+    return [' '.join(rng.choice(words) for _ in range(rng.randint(5, 25))).capitalize() + '.'
+            for _ in range(count)]
+
+
+def test_content_defined_chunks_keep_all_text_within_budget():
+    text = ' '.join(_sentences())
+    chunks = content_defined_chunks(text, 800)
+    assert ' '.join(chunks).split() == text.split()
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 850 for chunk in chunks)
+
+
+def test_content_defined_chunks_survive_an_early_edit():
+    sentences = _sentences()
+    edited = list(sentences)
+    edited[10] += " Y unas cuantas palabras nuevas añadidas al revisar la transcripción."
+
+    before = content_defined_chunks(' '.join(sentences), 800)
+    after = content_defined_chunks(' '.join(edited), 800)
+    # Sólo cambia el fragmento que contiene la edición
+    assert len(set(before) - set(after)) == 1
+
+    # Con cortes por posición, la edición desplaza todos los fragmentos siguientes
+    greedy_before = chunk_text(' '.join(sentences), 800)
+    greedy_after = chunk_text(' '.join(edited), 800)
+    assert len(set(greedy_before) - set(greedy_after)) > 1
+
+
+def test_short_text_is_a_single_chunk():
+    assert content_defined_chunks("Una frase corta.", 800) == ["Una frase corta."]
+
+
+def test_chunk_separators_rebuild_the_original_text():
+    lines = [f"Persona {i % 2 + 1}: {sentence}" for i, sentence in enumerate(_sentences(200))]
+    text = '\n'.join(lines[:100]) + '\n\n\n' + ' '.join(lines[100:])
+    chunks = chunk_text_with_separators(text, 300)
+    assert len(chunks) > 2
+    assert ''.join(chunk + separator for chunk, separator in chunks) == text
+    assert {separator for _, separator in chunks[:-1]} <= {'\n', ' ', '\n\n\n'}
+    assert chunks[-1][1] == ''
@@ -0,0 +1,61 @@
+import pytest
+
+import translator
+from translator import Translator
+
+
+def test_translation_keeps_the_original_separators(fake_openai, monkeypatch):
+    monkeypatch.setattr(translator, "SEGMENT_TOKENS", 5)
+    monkeypatch.setattr(Translator, "_translate_batch",
+                        lambda self, segments, lang: [segment.upper() for segment in segments])
+    text = "Persona 1: hola a todos.\nPersona 2: buenos días.\n\n\nPersona 1: empezamos."
+
+    assert Translator().translate_text(text, "en") == text.upper()
+
+
+def _paragraphs(count):
+    return "\n\n".join(f"Párrafo número {i} de la reunión." for i in range(count))
+
+
+def test_segments_are_translated_in_batches_and_cached(fake_openai, monkeypatch):
+    monkeypatch.setattr(translator, "SEGMENT_TOKENS", 10)
+    monkeypatch.setattr(translator, "BATCH_TOKENS", 40)
+    text = _paragraphs(12)
+
+    result = Translator().translate_many(text, ["en", "fr"])
+    requests = fake_openai.stats["requests"]
+    segments = text.split("\n\n")
+    assert 2 <= requests < 2 * len(segments)
+    for lang in ("en", "fr"):
+        assert result[lang].split("\n\n") == [f"[traducido] {segment}" for segment in segments]
+
+    # Los segmentos ya traducidos salen de la caché, también al ampliar el texto
+    Translator().translate_many(text + "\n\nPárrafo nuevo.", ["en"])
+    assert fake_openai.stats["requests"] == requests + 1
+
+
+def test_repeated_segments_are_sent_once(fake_openai, monkeypatch):
+    monkeypatch.setattr(translator, "SEGMENT_TOKENS", 10)
+    sent = []
+    monkeypatch.setattr(Translator, "_translate_batch",
+                        lambda self, segments, lang: sent.extend(segments) or [s.upper() for s in segments])
+    first, second = "Sí, claro que lo haremos mañana.", "Vale, de acuerdo con todo el plan."
+    text = "\n\n".join([first, second, first, second])
+
+    assert Translator().translate_text(text, "en") == text.upper()
+    assert sorted(sent) == [first, second]
+
+
+def test_malformed_batch_falls_back_to_one_request_per_segment(fake_openai, monkeypatch):
+    def request(self, prompt, json_output=False):
+        if json_output:
+            return '{"traducciones": ["sólo una"]}'
+        return "T: " + prompt.rsplit("\n\n", 1)[-1]
+
+    monkeypatch.setattr(Translator, "_request", request)
+    assert Translator()._translate_batch(["uno", "dos"], "en") == ["T: uno", "T: dos"]
+
+
+def test_unsupported_language_is_rejected(fake_openai):
+    with pytest.raises(Exception, match="Idioma no soportado"):
+        Translator().translate_text("hola", "xx")
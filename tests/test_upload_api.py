@@ -0,0 +1,78 @@
+import os
+
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+import api
+from api import UploadSizeLimit
+
+MP3 = b"ID3" + b"\0" * 2048
+
+
+def _uploads():
+    return os.listdir(api.UPLOAD_DIR) if os.path.isdir(api.UPLOAD_DIR) else []
+
+
+@pytest.mark.parametrize("filename, content, backend, detail", [
+    ("notas.txt", MP3, None, "Formato no soportado"),
+    ("audio.mp3", b"esto no es audio" * 10, None, "no corresponde a un formato de audio"),
+    ("audio.mp3", b"", None, "vacío"),
+    ("audio.mp3", MP3, "desconocido", "Motor no soportado"),
+])
+def test_invalid_uploads_are_rejected_with_400(api_client, filename, content, backend, detail):
+    params = {"backend": backend} if backend else {}
+    response = api_client.post("/upload", files={"file": (filename, content)}, params=params)
+    assert response.status_code == 400
+    assert detail in response.json()["detail"]
+    assert _uploads() == []
+
+
+def test_upload_above_the_limit_is_rejected_with_413_while_streaming(api_client, monkeypatch):
+    monkeypatch.setattr(api, "MAX_UPLOAD_BYTES", 1024)
+    response = api_client.post("/upload", files={"file": ("audio.mp3", MP3)})
+    assert response.status_code == 413
+    assert _uploads() == []
+
+
+@pytest.fixture
+def limited_client():
+    """App mínima detrás de UploadSizeLimit que cuenta los archivos que llega a recibir."""
+    inner = FastAPI()
+    received = []
+
+    @inner.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        received.append(len(await file.read()))
+        return {"size": received[-1]}
+
+    inner.add_middleware(UploadSizeLimit, max_bytes=1024)
+    client = TestClient(inner)
+    client.received = received
+    return client
+
+
+def test_size_limit_rejects_by_content_length_before_reading(limited_client):
+    response = limited_client.post("/upload", files={"file": ("audio.mp3", b"x" * 4096)})
+    assert response.status_code == 413
+    assert limited_client.received == []
+
+
+def test_size_limit_rejects_chunked_bodies_while_reading(limited_client):
+    # Cuerpo multipart por bloques, sin Content-Length
+    def chunks():
+        yield (b'--limite\r\nContent-Disposition: form-data; name="file"; filename="audio.mp3"\r\n'
+               b'Content-Type: audio/mpeg\r\n\r\n')
+        for _ in range(4):
+            yield b"x" * 600
+        yield b"\r\n--limite--\r\n"
+
+    response = limited_client.post("/upload", content=chunks(),
+                                   headers={"content-type": "multipart/form-data; boundary=limite"})
+    assert response.status_code == 413
+    assert limited_client.received == []
+
+
+def test_size_limit_lets_small_uploads_through(limited_client):
+    response = limited_client.post("/upload", files={"file": ("audio.mp3", b"x" * 100)})
+    assert response.status_code == 200 and response.json() == {"size": 100}
@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from work_queue import QueueFullError, SQLiteWorkQueue
+
+
+@pytest.fixture
+def work_queue(tmp_path):
+    return SQLiteWorkQueue(tmp_path / "queue.db")
+
+
+def test_job_is_claimed_once(work_queue):
+    job_id = work_queue.enqueue("audio", {"path": "a.mp3"})
+
+    results = []
+    threads = [threading.Thread(target=lambda i=i: results.append(work_queue.claim(f"w{i}")))
+               for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    claimed = [job for job in results if job is not None]
+    assert len(claimed) == 1
+    assert claimed[0]["id"] == job_id and claimed[0]["attempts"] == 1
+    assert work_queue.get(job_id)["status"] == "running"
+
+
+def test_expired_lease_is_reclaimed_and_the_old_worker_loses_it(work_queue):
+    job_id = work_queue.enqueue("audio", {})
+    assert work_queue.claim("w1", lease=0.05)["id"] == job_id
+    assert work_queue.claim("w2") is None
+
+    time.sleep(0.1)
+    job = work_queue.claim("w2", lease=60)
+    assert job["id"] == job_id and job["attempts"] == 2
+
+    # El worker caído ya no puede renovar ni terminar el trabajo
+    assert not work_queue.extend(job_id, "w1")
+    assert not work_queue.complete(job_id, "w1", {"text": "viejo"}, {})
+    assert work_queue.complete(job_id, "w2", {"text": "nuevo"}, {})
+    assert work_queue.get(job_id)["result"] == {"text": "nuevo"}
+
+
+def test_extend_keeps_the_lease(work_queue):
+    job_id = work_queue.enqueue("audio", {})
+    work_queue.claim("w1", lease=0.1)
+    time.sleep(0.06)
+    assert work_queue.extend(job_id, "w1", lease=0.1)
+    time.sleep(0.06)
+    assert work_queue.claim("w2") is None
+
+
+def test_reap_fails_jobs_without_attempts_left(work_queue):
+    job_id = work_queue.enqueue("audio", {}, max_attempts=1)
+    work_queue.claim("w1", lease=0.01)
+    time.sleep(0.05)
+    assert work_queue.claim("w2") is None
+
+    reaped = work_queue.reap()
+    assert [job["id"] for job in reaped] == [job_id]
+    assert work_queue.get(job_id)["status"] == "failed"
+
+
+def test_fail_with_retry_after_requeues_until_attempts_run_out(work_queue):
+    job_id = work_queue.enqueue("audio", {}, max_attempts=2)
+    work_queue.claim("w1")
+    assert work_queue.fail(job_id, "w1", "429", status=429, retry_after=0.05)
+    assert work_queue.get(job_id)["status"] == "queued"
+    assert work_queue.claim("w1") is None
+
+    time.sleep(0.1)
+    work_queue.claim("w1")
+    work_queue.fail(job_id, "w1", "429", status=429, retry_after=0.05)
+    job = work_queue.get(job_id)
+    assert job["status"] == "failed" and job["error_status"] == 429
+
+
+def test_queue_rejects_jobs_when_full(tmp_path):
+    small = SQLiteWorkQueue(tmp_path / "queue.db", max_pending=1)
+    small.enqueue("audio", {})
+    with pytest.raises(QueueFullError):
+        small.enqueue("audio", {})
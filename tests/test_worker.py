@@ -0,0 +1,53 @@
+import time
+
+import httpx
+import openai
+import pytest
+
+import worker
+from audio_processor import transcription_error
+from work_queue import SQLiteWorkQueue
+
+
+@pytest.fixture
+def work_queue(tmp_path):
+    return SQLiteWorkQueue(tmp_path / "queue.db")
+
+
+def test_worker_requeues_transient_api_errors(work_queue, monkeypatch):
+    calls = []
+
+    def flaky(payload, timer, report):
+        calls.append(payload)
+        if len(calls) < 3:
+            try:
+                raise openai.APIConnectionError(request=httpx.Request("POST", "http://localhost/v1"))
+            except Exception as e:
+                raise transcription_error(e)
+        return {"text": "hola"}
+
+    monkeypatch.setitem(worker.HANDLERS, "flaky", flaky)
+    monkeypatch.setattr(worker, "JOB_RETRY_BASE_SECONDS", 0.01)
+    job_id = work_queue.enqueue("flaky", {}, max_attempts=3)
+    runner = worker.Worker(work_queue, "w1", kinds=["flaky"])
+
+    deadline = time.monotonic() + 5
+    while work_queue.get(job_id)["status"] != "completed" and time.monotonic() < deadline:
+        runner.run_once()
+        time.sleep(0.02)
+
+    job = work_queue.get(job_id)
+    assert job["status"] == "completed" and job["attempts"] == 3
+    assert len(calls) == 3
+
+
+def test_worker_fails_other_errors_immediately(work_queue, monkeypatch):
+    def broken(payload, timer, report):
+        raise ValueError("formato no soportado")
+
+    monkeypatch.setitem(worker.HANDLERS, "broken", broken)
+    job_id = work_queue.enqueue("broken", {}, max_attempts=3)
+    worker.Worker(work_queue, "w1", kinds=["broken"]).run_once()
+
+    job = work_queue.get(job_id)
+    assert job["status"] == "failed" and job["attempts"] == 1
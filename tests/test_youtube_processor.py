@@ -0,0 +1,37 @@
+import pytest
+
+import youtube_processor
+from youtube_processor import YouTubeProcessor, is_playlist_url
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://www.youtube.com/playlist?list=PL123", True),
+    ("https://www.youtube.com/watch?list=PL123", True),
+    ("https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PL123", False),
+    ("https://youtu.be/dQw4w9WgXcQ?list=PL123", False),
+    ("https://www.youtube.com/watch?v=dQw4w9WgXcQ", False),
+])
+def test_is_playlist_url(url, expected):
+    assert is_playlist_url(url) is expected
+
+
+def test_unreadable_playlist_fails_its_item_without_aborting(workdir, monkeypatch):
+    class FailingYoutubeDL:
+        def __init__(self, options):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            pass
+
+        def extract_info(self, url, download=False):
+            raise RuntimeError("lista privada")
+
+    monkeypatch.setattr(youtube_processor.yt_dlp, "YoutubeDL", FailingYoutubeDL)
+    video = "https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PL123"
+    items = YouTubeProcessor().expand_urls(["https://www.youtube.com/playlist?list=PL123", video])
+
+    assert items[0]["status"] == "failed" and "lista privada" in items[0]["error"]
+    assert items[1] == {"url": video, "status": "queued", "transcription": None, "error": None}
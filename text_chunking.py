@@ -0,0 +1,135 @@
+import re
+import hashlib
+from typing import List, Tuple
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    # Sin tiktoken se usa una estimación de ~4 caracteres por token
+    _encoding = None
+
+_PARAGRAPH_SPLIT = re.compile(r'\n\s*\n')
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?…])\s+')
+
+
+def count_tokens(text: str) -> int:
+    """Número (o estimación) de tokens de un texto."""
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4) if text else 0
+
+
+def split_sentences(text: str) -> List[str]:
+    """Dividir un texto en frases."""
+    return [s for s in _SENTENCE_SPLIT.split(text.strip()) if s]
+
+
+def _split_words(text: str, max_tokens: int) -> List[str]:
+    """Último recurso para frases que superan el presupuesto: cortar por palabras."""
+    pieces, current = [], []
+    for word in text.split():
+        if current and count_tokens(' '.join(current + [word])) > max_tokens:
+            pieces.append(' '.join(current))
+            current = []
+        current.append(word)
+    if current:
+        pieces.append(' '.join(current))
+    return pieces
+
+
+def _split_keeping_separators(pattern, text: str) -> List[Tuple[str, str]]:
+    """Trozos de `text` separados por `pattern`, cada uno con el separador que le sigue ('' el último)."""
+    pieces, start = [], 0
+    for match in pattern.finditer(text):
+        pieces.append((text[start:match.start()], match.group()))
+        start = match.end()
+    pieces.append((text[start:], ''))
+    return pieces
+
+
+def _units(text: str, max_tokens: int) -> List[Tuple[str, str]]:
+    """
+    Párrafos (o, si no caben, frases y trozos de frase), cada uno con el
+    separador que le sigue en el texto original ('' el último).
+    """
+    units = []
+    for paragraph, paragraph_separator in _split_keeping_separators(_PARAGRAPH_SPLIT, text.strip()):
+        if not paragraph.strip():
+            continue
+        if count_tokens(paragraph) <= max_tokens:
+            units.append((paragraph, paragraph_separator))
+            continue
+        sentences = _split_keeping_separators(_SENTENCE_SPLIT, paragraph.strip())
+        for i, (sentence, separator) in enumerate(sentences):
+            if i == len(sentences) - 1:
+                separator = paragraph_separator
+            if count_tokens(sentence) <= max_tokens:
+                units.append((sentence, separator))
+            else:
+                pieces = _split_words(sentence, max_tokens)
+                units.extend((piece, ' ') for piece in pieces[:-1])
+                units.append((pieces[-1], separator))
+    return units
+
+
+def chunk_text_with_separators(text: str, max_tokens: int) -> List[Tuple[str, str]]:
+    """
+    Como chunk_text, pero cada fragmento va con el separador que lo seguía en
+    el texto original ('' el último), para volver a unir los fragmentos (o sus
+    traducciones) como estaban.
+    """
+    chunks, current, current_tokens, separator = [], '', 0, ''
+    for unit, unit_separator in _units(text, max_tokens):
+        unit_tokens = count_tokens(unit)
+        if current and current_tokens + unit_tokens > max_tokens:
+            chunks.append((current.strip(), separator))
+            current, current_tokens = '', 0
+        current += unit + unit_separator
+        current_tokens += unit_tokens
+        separator = unit_separator
+    if current.strip():
+        chunks.append((current.strip(), ''))
+    return chunks
+
+
+def chunk_text(text: str, max_tokens: int) -> List[str]:
+    """
+    Dividir el texto en fragmentos de como máximo `max_tokens` tokens,
+    cortando preferentemente entre párrafos y, si no es posible, entre frases.
+    La concatenación de los fragmentos conserva todo el texto.
+    """
+    return [chunk for chunk, _ in chunk_text_with_separators(text, max_tokens)]
+
+
+def _is_anchor(unit: str, unit_tokens: int, target_tokens: int) -> bool:
+    """Decide por el contenido de la unidad si termina un fragmento (en media cada `target_tokens`)."""
+    value = int.from_bytes(hashlib.sha1(unit.strip().encode('utf-8')).digest()[:4], 'big')
+    return value < (1 << 32) * min(1.0, unit_tokens / target_tokens)
+
+
+def content_defined_chunks(text: str, max_tokens: int) -> List[str]:
+    """
+    Como chunk_text, pero los cortes dependen del contenido de cada párrafo o
+    frase y no de la posición: un fragmento termina tras una unidad cuyo hash
+    cae por debajo de un umbral (fragmentos de unos max_tokens / 2 tokens de
+    media, nunca más de max_tokens ni, salvo el último, menos de max_tokens / 4).
+    Al editar o ampliar el texto sólo cambian los fragmentos cercanos a la
+    edición; los demás se repiten idénticos y sus resultados en caché siguen valiendo.
+    """
+    target_tokens = max(1, max_tokens // 2)
+    min_tokens = max_tokens // 4
+    chunks, current, current_tokens = [], '', 0
+    for unit, separator in _units(text, max_tokens):
+        unit_tokens = count_tokens(unit)
+        if current and current_tokens + unit_tokens > max_tokens:
+            chunks.append(current.strip())
+            current, current_tokens = '', 0
+        current += unit + separator
+        current_tokens += unit_tokens
+        if current_tokens >= min_tokens and _is_anchor(unit, unit_tokens, target_tokens):
+            chunks.append(current.strip())
+            current, current_tokens = '', 0
+    if current.strip():
+        chunks.append(current.strip())
+    return chunks
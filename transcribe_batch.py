@@ -0,0 +1,63 @@
+import os
+import sys
+import argparse
+from audio_processor import AudioTranscriber
+from youtube_processor import (
+    YouTubeProcessor, get_video_id, BATCH_DOWNLOAD_WORKERS, BATCH_TRANSCRIBE_WORKERS
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Transcribe varios videos o listas de reproducción de YouTube en paralelo."
+    )
+    parser.add_argument("urls", nargs="*", help="URLs de videos o listas de reproducción")
+    parser.add_argument("-f", "--file", help="Archivo con una URL por línea")
+    parser.add_argument("-o", "--output-dir", default="transcripciones",
+                        help="Directorio donde guardar las transcripciones (por defecto: transcripciones)")
+    parser.add_argument("--download-workers", type=int, default=BATCH_DOWNLOAD_WORKERS,
+                        help="Descargas simultáneas")
+    parser.add_argument("--transcribe-workers", type=int, default=BATCH_TRANSCRIBE_WORKERS,
+                        help="Transcripciones simultáneas")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    urls = list(args.urls)
+    if args.file:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            urls.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    if not urls:
+        print("No se indicaron URLs", file=sys.stderr)
+        return 2
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    def report(item):
+        detail = f": {item['error']}" if item['error'] else ""
+        print(f"[{item['status']}] {item['url']}{detail}", flush=True)
+
+    items = YouTubeProcessor().process_batch(
+        urls,
+        AudioTranscriber(),
+        download_workers=args.download_workers,
+        transcribe_workers=args.transcribe_workers,
+        on_progress=report
+    )
+
+    for index, item in enumerate(items, 1):
+        if item['status'] != 'completed':
+            continue
+        name = get_video_id(item['url']) or f"video_{index}"
+        with open(os.path.join(args.output_dir, f"{name}.txt"), 'w', encoding='utf-8') as f:
+            f.write(item['transcription'])
+
+    failed = sum(1 for item in items if item['status'] == 'failed')
+    print(f"Completados: {len(items) - failed}/{len(items)}. Fallidos: {failed}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+import os
+import tempfile
+import threading
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+from openai_client import get_client, call_with_retry
+from subtitles import SegmentList
+
+# Modelo de whisper local (si el paquete openai-whisper está instalado)
+LOCAL_WHISPER_MODEL = os.getenv('LOCAL_WHISPER_MODEL', 'base')
+LOCAL_WORKERS = int(os.getenv('LOCAL_TRANSCRIPTION_WORKERS', str(os.cpu_count() or 1)))
+# El motor local decodifica cada archivo entero en memoria: por encima de este
+# tamaño (del audio preprocesado) se transcribe por segmentos
+LOCAL_MAX_UPLOAD_BYTES = int(os.getenv('LOCAL_MAX_UPLOAD_MB', '4')) * 1024 * 1024
+
+
+class TranscriptionBackend:
+    """
+    Interfaz de un motor de transcripción.
+
+    `max_upload_bytes` indica el tamaño máximo de archivo que acepta el motor
+    (None si no tiene límite); por encima se transcribe por segmentos.
+    """
+
+    name = None
+    max_upload_bytes: Optional[int] = None
+    supports_timestamps = False
+
+    @classmethod
+    def missing_dependency(cls) -> Optional[str]:
+        """Mensaje de error si faltan paquetes para usar el motor; None si está disponible."""
+        return None
+
+    def transcribe(self, audio_path: str, timestamps: bool = False):
+        """Devuelve el texto o, si `timestamps` es True, una SegmentList."""
+        raise NotImplementedError
+
+
+class OpenAIWhisperBackend(TranscriptionBackend):
+    """Transcripción con la API de Whisper de OpenAI."""
+
+    name = "openai"
+    # Límite de subida de la API de Whisper (25 MB) con un pequeño margen
+    max_upload_bytes = 24 * 1024 * 1024
+    supports_timestamps = True
+
+    def __init__(self):
+        self.client = get_client()
+
+    def transcribe(self, audio_path: str, timestamps: bool = False):
+        def request(model):
+            # El archivo se abre en cada intento para poder reintentar la subida
+            with open(audio_path, "rb") as audio_file:
+                if timestamps:
+                    return self.client.audio.transcriptions.create(
+                        model=model,
+                        file=audio_file,
+                        response_format="verbose_json",
+                        timestamp_granularities=["segment"]
+                    )
+                return self.client.audio.transcriptions.create(
+                    model=model,
+                    file=audio_file,
+                    response_format="text"
+                )
+
+        # `model` se pasa por call_with_retry para aplicar el límite de whisper-1
+        response = call_with_retry(request, model="whisper-1")
+        return SegmentList.from_response(response) if timestamps else response
+
+
+def _recognize_local(audio_path: str, whisper_model: str) -> str:
+    """
+    Transcribe un archivo en la CPU con speech_recognition. Usa whisper local
+    si está instalado y, si no, PocketSphinx. Es una función de módulo para
+    poder ejecutarse en un pool de procesos.
+    """
+    import speech_recognition as sr
+    from pydub import AudioSegment
+
+    # speech_recognition sólo lee WAV/AIFF/FLAC: convertir a WAV mono de 16 kHz
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix='.wav')
+    tmp.close()
+    try:
+        AudioSegment.from_file(audio_path).set_channels(1).set_frame_rate(16000).export(tmp.name, format="wav")
+        recognizer = sr.Recognizer()
+        with sr.AudioFile(tmp.name) as source:
+            audio = recognizer.record(source)
+
+        try:
+            return recognizer.recognize_whisper(audio, model=whisper_model).strip()
+        except (ImportError, sr.SetupError):
+            return recognizer.recognize_sphinx(audio).strip()
+    finally:
+        os.unlink(tmp.name)
+
+
+class LocalSpeechRecognitionBackend(TranscriptionBackend):
+    """
+    Transcripción local en CPU (sin red ni límites de peticiones) con el
+    paquete speech_recognition y openai-whisper o pocketsphinx (extra `local`).
+    Cada archivo o segmento se reconoce en un pool de procesos compartido por
+    todas las llamadas, así que los segmentos de un audio largo usan varios núcleos.
+    """
+
+    name = "local"
+    max_upload_bytes = LOCAL_MAX_UPLOAD_BYTES
+
+    def __init__(self, whisper_model: str = LOCAL_WHISPER_MODEL, max_workers: int = LOCAL_WORKERS):
+        self.whisper_model = whisper_model
+        self.max_workers = max_workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    @classmethod
+    def missing_dependency(cls) -> Optional[str]:
+        if importlib.util.find_spec("whisper") or importlib.util.find_spec("pocketsphinx"):
+            return None
+        return ("El motor local necesita openai-whisper o pocketsphinx: "
+                "pip install \".[local]\" (o pip install pocketsphinx)")
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._pool
+
+    def transcribe(self, audio_path: str, timestamps: bool = False):
+        if timestamps:
+            raise ValueError("El motor local no genera marcas de tiempo")
+        return self._executor().submit(_recognize_local, audio_path, self.whisper_model).result()
+
+
+BACKENDS = {
+    OpenAIWhisperBackend.name: OpenAIWhisperBackend,
+    LocalSpeechRecognitionBackend.name: LocalSpeechRecognitionBackend,
+}
+
+_instances: Dict[str, TranscriptionBackend] = {}
+_instances_lock = threading.Lock()
+
+
+def get_backend(name: Optional[str] = None) -> TranscriptionBackend:
+    """Retorna la instancia compartida del motor `name` (por defecto TRANSCRIPTION_BACKEND)."""
+    name = name or os.getenv('TRANSCRIPTION_BACKEND', 'openai')
+    if name not in BACKENDS:
+        raise ValueError(f"Motor de transcripción no soportado. Disponibles: {', '.join(BACKENDS)}")
+    missing = BACKENDS[name].missing_dependency()
+    if missing:
+        raise ValueError(missing)
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = BACKENDS[name]()
+        return _instances[name]
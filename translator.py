@@ -1,13 +1,21 @@
-from openai import OpenAI
-from dotenv import load_dotenv
 import os
+import json
+from pathlib import Path
+from rate_limiter import ContextThreadPoolExecutor
+from cache import get_cache, hash_text
+from openai_client import get_client, call_with_retry
+from text_chunking import count_tokens, chunk_text_with_separators
 
-# Cargar variables de entorno
-load_dotenv()
+# Tamaño de cada segmento y de cada lote enviado en una sola petición (tokens)
+SEGMENT_TOKENS = int(os.getenv('TRANSLATION_SEGMENT_TOKENS', '500'))
+BATCH_TOKENS = int(os.getenv('TRANSLATION_BATCH_TOKENS', '1500'))
+TRANSLATION_WORKERS = int(os.getenv('TRANSLATION_WORKERS', '4'))
+TRANSLATION_CACHE_DIR = Path("cache") / "translations"
 
 class Translator:
     def __init__(self):
-        self.client = OpenAI()
+        self.client = get_client()
+        self.cache = get_cache(TRANSLATION_CACHE_DIR)
         self.available_languages = {
             'es': 'español',
             'en': 'inglés',
@@ -21,40 +29,132 @@ class Translator:
             'ru': 'ruso'
         }
 
-    def translate_text(self, text, target_language):
+    def _cache_key(self, segment, target_language):
+        return hash_text(f"{target_language}:{segment}")
+
+    def _request(self, prompt, json_output=False):
+        response = call_with_retry(
+            self.client.chat.completions.create,
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": "Eres un traductor profesional experto."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.3,  # Menor temperatura para traducciones más precisas
+            **({"response_format": {"type": "json_object"}} if json_output else {})
+        )
+        return response.choices[0].message.content.strip()
+
+    def _translate_segment(self, segment, target_language):
+        """Traduce un único segmento."""
+        prompt = (f"Traduce el siguiente texto al {self.available_languages[target_language]}. "
+                  f"Mantén el mismo tono y estilo:\n\n{segment}")
+        return self._request(prompt)
+
+    def _translate_batch(self, segments, target_language):
         """
-        Traduce el texto al idioma especificado usando GPT.
-        
+        Traduce varios segmentos en una sola petición. Si la respuesta no
+        contiene una traducción por segmento, se traducen uno a uno.
+        """
+        if len(segments) == 1:
+            return [self._translate_segment(segments[0], target_language)]
+
+        prompt = (f"Traduce al {self.available_languages[target_language]} cada uno de los textos de la lista "
+                  "JSON siguiente, manteniendo el mismo tono y estilo. Responde con un objeto JSON "
+                  '{"traducciones": [...]} con una traducción por texto, en el mismo orden.\n\n'
+                  f"{json.dumps(segments, ensure_ascii=False)}")
+        try:
+            translations = json.loads(self._request(prompt, json_output=True))['traducciones']
+            if len(translations) == len(segments) and all(isinstance(t, str) for t in translations):
+                return [t.strip() for t in translations]
+        except (ValueError, KeyError, TypeError):
+            pass
+        return [self._translate_segment(segment, target_language) for segment in segments]
+
+    def _make_batches(self, segments):
+        batches, current, current_tokens = [], [], 0
+        for segment in segments:
+            tokens = count_tokens(segment)
+            if current and current_tokens + tokens > BATCH_TOKENS:
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(segment)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def translate_many(self, text, target_languages):
+        """
+        Traduce el texto a varios idiomas a la vez.
+
+        El texto se divide en segmentos; los que no están en caché para cada
+        idioma se agrupan en lotes que se traducen en paralelo. Las traducciones
+        se guardan por (hash del segmento, idioma), así que los segmentos
+        repetidos o ya traducidos no vuelven a enviarse.
+
         Args:
             text (str): Texto a traducir
-            target_language (str): Código del idioma objetivo (ej: 'en', 'es', 'fr')
-            
+            target_languages (list): Códigos de los idiomas objetivo
+
         Returns:
-            str: Texto traducido
+            dict: Texto traducido por código de idioma
         """
         try:
-            if target_language not in self.available_languages:
+            unsupported = [lang for lang in target_languages if lang not in self.available_languages]
+            if unsupported:
                 raise ValueError(f"Idioma no soportado. Idiomas disponibles: {', '.join(self.available_languages.values())}")
 
-            # Crear el prompt para la traducción
-            prompt = f"Traduce el siguiente texto al {self.available_languages[target_language]}. Mantén el mismo tono y estilo:\n\n{text}"
+            # Cada segmento con el separador original que lo sigue, para rehacer los saltos de línea
+            pieces = chunk_text_with_separators(text, SEGMENT_TOKENS)
+            segments = [segment for segment, _ in pieces]
+            translated = {}
+            jobs = []
+            # Una sola consulta a la caché para todos los segmentos e idiomas
+            keys = {(segment, lang): self._cache_key(segment, lang)
+                    for lang in target_languages for segment in dict.fromkeys(segments)}
+            cached = self.cache.get_many(keys.values())
+            for lang in target_languages:
+                missing = []
+                for segment in dict.fromkeys(segments):
+                    entry = cached.get(keys[(segment, lang)])
+                    if entry is not None:
+                        translated[(segment, lang)] = entry['translation']
+                    else:
+                        missing.append(segment)
+                jobs.extend((batch, lang) for batch in self._make_batches(missing))
 
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "Eres un traductor profesional experto."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3  # Menor temperatura para traducciones más precisas
-            )
+            with ContextThreadPoolExecutor(max_workers=TRANSLATION_WORKERS) as executor:
+                results = executor.map(lambda job: self._translate_batch(*job), jobs)
+                for (batch, lang), translations in zip(jobs, results):
+                    for segment, translation in zip(batch, translations):
+                        translated[(segment, lang)] = translation
+                    self.cache.put_many({keys[(segment, lang)]: {'translation': translation}
+                                         for segment, translation in zip(batch, translations)})
 
-            return response.choices[0].message.content.strip()
+            return {
+                lang: ''.join(translated[(segment, lang)] + separator for segment, separator in pieces)
+                for lang in target_languages
+            }
 
         except Exception as e:
             raise Exception(f"Error durante la traducción: {str(e)}")
 
+    def translate_text(self, text, target_language):
+        """
+        Traduce el texto al idioma especificado usando GPT.
+
+        Args:
+            text (str): Texto a traducir
+            target_language (str): Código del idioma objetivo (ej: 'en', 'es', 'fr')
+
+        Returns:
+            str: Texto traducido
+        """
+        return self.translate_many(text, [target_language])[target_language]
+
     def get_available_languages(self):
         """
         Retorna un diccionario con los idiomas disponibles
         """
-        return self.available_languages 
\ No newline at end of file
+        return self.available_languages
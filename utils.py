@@ -1,12 +1,12 @@
-import openai
 import os
-from dotenv import load_dotenv
-
-# Cargar variables de entorno
-load_dotenv()
-
-# Configurar OpenAI API key
-openai.api_key = os.getenv('OPENAI_API_KEY')
+import re
+import json
+from pathlib import Path
+from rate_limiter import ContextThreadPoolExecutor, RateLimitExceeded
+from cache import get_cache, hash_text
+from openai_client import get_client, call_with_retry, is_retryable
+from text_chunking import count_tokens, chunk_text, content_defined_chunks
+from single_flight import SingleFlight
 
 def get_supported_formats():
     """
@@ -14,78 +14,382 @@ def get_supported_formats():
     """
     return ['wav', 'mp3', 'ogg', 'm4a', 'flac']
 
-def generate_summary(text):
+def detect_audio_format(header):
     """
-    Generate a summary of the transcribed text using OpenAI's GPT model.
-    Returns both a short summary and key points.
+    Detect the audio format from the first bytes of a file (magic bytes).
+    Returns the format name or None if it is not recognised.
     """
-    try:
-        prompt = f"""Por favor, analiza el siguiente texto y proporciona:
+    if header[:4] == b'RIFF' and header[8:12] == b'WAVE':
+        return 'wav'
+    if header[:4] == b'OggS':
+        return 'ogg'
+    if header[:4] == b'fLaC':
+        return 'flac'
+    if header[4:8] == b'ftyp':
+        return 'm4a'
+    if header[:3] == b'ID3' or (len(header) > 1 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0):
+        return 'mp3'
+    return None
+
+# Resúmenes y formateos en curso, compartidos por las peticiones simultáneas con el mismo texto
+_inflight = SingleFlight()
+
+SUMMARY_CACHE_DIR = Path("cache") / "summaries"
+SUMMARY_MODEL = "gpt-4o-mini-2024-07-18"
+SUMMARY_CHUNK_TOKENS = int(os.getenv('SUMMARY_CHUNK_TOKENS', '3000'))
+SUMMARY_WORKERS = int(os.getenv('SUMMARY_WORKERS', '4'))
+SUMMARY_ATTEMPTS = 2
+MAX_KEY_POINTS = 5
+# Cambiar la versión invalida los resúmenes parciales guardados en caché
+SUMMARY_CACHE_VERSION = "v1"
+
+SUMMARY_SCHEMA = {
+    "name": "resumen_transcripcion",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "resumen": {"type": "string"},
+            "puntos_clave": {"type": "array", "items": {"type": "string"}}
+        },
+        "required": ["resumen", "puntos_clave"],
+        "additionalProperties": False
+    }
+}
+
+SUMMARY_PROMPT = """Por favor, analiza el siguiente texto y proporciona:
 1. Un resumen conciso
 2. Los puntos clave más importantes (máximo 5)
 
-Formato de respuesta requerido (JSON):
-{{
-    "resumen": "El resumen aquí",
-    "puntos_clave": [
-        "Punto 1",
-        "Punto 2",
-        etc.
-    ]
-}}
-
 Texto a analizar:
 {text}"""
 
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
+REDUCE_PROMPT = """El siguiente texto contiene los resúmenes parciales, en orden, de fragmentos consecutivos
+de una misma transcripción. Combínalos y proporciona:
+1. Un resumen conciso de la transcripción completa
+2. Los puntos clave más importantes (máximo 5)
+
+Resúmenes parciales:
+{text}"""
+
+def validate_summary(data):
+    """
+    Validate a summary against SUMMARY_SCHEMA and normalise it.
+    Raises ValueError if the structure is not valid.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("El resumen no es un objeto JSON")
+    if not isinstance(data.get('resumen'), str) or not data['resumen'].strip():
+        raise ValueError("Falta el campo 'resumen'")
+    points = data.get('puntos_clave')
+    if not isinstance(points, list) or not all(isinstance(p, str) for p in points):
+        raise ValueError("'puntos_clave' debe ser una lista de textos")
+    return {
+        'resumen': data['resumen'].strip(),
+        'puntos_clave': [p.strip() for p in points if p.strip()][:MAX_KEY_POINTS]
+    }
+
+def _request_summary(prompt):
+    """Pide un resumen con salida JSON estricta y lo valida (reintenta si es inválido)."""
+    error = None
+    for _ in range(SUMMARY_ATTEMPTS):
+        response = call_with_retry(
+            get_client().chat.completions.create,
+            model=SUMMARY_MODEL,
             messages=[
                 {"role": "system", "content": "Eres un asistente experto en análisis y resumen de texto."},
                 {"role": "user", "content": prompt}
-            ]
+            ],
+            response_format={"type": "json_schema", "json_schema": SUMMARY_SCHEMA}
         )
+        try:
+            return validate_summary(json.loads(response.choices[0].message.content))
+        except ValueError as e:
+            error = e
+    raise ValueError(f"Respuesta de resumen inválida: {error}")
 
-        return response.choices[0].message.content
+def _cached_summary(text, template):
+    """
+    Resume `text` con la plantilla dada, usando la caché por hash del texto.
+    Las peticiones simultáneas del mismo resumen esperan a la primera.
+    """
+    cache = get_cache(SUMMARY_CACHE_DIR)
+    key = hash_text(f"{SUMMARY_CACHE_VERSION}:{template}:{text}")
+    summary = cache.get(key)
+    if summary is not None:
+        return summary
+
+    def request():
+        summary = cache.get(key)
+        if summary is None:
+            summary = _request_summary(template.format(text=text))
+            cache.put(key, summary)
+        return summary
+
+    return _inflight.do(('summary', key), request)
+
+def _summaries_as_text(summaries):
+    parts = []
+    for i, summary in enumerate(summaries, 1):
+        points = '\n'.join(f"- {p}" for p in summary['puntos_clave'])
+        parts.append(f"Parte {i}: {summary['resumen']}\n{points}")
+    return '\n\n'.join(parts)
+
+def generate_summary(text):
+    """
+    Generate a summary of the transcribed text using OpenAI's GPT model.
+    Returns a dict with a short summary ('resumen') and key points ('puntos_clave').
+
+    Long texts are summarised hierarchically: chunks are summarised in
+    parallel and the partial summaries are then combined. Chunk boundaries
+    are content-defined (they depend on the sentences around them, not on
+    their offset) and chunk summaries are cached by content hash, so an
+    edited or extended transcript only recomputes the chunks near the edit.
+    """
+    try:
+        if count_tokens(text) <= SUMMARY_CHUNK_TOKENS:
+            return _cached_summary(text, SUMMARY_PROMPT)
+
+        chunks = content_defined_chunks(text, SUMMARY_CHUNK_TOKENS)
+        with ContextThreadPoolExecutor(max_workers=SUMMARY_WORKERS) as executor:
+            summaries = list(executor.map(lambda chunk: _cached_summary(chunk, SUMMARY_PROMPT), chunks))
+
+        # Reducir por niveles hasta que los resúmenes parciales quepan en una llamada
+        combined = _summaries_as_text(summaries)
+        while count_tokens(combined) > SUMMARY_CHUNK_TOKENS:
+            groups = content_defined_chunks(combined, SUMMARY_CHUNK_TOKENS)
+            with ContextThreadPoolExecutor(max_workers=SUMMARY_WORKERS) as executor:
+                summaries = list(executor.map(lambda group: _cached_summary(group, REDUCE_PROMPT), groups))
+            combined = _summaries_as_text(summaries)
+
+        return _cached_summary(combined, REDUCE_PROMPT)
+    except RateLimitExceeded:
+        # Conservar el tipo y `retry_after` para que se responda 429 o se reencole
+        raise
     except Exception as e:
-        raise Exception(f"Error generating summary: {str(e)}")
+        if is_retryable(e):
+            raise
+        raise Exception(f"Error generating summary: {str(e)}") from e
+
+FORMAT_SYSTEM_PROMPT = (
+    "Analiza el siguiente texto transcrito. Primero, determina si hay evidencia clara "
+    "de múltiples personas hablando (por ejemplo, diálogo, diferentes puntos de vista o estilos de habla). "
+    "Si y SOLO SI detectas múltiples hablantes con certeza, etiqueta cada intervención con 'Persona 1:', "
+    "'Persona 2:', etc. Si no hay evidencia clara de múltiples hablantes, simplemente mejora el formato "
+    "y la legibilidad del texto sin agregar etiquetas. Mantén el contenido exactamente igual."
+)
+
+# Presupuesto de tokens por fragmento (la salida debe caber en max_tokens)
+FORMAT_CHUNK_TOKENS = int(os.getenv('FORMAT_CHUNK_TOKENS', '2500'))
+FORMAT_MAX_TOKENS = 5000
+FORMAT_WORKERS = int(os.getenv('FORMAT_WORKERS', '4'))
+FORMAT_CACHE_DIR = Path("cache") / "formatted"
+# Cambiar la versión invalida los textos formateados guardados en caché
+FORMAT_CACHE_VERSION = "v1"
+# Caracteres del fragmento anterior que se envían como contexto
+CONTEXT_CHARS = 500
+
+SPEAKER_LABEL = re.compile(r'Persona \d+')
+
+def basic_format(text):
+    """Formato básico sin IA: un párrafo por frase."""
+    paragraphs = text.split('. ')
+    formatted_text = ''
+
+    for paragraph in paragraphs:
+        if paragraph:
+            cleaned = paragraph.strip()
+            if not cleaned.endswith('.'):
+                cleaned += '.'
+            formatted_text += f"{cleaned}\n\n"
+
+    return formatted_text
+
+def _try_format_chunk(text, system_prompt=FORMAT_SYSTEM_PROMPT):
+    """Formatea un fragmento con la API; None si falla o la salida se trunca."""
+    try:
+        response = call_with_retry(
+            get_client().chat.completions.create,
+            model="gpt-4o-mini-2024-07-18",
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": text}
+            ],
+            temperature=0.3,
+            max_tokens=FORMAT_MAX_TOKENS
+        )
+
+        choice = response.choices[0]
+        if choice.finish_reason == "length":
+            return None
+        return choice.message.content
+
+    except Exception:
+        return None
+
+def _format_chunk(text, system_prompt=FORMAT_SYSTEM_PROMPT):
+    """Formatea un fragmento; si falla o la salida se trunca, usa el formato básico."""
+    formatted = _try_format_chunk(text, system_prompt)
+    # Si hay un error con OpenAI (o la salida está truncada) no se pierde texto
+    return formatted if formatted is not None else basic_format(text)
+
+def _chunk_prompt(index, total, previous_text, speakers):
+    """Instrucciones para un fragmento de una transcripción larga."""
+    if speakers:
+        speaker_rule = (f"En los fragmentos anteriores se identificaron estos hablantes: {', '.join(speakers)}. "
+                        "Usa exactamente las mismas etiquetas para las mismas personas y numera a partir de ahí "
+                        "solo si aparece alguien nuevo. Si el fragmento empieza a mitad de una intervención, "
+                        "no añadas etiqueta al principio.")
+    else:
+        speaker_rule = "En los fragmentos anteriores no se detectaron varios hablantes: no agregues etiquetas."
+
+    return (f"{FORMAT_SYSTEM_PROMPT}\n\nEste texto es el fragmento {index + 1} de {total} de una transcripción más "
+            f"larga. {speaker_rule}\n\nContexto (final del fragmento anterior, NO lo incluyas en la respuesta):\n"
+            f"{previous_text[-CONTEXT_CHARS:]}")
+
+def _format_cache_key(text):
+    return hash_text(f"{FORMAT_CACHE_VERSION}:{text}")
 
 def format_transcription(text):
     """
     Format transcribed text using OpenAI for better presentation and speaker detection.
+
+    Long transcripts are split by token budget on paragraph/sentence
+    boundaries. The first chunk is formatted alone to fix the speaker labels,
+    then the rest are formatted in parallel with those labels as context.
+    Results are cached by content hash (only when every chunk was formatted
+    by the model, not the basic fallback) and concurrent calls with the same
+    text share a single formatting run.
     """
-    try:
-        client = openai.OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    cache = get_cache(FORMAT_CACHE_DIR)
+    key = _format_cache_key(text)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached['text']
+
+    def run():
+        cached = cache.get(key)
+        if cached is not None:
+            return cached['text']
+        formatted, complete = _format_transcription(text)
+        if complete:
+            cache.put(key, {'text': formatted})
+        return formatted
+
+    return _inflight.do(('format', key), run)
+
+def _format_transcription(text):
+    """Devuelve (texto formateado, True si todos los fragmentos los formateó el modelo)."""
+    if count_tokens(text) <= FORMAT_CHUNK_TOKENS:
+        formatted = _try_format_chunk(text)
+        return (formatted, True) if formatted is not None else (basic_format(text), False)
 
-        response = client.chat.completions.create(
+    chunks = chunk_text(text, FORMAT_CHUNK_TOKENS)
+    first = _try_format_chunk(chunks[0])
+    complete = first is not None
+    first = first if first is not None else basic_format(chunks[0])
+    speakers = sorted(set(SPEAKER_LABEL.findall(first)), key=lambda label: int(label.split()[1]))
+
+    prompts = [_chunk_prompt(i, len(chunks), chunks[i - 1], speakers) for i in range(1, len(chunks))]
+    with ContextThreadPoolExecutor(max_workers=FORMAT_WORKERS) as executor:
+        rest = list(executor.map(_try_format_chunk, chunks[1:], prompts))
+    complete = complete and all(part is not None for part in rest)
+    rest = [part if part is not None else basic_format(chunk) for part, chunk in zip(rest, chunks[1:])]
+
+    return '\n\n'.join(part.strip() for part in [first] + rest), complete
+
+class FormatReset(str):
+    """
+    Fragmento de stream_format_transcription que sustituye todo el texto
+    emitido hasta ahora (el streaming falló a mitad y se usa el formato básico).
+    """
+
+def _stream_format_chunk(text, system_prompt=FORMAT_SYSTEM_PROMPT):
+    """
+    Formatea un fragmento en streaming: genera el texto según llega de la API
+    y devuelve (valor de retorno del generador) el texto final, o None si la
+    salida se trunca o falla a mitad. En ese caso emite el formato básico del
+    fragmento: como FormatReset si ya se había enviado parte del texto.
+    Debe ser lo primero que se emite: el FormatReset sustituye todo lo anterior.
+    """
+    parts = []
+    try:
+        stream = call_with_retry(
+            get_client().chat.completions.create,
             model="gpt-4o-mini-2024-07-18",
             messages=[
-                {
-                    "role": "system",
-                    "content": "Analiza el siguiente texto transcrito. Primero, determina si hay evidencia clara "
-                    "de múltiples personas hablando (por ejemplo, diálogo, diferentes puntos de vista o estilos de habla). "
-                    "Si y SOLO SI detectas múltiples hablantes con certeza, etiqueta cada intervención con 'Persona 1:', "
-                    "'Persona 2:', etc. Si no hay evidencia clara de múltiples hablantes, simplemente mejora el formato "
-                    "y la legibilidad del texto sin agregar etiquetas. Mantén el contenido exactamente igual."
-                },
+                {"role": "system", "content": system_prompt},
                 {"role": "user", "content": text}
             ],
             temperature=0.3,
-            max_tokens=5000
+            max_tokens=FORMAT_MAX_TOKENS,
+            stream=True,
+            stream_options={"include_usage": True}
         )
 
-        formatted_text = response.choices[0].message.content
-        return formatted_text
+        finish_reason = None
+        with stream:
+            for event in stream:
+                if not event.choices:
+                    continue
+                delta = event.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+                finish_reason = event.choices[0].finish_reason or finish_reason
 
-    except Exception as e:
-        # Si hay un error con OpenAI, retorna el texto original con formato básico
-        paragraphs = text.split('. ')
-        formatted_text = ''
-
-        for paragraph in paragraphs:
-            if paragraph:
-                cleaned = paragraph.strip()
-                if not cleaned.endswith('.'):
-                    cleaned += '.'
-                formatted_text += f"{cleaned}\n\n"
-
-        return formatted_text
\ No newline at end of file
+        if finish_reason != "length":
+            return ''.join(parts)
+
+    except Exception:
+        # Se continúa con el formato básico del fragmento
+        pass
+
+    fallback = basic_format(text)
+    yield FormatReset(fallback) if parts else fallback
+    return None
+
+def stream_format_transcription(text):
+    """
+    Variante en streaming de format_transcription. Genera el texto formateado
+    a medida que llega: el primer fragmento token a token y el resto (formateados
+    en paralelo con las etiquetas de hablantes del primero) en orden según
+    terminan. El valor de retorno del generador es el texto final completo.
+    Si el primer fragmento falla a mitad se emite un FormatReset con el formato
+    básico, que sustituye lo enviado hasta entonces.
+    Comparte la caché de format_transcription: un acierto se emite de una vez.
+    """
+    cache = get_cache(FORMAT_CACHE_DIR)
+    key = _format_cache_key(text)
+    cached = cache.get(key)
+    if cached is not None:
+        yield cached['text']
+        return cached['text']
+
+    if count_tokens(text) <= FORMAT_CHUNK_TOKENS:
+        formatted = yield from _stream_format_chunk(text)
+        if formatted is None:
+            return basic_format(text)
+        cache.put(key, {'text': formatted})
+        return formatted
+
+    chunks = chunk_text(text, FORMAT_CHUNK_TOKENS)
+    first = yield from _stream_format_chunk(chunks[0])
+    complete = first is not None
+    first = first if first is not None else basic_format(chunks[0])
+    speakers = sorted(set(SPEAKER_LABEL.findall(first)), key=lambda label: int(label.split()[1]))
+
+    prompts = [_chunk_prompt(i, len(chunks), chunks[i - 1], speakers) for i in range(1, len(chunks))]
+    parts = [first]
+    with ContextThreadPoolExecutor(max_workers=FORMAT_WORKERS) as executor:
+        for chunk, part in zip(chunks[1:], executor.map(_try_format_chunk, chunks[1:], prompts)):
+            if part is None:
+                complete = False
+                part = basic_format(chunk)
+            parts.append(part)
+            yield '\n\n' + part.strip()
+
+    formatted = '\n\n'.join(part.strip() for part in parts)
+    if complete:
+        cache.put(key, {'text': formatted})
+    return formatted
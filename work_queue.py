@@ -0,0 +1,284 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Backend de la cola de trabajos y base de datos del backend SQLite
+QUEUE_BACKEND = os.getenv('QUEUE_BACKEND', 'sqlite')
+QUEUE_DB_PATH = os.getenv('QUEUE_DB_PATH', os.path.join('data', 'queue.db'))
+# Máximo de trabajos sin terminar y tiempo que se conservan los terminados (segundos)
+MAX_PENDING_JOBS = int(os.getenv('MAX_PENDING_JOBS', '100'))
+JOB_TTL = int(os.getenv('JOB_TTL_SECONDS', '3600'))
+# Un trabajo cuyo worker no renueva la concesión en este tiempo vuelve a la cola
+LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', '60'))
+# Intentos por trabajo (los reintentos cubren workers caídos y límites de la API)
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+
+# Campos visibles al consultar un trabajo (el payload es interno)
+PUBLIC_FIELDS = ('id', 'kind', 'trace_id', 'status', 'filename', 'created_at', 'started_at',
+                 'finished_at', 'attempts', 'stages', 'result', 'error', 'error_status',
+                 'retry_after', 'progress')
+JSON_FIELDS = ('payload', 'stages', 'result', 'progress')
+
+
+class QueueFullError(Exception):
+    """Se lanza cuando la cola de trabajos está llena."""
+
+
+class WorkQueue:
+    """
+    Interfaz de la cola duradera de trabajos. La API encola y consulta; los
+    workers (worker.py, en este proceso o en otras máquinas) reclaman trabajos
+    con una concesión que deben renovar mientras los procesan. Si un worker
+    cae, su concesión caduca y otro worker reintenta el trabajo.
+
+    Para repartir los workers entre varias máquinas basta con implementar esta
+    interfaz sobre un broker compartido (Redis, Postgres, SQS...).
+    """
+
+    name = None
+
+    def enqueue(self, kind: str, payload: Dict, priority: int = 1, filename: Optional[str] = None,
+                trace_id: Optional[str] = None, max_attempts: int = JOB_MAX_ATTEMPTS) -> str:
+        """Encola un trabajo y devuelve su ID. Lanza QueueFullError si hay demasiados pendientes."""
+        raise NotImplementedError
+
+    def claim(self, worker_id: str, kinds=None, lease: float = LEASE_SECONDS) -> Optional[Dict]:
+        """Reclama el trabajo disponible más prioritario (o None) con una concesión de `lease` segundos."""
+        raise NotImplementedError
+
+    def extend(self, job_id: str, worker_id: str, lease: float = LEASE_SECONDS) -> bool:
+        """Renueva la concesión; False si el trabajo ya no pertenece al worker."""
+        raise NotImplementedError
+
+    def update_progress(self, job_id: str, worker_id: str, progress: List) -> bool:
+        raise NotImplementedError
+
+    def complete(self, job_id: str, worker_id: str, result: Dict, stages: Dict) -> bool:
+        raise NotImplementedError
+
+    def fail(self, job_id: str, worker_id: str, error: str, stages: Optional[Dict] = None,
+             status: int = 500, retry_after: Optional[float] = None) -> bool:
+        """
+        Marca el trabajo como fallido. Con `retry_after` vuelve a la cola tras
+        esa espera mientras le queden intentos.
+        """
+        raise NotImplementedError
+
+    def reap(self) -> List[Dict]:
+        """Da por fallidos los trabajos con la concesión caducada y sin intentos; los devuelve."""
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Estado público del trabajo o None si no existe."""
+        raise NotImplementedError
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+    Cola de trabajos en una base de datos SQLite en modo WAL, compartida por
+    la API y los workers de la misma máquina (o de un volumen compartido).
+    Las reclamaciones usan transacciones BEGIN IMMEDIATE, así que dos workers
+    nunca obtienen el mismo trabajo.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, db_path=QUEUE_DB_PATH, max_pending=MAX_PENDING_JOBS, ttl=JOB_TTL):
+        self.db_path = str(db_path)
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._local = threading.local()
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL,"
+            " status TEXT NOT NULL, priority INTEGER NOT NULL, trace_id TEXT, filename TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL,"
+            " worker_id TEXT, lease_until REAL, available_at REAL NOT NULL,"
+            " created_at REAL NOT NULL, started_at REAL, finished_at REAL,"
+            " stages TEXT, result TEXT, error TEXT, error_status INTEGER, retry_after REAL,"
+            " progress TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, priority, available_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión propia de cada hilo, en modo autocommit (las transacciones son explícitas)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _decode(row) -> Dict:
+        job = dict(row)
+        for field in JSON_FIELDS:
+            if job.get(field) is not None:
+                job[field] = json.loads(job[field])
+        return job
+
+    def enqueue(self, kind, payload, priority=1, filename=None, trace_id=None,
+                max_attempts=JOB_MAX_ATTEMPTS):
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM jobs WHERE finished_at < ?", (now - self.ttl,))
+            pending, = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchone()
+            if pending >= self.max_pending:
+                raise QueueFullError("Demasiados trabajos en cola, inténtalo más tarde")
+            conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, priority, trace_id, filename,"
+                " max_attempts, available_at, created_at, stages)"
+                " VALUES (?, ?, ?, 'queued', ?, ?, ?, ?, ?, ?, '{}')",
+                (job_id, kind, json.dumps(payload, ensure_ascii=False), priority, trace_id or job_id,
+                 filename, max_attempts, now, now)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return job_id
+
+    def claim(self, worker_id, kinds=None, lease=LEASE_SECONDS):
+        now = time.time()
+        kinds = list(kinds or ())
+        kind_filter = f" AND kind IN ({', '.join('?' * len(kinds))})" if kinds else ""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Trabajos en cola o cuyo worker dejó de renovar la concesión
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE ((status = 'queued' AND available_at <= ?)"
+                " OR (status = 'running' AND lease_until < ? AND attempts < max_attempts))"
+                f"{kind_filter} ORDER BY priority, created_at LIMIT 1",
+                (now, now, *kinds)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker_id = ?, lease_until = ?,"
+                " attempts = attempts + 1, started_at = COALESCE(started_at, ?) WHERE id = ?",
+                (worker_id, now + lease, now, row['id'])
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        job = self._decode(row)
+        job.update(status='running', worker_id=worker_id, attempts=job['attempts'] + 1)
+        return job
+
+    def _update_owned(self, job_id, worker_id, assignments, values) -> bool:
+        """Actualiza el trabajo sólo si sigue en curso y asignado a `worker_id`."""
+        cursor = self._connection().execute(
+            f"UPDATE jobs SET {assignments} WHERE id = ? AND worker_id = ? AND status = 'running'",
+            (*values, job_id, worker_id)
+        )
+        return cursor.rowcount == 1
+
+    def extend(self, job_id, worker_id, lease=LEASE_SECONDS):
+        return self._update_owned(job_id, worker_id, "lease_until = ?", (time.time() + lease,))
+
+    def update_progress(self, job_id, worker_id, progress):
+        return self._update_owned(job_id, worker_id, "progress = ?",
+                                  (json.dumps(progress, ensure_ascii=False),))
+
+    def complete(self, job_id, worker_id, result, stages):
+        return self._update_owned(
+            job_id, worker_id,
+            "status = 'completed', result = ?, stages = ?, error = NULL, error_status = NULL,"
+            " retry_after = NULL, finished_at = ?, lease_until = NULL",
+            (json.dumps(result, ensure_ascii=False), json.dumps(stages), time.time())
+        )
+
+    def fail(self, job_id, worker_id, error, stages=None, status=500, retry_after=None):
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM jobs"
+                " WHERE id = ? AND worker_id = ? AND status = 'running'", (job_id, worker_id)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return False
+            if retry_after is not None and row['attempts'] < row['max_attempts']:
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', worker_id = NULL, lease_until = NULL,"
+                    " available_at = ?, error = ?, error_status = ?, retry_after = ?, stages = ?"
+                    " WHERE id = ?",
+                    (now + retry_after, error, status, retry_after, json.dumps(stages or {}), job_id)
+                )
+            else:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, error_status = ?, retry_after = ?,"
+                    " stages = ?, finished_at = ?, lease_until = NULL WHERE id = ?",
+                    (error, status, retry_after, json.dumps(stages or {}), now, job_id)
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return True
+
+    def reap(self):
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'running' AND lease_until < ?"
+                " AND attempts >= max_attempts", (now,)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE jobs SET status = 'failed', error = ?, error_status = 500,"
+                " finished_at = ?, lease_until = NULL WHERE id = ?",
+                [("El worker dejó de responder y no quedan reintentos", now, row['id']) for row in rows]
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return [self._decode(row) for row in rows]
+
+    def get(self, job_id):
+        row = self._connection().execute(
+            f"SELECT {', '.join(PUBLIC_FIELDS)} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return self._decode(row) if row is not None else None
+
+
+QUEUE_BACKENDS = {
+    'sqlite': SQLiteWorkQueue,
+}
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_work_queue() -> WorkQueue:
+    """Retorna la cola de trabajos compartida del backend configurado (QUEUE_BACKEND)."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            if QUEUE_BACKEND not in QUEUE_BACKENDS:
+                raise ValueError(f"Backend de cola no soportado: {QUEUE_BACKEND}")
+            _queue = QUEUE_BACKENDS[QUEUE_BACKEND]()
+        return _queue
@@ -0,0 +1,313 @@
+import os
+import sys
+import time
+import random
+import socket
+import signal
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+from audio_processor import AudioTranscriber
+from metrics import render_metrics
+from openai_client import is_retryable
+from pipeline import post_process
+from rate_limiter import RateLimitExceeded, request_priority, INTERACTIVE
+from stage_timer import StageTimer
+from work_queue import WorkQueue, get_work_queue, LEASE_SECONDS
+from youtube_processor import YouTubeProcessor
+
+# Trabajos procesados en paralelo por cada proceso worker.py, workers embebidos
+# en el proceso de la API (sólo para desarrollo; en producción 0 y procesos
+# worker.py aparte) y espera entre consultas a la cola vacía
+WORKER_CONCURRENCY = int(os.getenv('WORKER_CONCURRENCY', '4'))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '0'))
+POLL_INTERVAL = float(os.getenv('JOB_POLL_SECONDS', '0.5'))
+# Puerto del endpoint /metrics de cada proceso worker.py (0 lo desactiva)
+WORKER_METRICS_PORT = int(os.getenv('WORKER_METRICS_PORT', '0'))
+# Espera antes de reintentar un trabajo tras un error transitorio de la API
+# (se duplica en cada intento, hasta JOB_MAX_ATTEMPTS)
+JOB_RETRY_BASE_SECONDS = float(os.getenv('JOB_RETRY_BASE_SECONDS', '5'))
+JOB_RETRY_MAX_SECONDS = float(os.getenv('JOB_RETRY_MAX_SECONDS', '300'))
+
+logger = logging.getLogger(__name__)
+
+
+def remove_file(path):
+    """Elimina un archivo de trabajo si todavía existe."""
+    if path and os.path.exists(path):
+        os.unlink(path)
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Indica si el error (o alguno de los que lo causaron, ya que los errores de
+    la API se traducen a mensajes para el usuario) es un 5xx o un fallo de red.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if is_retryable(error):
+            return True
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def retry_delay(attempts: int) -> float:
+    """Espera antes del siguiente intento: backoff exponencial con jitter."""
+    delay = min(JOB_RETRY_MAX_SECONDS, JOB_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0))
+    return random.uniform(delay / 2, delay)
+
+
+def process_audio(audio_path, timer, content_hash=None, backend=None, filename=None):
+    """Transcribe, formatea y resume un archivo de audio (bloqueante)."""
+    transcriber = AudioTranscriber(backend)
+
+    with timer.stage("transcription"):
+        logger.info("Iniciando transcripción...")
+        transcription = transcriber.transcribe(audio_path, cache_key=content_hash, timer=timer)
+    if content_hash and filename:
+        transcriber.set_title(content_hash, filename)
+
+    # Formatear la transcripción y generar el resumen en paralelo
+    logger.info("Formateando transcripción y generando resumen...")
+    result = post_process(transcription, timer=timer)
+    for stage, error in result['errors'].items():
+        logger.warning(f"Etapa '{stage}' sin resultado: {error}")
+
+    return result
+
+
+def run_audio(payload, timer, report):
+    return process_audio(payload['path'], timer, payload.get('content_hash'), payload.get('backend'),
+                         payload.get('filename'))
+
+
+def run_subtitles(payload, timer, report):
+    transcriber = AudioTranscriber(payload.get('backend'))
+    with timer.stage("transcription"):
+        segments = transcriber.transcribe_segments(payload['path'], None, payload.get('content_hash'))
+    if payload.get('content_hash') and payload.get('filename'):
+        transcriber.set_title(payload['content_hash'], payload['filename'])
+    return {'segments': segments.to_dict()}
+
+
+def run_youtube_batch(payload, timer, report):
+    progress = []
+    by_url = {}
+    lock = threading.Lock()
+
+    def track(item):
+        # Un único registro por URL, actualizado en cada cambio de estado
+        with lock:
+            if item['url'] not in by_url:
+                by_url[item['url']] = item
+                progress.append(item)
+            else:
+                by_url[item['url']].update(item)
+            report([dict(entry) for entry in progress])
+
+    with timer.stage("batch"):
+        items = YouTubeProcessor().process_batch(
+            payload['urls'],
+            AudioTranscriber(),
+            download_workers=payload['download_workers'],
+            transcribe_workers=payload['transcribe_workers'],
+            on_progress=track
+        )
+    return {
+        "items": items,
+        "completed": sum(1 for item in items if item['status'] == 'completed'),
+        "failed": sum(1 for item in items if item['status'] == 'failed')
+    }
+
+
+# Tipos de trabajo: handler(payload, timer, report) -> resultado serializable a JSON.
+# `report(progress)` publica el progreso parcial del trabajo.
+HANDLERS: Dict[str, Callable] = {
+    'audio': run_audio,
+    'subtitles': run_subtitles,
+    'youtube_batch': run_youtube_batch,
+}
+
+
+class Worker:
+    """
+    Reclama trabajos de la cola y los ejecuta uno a uno. Mientras un trabajo
+    está en curso, un hilo renueva su concesión; si el proceso cae, la
+    concesión caduca y otro worker lo reintenta.
+
+    Los archivos listados en `payload['files']` se borran cuando el trabajo
+    termina definitivamente (no si vuelve a la cola).
+    """
+
+    def __init__(self, work_queue: Optional[WorkQueue] = None, worker_id: Optional[str] = None,
+                 kinds: Optional[List[str]] = None, lease: float = LEASE_SECONDS,
+                 poll_interval: float = POLL_INTERVAL):
+        self.queue = work_queue or get_work_queue()
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        self.kinds = kinds or list(HANDLERS)
+        self.lease = lease
+        self.poll_interval = poll_interval
+
+    def _heartbeat(self, job_id, done: threading.Event):
+        # Un error al renovar (p. ej. "database is locked") se reintenta en el
+        # siguiente ciclo mientras la concesión actual no haya caducado
+        expires = time.monotonic() + self.lease
+        while not done.wait(self.lease / 3):
+            try:
+                if not self.queue.extend(job_id, self.worker_id, self.lease):
+                    logger.warning(f"Trabajo {job_id}: concesión perdida")
+                    return
+                expires = time.monotonic() + self.lease
+            except Exception as e:
+                if time.monotonic() >= expires:
+                    logger.error(f"Trabajo {job_id}: concesión caducada sin poder renovarla: {str(e)}")
+                    return
+                logger.warning(f"Trabajo {job_id}: no se pudo renovar la concesión: {str(e)}")
+
+    def _cleanup(self, job):
+        for path in job['payload'].get('files', ()):
+            remove_file(path)
+
+    def run_once(self) -> bool:
+        """Procesa un trabajo si hay alguno disponible. Devuelve False si la cola estaba vacía."""
+        for job in self.queue.reap():
+            logger.error(f"Trabajo {job['id']} abandonado tras {job['attempts']} intentos")
+            self._cleanup(job)
+
+        job = self.queue.claim(self.worker_id, self.kinds, self.lease)
+        if job is None:
+            return False
+
+        job_id = job['id']
+        timer = StageTimer(job['trace_id'])
+        done = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job_id, done), daemon=True).start()
+        logger.info(f"Trabajo {job_id} ({job['kind']}) intento {job['attempts']} en {self.worker_id}")
+
+        # Sólo el dueño de la concesión borra los archivos, y sólo si el trabajo
+        # terminó definitivamente (otro worker puede haberlo reclamado)
+        finished = False
+        try:
+            with request_priority(job['priority']):
+                result = HANDLERS[job['kind']](
+                    job['payload'], timer,
+                    lambda progress: self.queue.update_progress(job_id, self.worker_id, progress)
+                )
+            finished = self.queue.complete(job_id, self.worker_id, result, timer.timings)
+            if not finished:
+                logger.warning(f"Trabajo {job_id}: concesión perdida, se descarta el resultado")
+        except RateLimitExceeded as e:
+            # Los lotes esperan a que haya presupuesto; las peticiones interactivas reciben el 429
+            logger.warning(f"Trabajo {job_id}: límite de la API alcanzado: {str(e)}")
+            retry_after = max(1.0, e.retry_after or 1.0)
+            if self.queue.fail(job_id, self.worker_id, str(e), timer.timings, status=429,
+                               retry_after=None if job['priority'] == INTERACTIVE else retry_after):
+                finished = self.queue.get(job_id)['status'] == 'failed'
+        except Exception as e:
+            if is_transient(e):
+                # Vuelve a la cola: el siguiente intento reutiliza los segmentos ya transcritos
+                delay = retry_delay(job['attempts'])
+                logger.warning(f"Trabajo {job_id}: error transitorio, reintento en {delay:.0f} s: {str(e)}")
+                if self.queue.fail(job_id, self.worker_id, str(e), timer.timings, status=503, retry_after=delay):
+                    finished = self.queue.get(job_id)['status'] == 'failed'
+            else:
+                logger.error(f"Trabajo {job_id} fallido: {str(e)}")
+                finished = self.queue.fail(job_id, self.worker_id, str(e), timer.timings)
+        finally:
+            done.set()
+            if finished:
+                self._cleanup(job)
+        return True
+
+    def run(self, stop: threading.Event):
+        """Procesa trabajos hasta que se activa `stop` (termina el trabajo en curso)."""
+        while not stop.is_set():
+            try:
+                if not self.run_once():
+                    stop.wait(self.poll_interval)
+            except Exception as e:
+                logger.error(f"Error en el worker {self.worker_id}: {str(e)}")
+                stop.wait(self.poll_interval)
+
+
+def start_workers(count: int, stop: threading.Event, kinds: Optional[List[str]] = None) -> List[threading.Thread]:
+    """Arranca `count` workers en hilos de este proceso."""
+    threads = []
+    for index in range(count):
+        worker = Worker(kinds=kinds, worker_id=f"{socket.gethostname()}:{os.getpid()}:{index}")
+        thread = threading.Thread(target=worker.run, args=(stop,), name=f"worker-{index}", daemon=True)
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Expone las métricas de este proceso en GET /metrics."""
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port: int) -> ThreadingHTTPServer:
+    """Arranca en segundo plano el servidor de métricas del proceso."""
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Procesa los trabajos de transcripción encolados por la API."
+    )
+    parser.add_argument("-c", "--concurrency", type=int, default=WORKER_CONCURRENCY,
+                        help="Trabajos procesados en paralelo")
+    parser.add_argument("--kinds", default=",".join(HANDLERS),
+                        help=f"Tipos de trabajo a procesar, separados por comas (por defecto: {','.join(HANDLERS)})")
+    parser.add_argument("--metrics-port", type=int, default=WORKER_METRICS_PORT,
+                        help="Puerto del endpoint /metrics de este proceso (0 lo desactiva)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()]
+    unknown = [kind for kind in kinds if kind not in HANDLERS]
+    if unknown:
+        print(f"Tipos de trabajo desconocidos: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    stop = threading.Event()
+    # SIGTERM/SIGINT: dejar de reclamar trabajos y terminar los que están en curso
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+        logger.info(f"Métricas en http://0.0.0.0:{args.metrics_port}/metrics")
+
+    threads = start_workers(args.concurrency, stop, kinds)
+    logger.info(f"{args.concurrency} workers procesando: {', '.join(kinds)}")
+    while any(thread.is_alive() for thread in threads):
+        for thread in threads:
+            thread.join(timeout=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
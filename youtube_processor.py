@@ -1,61 +1,340 @@
 import yt_dlp
 import tempfile
+import shutil
+import time
+import uuid
+import re
 import os
-from typing import Dict, Optional
+import threading
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+from concurrent.futures import wait
+from rate_limiter import ContextThreadPoolExecutor, request_priority, BATCH
+from typing import Callable, Dict, List, Optional
+from pydub import AudioSegment
+from cache import get_cache, on_evict, FileStore
+from search_index import index_transcript, remove_transcripts
+from single_flight import SingleFlight
+
+# Contenedores que la API de Whisper acepta sin recodificar
+WHISPER_FORMATS = ('m4a', 'mp3', 'mp4', 'mpeg', 'mpga', 'oga', 'ogg', 'wav', 'webm', 'flac')
+# Reducir por defecto el audio descargado a 16 kHz mono
+DOWNSAMPLE_AUDIO = os.getenv('YOUTUBE_DOWNSAMPLE', '0') == '1'
+
+# Concurrencia por defecto de cada etapa en el modo por lotes
+BATCH_DOWNLOAD_WORKERS = int(os.getenv('BATCH_DOWNLOAD_WORKERS', '2'))
+BATCH_TRANSCRIBE_WORKERS = int(os.getenv('BATCH_TRANSCRIBE_WORKERS', '2'))
+
+YOUTUBE_CACHE_DIR = Path("cache") / "youtube"
+AUDIO_CACHE_DIR = Path("cache") / "youtube_audio"
+AUDIO_CACHE_MAX_BYTES = int(os.getenv('YOUTUBE_AUDIO_CACHE_MB', '2000')) * 1024 * 1024
+# Tiempo durante el que se reutiliza el resultado de extract_info (las URLs de los
+# formatos caducan, por eso sólo se guarda en memoria)
+PROBE_TTL = 30 * 60
+
+_VIDEO_ID = re.compile(r'(?:[?&]v=|youtu\.be/|/shorts/|/embed/|/live/|/v/)([A-Za-z0-9_-]{11})')
+
+# Resultados recientes de extract_info compartidos entre instancias: url -> (instante, info)
+_probes: Dict[str, tuple] = {}
+_probes_lock = threading.Lock()
+# Consultas y descargas en curso por URL / ID de video, compartidas entre peticiones
+_inflight = SingleFlight()
+
+
+def get_video_id(url: str) -> Optional[str]:
+    """Extraer el ID canónico del video a partir de cualquier formato de URL de YouTube."""
+    match = _VIDEO_ID.search(url)
+    return match.group(1) if match else None
+
+
+def is_playlist_url(url: str) -> bool:
+    """
+    URL de una lista de reproducción: /playlist o con `list=` pero sin un
+    video concreto (un enlace watch?v=X&list=Y es sólo el video X).
+    """
+    if '/playlist' in urlparse(url).path:
+        return True
+    return 'list' in parse_qs(urlparse(url).query) and get_video_id(url) is None
+
+
+def forget_evicted_transcripts(keys: List[str]):
+    """Quita del índice de búsqueda los videos cuya transcripción salió de la caché."""
+    remove_transcripts([f"youtube:{key[:-len('-transcript')]}" for key in keys if key.endswith('-transcript')])
+
 
 class YouTubeProcessor:
-    def __init__(self):
+    def __init__(self, downsample: bool = DOWNSAMPLE_AUDIO):
+        # Preferir pistas de audio que Whisper acepta tal cual (sin recodificar)
         self.ydl_opts = {
-            'format': 'bestaudio/best',
+            'format': 'bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio/best',
+        }
+        # Reducir a 16 kHz mono y bitrate bajo: archivo mucho más pequeño para subir
+        self.downsample_opts = {
             'postprocessors': [{
                 'key': 'FFmpegExtractAudio',
                 'preferredcodec': 'mp3',
-                'preferredquality': '192',
+                'preferredquality': '32',
             }],
+            'postprocessor_args': {'extractaudio': ['-ar', '16000', '-ac', '1']},
         }
+        self.downsample = downsample
+        self.cache = get_cache(YOUTUBE_CACHE_DIR)
+        on_evict(self.cache.namespace, forget_evicted_transcripts)
+        self.audio_store = FileStore(AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_BYTES)
+
+    def _probe(self, url: str) -> Dict:
+        """extract_info sin descarga, reutilizando un resultado reciente para la misma URL."""
+        now = time.time()
+        with _probes_lock:
+            probe = _probes.get(url)
+            if probe and now - probe[0] < PROBE_TTL:
+                return probe[1]
+
+        info = _inflight.do(('probe', url), self._extract_info, url)
+
+        with _probes_lock:
+            for key in [k for k, (t, _) in _probes.items() if now - t >= PROBE_TTL]:
+                del _probes[key]
+            _probes[url] = (now, info)
+        return info
+
+    def _extract_info(self, url: str) -> Dict:
+        with yt_dlp.YoutubeDL({**self.ydl_opts, 'quiet': True}) as ydl:
+            return ydl.extract_info(url, download=False)
 
     def get_video_info(self, url: str) -> Dict:
         """Obtener información del video de YouTube."""
         try:
-            with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
-                info = ydl.extract_info(url, download=False)
-                return {
-                    'title': info.get('title', ''),
-                    'thumbnail': info.get('thumbnail', ''),
-                    'duration': info.get('duration', 0),
-                    'views': info.get('view_count', 0),
-                    'channel': info.get('uploader', '')
-                }
+            video_id = get_video_id(url)
+            if video_id:
+                cached = self.cache.get(f"{video_id}-info")
+                if cached is not None:
+                    return cached
+
+            info = self._probe(url)
+            video_info = {
+                'title': info.get('title', ''),
+                'thumbnail': info.get('thumbnail', ''),
+                'duration': info.get('duration', 0),
+                'views': info.get('view_count', 0),
+                'channel': info.get('uploader', '')
+            }
+            if video_id:
+                self.cache.put(f"{video_id}-info", video_info)
+            return video_info
         except Exception as e:
             raise Exception(f"Error al obtener información del video: {str(e)}")
 
-    def download_audio(self, url: str) -> Optional[str]:
-        """Descargar el audio del video de YouTube."""
-        try:
-            with tempfile.TemporaryDirectory() as temp_dir:
-                output_template = os.path.join(temp_dir, '%(title)s.%(ext)s')
-                
-                ydl_opts = {
-                    **self.ydl_opts,
-                    'outtmpl': output_template,
-                    'quiet': True
-                }
-                
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(url, download=True)
-                    audio_file = os.path.join(temp_dir, f"{info['title']}.mp3")
-                    
-                    if os.path.exists(audio_file):
-                        # Crear un archivo temporal permanente para el audio
-                        temp_audio = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-                        with open(audio_file, 'rb') as f:
-                            temp_audio.write(f.read())
-                        return temp_audio.name
-                    
+    def get_cached_transcript(self, url: str) -> Optional[str]:
+        """Transcripción guardada para el video o None."""
+        video_id = get_video_id(url)
+        if not video_id:
             return None
+        entry = self.cache.get(f"{video_id}-transcript")
+        return entry['transcription'] if entry is not None else None
+
+    def save_transcript(self, url: str, transcription: str):
+        """Guardar la transcripción final del video y añadirla al índice de búsqueda."""
+        video_id = get_video_id(url)
+        if video_id:
+            self.cache.put(f"{video_id}-transcript", {'transcription': transcription})
+            info = self.cache.get(f"{video_id}-info") or {}
+            index_transcript(f"youtube:{video_id}", text=transcription, title=info.get('title'), source=url)
+
+    def _link_to_temp(self, path: str) -> str:
+        """
+        Crear un archivo temporal que apunta al audio en caché (enlace duro, sin
+        copiar datos) para que el llamador pueda borrarlo sin afectar a la caché.
+        """
+        temp_path = os.path.join(tempfile.gettempdir(), f"yt-{uuid.uuid4().hex}{Path(path).suffix}")
+        try:
+            os.link(path, temp_path)
+        except OSError:
+            shutil.copyfile(path, temp_path)
+        return temp_path
+
+    def download_audio(self, url: str, downsample: Optional[bool] = None) -> Optional[str]:
+        """
+        Descargar el audio del video de YouTube.
+
+        El archivo se descarga directamente en su ubicación final (sin copias
+        intermedias) manteniendo el códec original cuando Whisper lo acepta.
+        Con `downsample` se convierte a mp3 mono de 16 kHz y bajo bitrate.
+        El audio descargado se conserva en caché por ID de video; las
+        descargas simultáneas del mismo video se hacen una sola vez.
+        """
+        downsample = self.downsample if downsample is None else downsample
+        try:
+            video_id = get_video_id(url)
+            if not video_id:
+                return self._fetch_audio(url, downsample)
+
+            store_key = f"{video_id}-16k" if downsample else video_id
+            cached = self.audio_store.get(store_key)
+            if not cached:
+                cached = _inflight.do(('download', store_key), self._fetch_audio, url, downsample, store_key)
+            if not cached:
+                return None
+            # Cada llamador recibe su propio archivo temporal
+            return self._link_to_temp(cached)
         except Exception as e:
             raise Exception(f"Error al descargar el audio: {str(e)}")
 
+    def _fetch_audio(self, url: str, downsample: bool, store_key: Optional[str] = None) -> Optional[str]:
+        """
+        Descarga el audio. Con `store_key` lo guarda en el almacén de audio y
+        devuelve su ruta allí; si no, devuelve la ruta del archivo descargado.
+        """
+        if store_key:
+            # Otra descarga del mismo video pudo terminar justo antes
+            cached = self.audio_store.get(store_key)
+            if cached:
+                return cached
+
+        base_path = os.path.join(tempfile.gettempdir(), f"yt-{uuid.uuid4().hex}")
+        ydl_opts = {
+            **self.ydl_opts,
+            **(self.downsample_opts if downsample else {}),
+            'outtmpl': f"{base_path}.%(ext)s",
+            'quiet': True
+        }
+
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with _probes_lock:
+                probe = _probes.get(url)
+            if probe and time.time() - probe[0] < PROBE_TTL:
+                # Reutilizar la información ya obtenida en get_video_info
+                info = ydl.process_ie_result(dict(probe[1]), download=True)
+            else:
+                info = ydl.extract_info(url, download=True)
+
+        downloads = info.get('requested_downloads') or []
+        audio_file = downloads[0].get('filepath') if downloads else None
+        if not audio_file or not os.path.exists(audio_file):
+            return None
+
+        extension = os.path.splitext(audio_file)[1].lstrip('.').lower()
+        if extension not in WHISPER_FORMATS:
+            # Códec no aceptado por Whisper: recodificar a mp3
+            converted = f"{base_path}.mp3"
+            AudioSegment.from_file(audio_file).export(converted, format="mp3", bitrate="64k")
+            os.unlink(audio_file)
+            audio_file = converted
+
+        if store_key:
+            return self.audio_store.put(store_key, audio_file)
+        return audio_file
+
+    def expand_urls(self, urls: List[str]) -> List[Dict]:
+        """
+        Expandir las URLs de listas de reproducción a las URLs de sus videos.
+        Devuelve un dict por video (url, status, transcription, error); una
+        lista que no se puede leer queda como un elemento fallido con su error.
+        """
+        items = []
+
+        def add(url, error=None):
+            items.append({'url': url, 'status': 'failed' if error else 'queued',
+                          'transcription': None, 'error': error})
+
+        for url in urls:
+            if not is_playlist_url(url):
+                add(url)
+                continue
+            try:
+                with yt_dlp.YoutubeDL({'quiet': True, 'extract_flat': 'in_playlist'}) as ydl:
+                    info = ydl.extract_info(url, download=False)
+            except Exception as e:
+                add(url, f"Error al leer la lista de reproducción: {str(e)}")
+                continue
+            if info.get('_type') == 'playlist':
+                for entry in info.get('entries') or []:
+                    if entry and (entry.get('url') or entry.get('id')):
+                        add(entry.get('url') or f"https://www.youtube.com/watch?v={entry['id']}")
+            else:
+                add(url)
+        return items
+
+    def process_batch(self, urls: List[str], transcriber, download_workers: int = BATCH_DOWNLOAD_WORKERS,
+                      transcribe_workers: int = BATCH_TRANSCRIBE_WORKERS,
+                      on_progress: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+        """
+        Transcribir varios videos (o listas de reproducción) en paralelo.
+
+        Las descargas y las transcripciones se ejecutan en pools separados, de
+        modo que la descarga del video N+1 se solapa con la transcripción del
+        video N. El número de audios descargados pendientes de transcribir está
+        acotado. Un fallo en un video se registra en su resultado sin detener
+        el lote. Las llamadas a la API se hacen con prioridad de lote, por
+        detrás de las peticiones interactivas.
+
+        Returns:
+            list: Un dict por video con url, status ('completed' o 'failed'),
+            transcription y error.
+        """
+        items = self.expand_urls(urls)
+        lock = threading.Lock()
+        # Limita los audios en disco (descargando o esperando transcripción)
+        slots = threading.BoundedSemaphore(download_workers + transcribe_workers)
+
+        def update(item, **changes):
+            with lock:
+                item.update(changes)
+            if on_progress:
+                on_progress(dict(item))
+
+        def transcribe(item, audio_path):
+            try:
+                update(item, status='transcribing')
+                transcription = transcriber.transcribe(audio_path, index=False)
+                self.save_transcript(item['url'], transcription)
+                update(item, status='completed', transcription=transcription)
+            except Exception as e:
+                update(item, status='failed', error=str(e))
+            finally:
+                if os.path.exists(audio_path):
+                    os.unlink(audio_path)
+                slots.release()
+
+        def download(item):
+            try:
+                cached = self.get_cached_transcript(item['url'])
+                if cached is not None:
+                    update(item, status='completed', transcription=cached)
+                    slots.release()
+                    return
+                update(item, status='downloading')
+                audio_path = self.download_audio(item['url'])
+                if not audio_path:
+                    raise Exception("No se pudo descargar el audio")
+            except Exception as e:
+                update(item, status='failed', error=str(e))
+                slots.release()
+                return
+            transcriptions.append(transcribe_pool.submit(transcribe, item, audio_path))
+
+        transcriptions = []
+        download_pool = ContextThreadPoolExecutor(max_workers=download_workers, thread_name_prefix="yt-download")
+        transcribe_pool = ContextThreadPoolExecutor(max_workers=transcribe_workers, thread_name_prefix="yt-transcribe")
+        try:
+            downloads = []
+            # Los pools copian el contexto al enviar: las tareas heredan la prioridad
+            with request_priority(BATCH):
+                for item in items:
+                    if item['status'] == 'failed':
+                        # Lista de reproducción que no se pudo leer
+                        update(item)
+                        continue
+                    slots.acquire()
+                    downloads.append(download_pool.submit(download, item))
+            wait(downloads)
+            wait(transcriptions)
+        finally:
+            download_pool.shutdown(wait=True)
+            transcribe_pool.shutdown(wait=True)
+
+        return items
+
     def format_duration(self, seconds: int) -> str:
         """Formatear la duración del video en formato HH:MM:SS."""
         hours = seconds // 3600